@@ -1,90 +1,100 @@
-import autogen
-from autogen import AssistantAgent, UserProxyAgent, GroupChat, GroupChatManager
 import json
 import time
-import psutil
 import os
-import threading
-from queue import Queue
 from datetime import datetime
 import re
-
-# Configurar directorio de salida
+import sys
+import argparse
+import tempfile
+
+# Permitir importar el paquete compartido 'comun' desde la raíz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comun.llm_cache import CACHE_NAME, cache_from_env
+from comun.balancer import balancer_from_env
+from comun.metrics import TurnMetricsRecorder
+from comun.models import REGISTRY_NAME, ModelCascade, registry_from_env
+from comun.ollama_client import MODEL_CLIENT_CLS, register_ollama_client
+from comun.artifacts import ArtifactRegistry, atomic_write, content_hash
+from comun.context import ContextProjection, public_api
+from comun.http_pool import pool_stats, print_pool_summary
+from comun.fences import CodeBlock, FenceStreamParser, find_filename_hint, tokenize_fences
+from comun.ollama_client import StreamListener
+from comun.pipeline import Stage, StagePipeline
+from comun.prefix import prefix_client_kwargs
+from comun.journal import JOURNAL_NAME, TranscriptJournal, read_journal, restore_group_chat
+from comun.sandbox import sandbox_from_env
+from comun.scheduler import agent_models, scheduler_from_env
+
+# Directorio de salida por defecto; se crea en init_output_dir(), no al importar el módulo
 OUTPUT_DIR = "Caso-2/output"
-if not os.path.exists(OUTPUT_DIR):
-    os.makedirs(OUTPUT_DIR)
-    print(f"Directorio '{OUTPUT_DIR}' creado para almacenar archivos generados.")
+# Transcripción del chat guardada junto a los archivos para validarla después con --validate
+TRANSCRIPT_NAME = "transcript.json"
+
+# Manifiesto de archivos generados (hash, agente, mensaje y tamaño de cada uno)
+artifact_registry = None
+# Diario JSONL de la transcripción, junto a los archivos generados; lo abre main()
+journal = None
+
+def init_output_dir(output_dir=OUTPUT_DIR):
+    """Crea el directorio de salida y abre su manifiesto; hay que llamarla antes de guardar archivos"""
+    global artifact_registry
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+        print(f"Directorio '{output_dir}' creado para almacenar archivos generados.")
+    artifact_registry = ArtifactRegistry(output_dir)
+    return artifact_registry
 
 # Configuraciones de los diferentes LLMs - Solo Ollama
-OLLAMA_BASE_URL = "http://localhost:11434/v1"
-
-# Configuración para Coordinador Principal (Llama3)
-ollama_config_llama3 = {
-    "config_list": [
-        {
-            "base_url": OLLAMA_BASE_URL,
-            "api_key": "fake-key",
-            "model": "llama3",
-        }
-    ],
-}
+OLLAMA_BASE_URL = os.environ.get("OLLAMA_BASE_URL", "http://localhost:11434/v1")
+# Etapas simultáneas con --fan-out; debe coincidir con OLLAMA_NUM_PARALLEL del servidor
+OLLAMA_NUM_PARALLEL = int(os.environ.get("OLLAMA_NUM_PARALLEL", "4"))
+# Veces que los fallos de validación del código vuelven al agente responsable (0 lo desactiva)
+FIX_ROUNDS = 1
+# Rondas del chat grupal
+MAX_ROUND = 12
 
-# Configuración para modelos Ollama
-ollama_config_codeqwen = {
-    "config_list": [
-        {
-            "base_url": OLLAMA_BASE_URL,
-            "api_key": "fake-key",
-            "model": "codeqwen",
-        }
-    ],
-}
+# Caché de respuestas del LLM (LLM_CACHE_MODE=record|replay|passthrough); se abre en setup_agents()
+LLM_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), CACHE_NAME)
+llm_cache = None
 
-ollama_config_codellama = {
-    "config_list": [
-        {
-            "base_url": OLLAMA_BASE_URL,
-            "api_key": "fake-key", 
-            "model": "codellama",
-        }
-    ],
-}
+# Latencia y tokens de cada turno de cada agente
+turn_metrics = TurnMetricsRecorder()
 
-ollama_config_mistral = {
-    "config_list": [
-        {
-            "base_url": OLLAMA_BASE_URL,
-            "api_key": "fake-key",
-            "model": "mistral",
-        }
-    ],
-}
+# Semilla de muestreo del LLM (la fija el ejecutor de experimentos en cada réplica)
+LLM_SEED = int(os.environ["LLM_SEED"]) if os.environ.get("LLM_SEED") else None
+
+# Registro de modelos por rol (MODEL_REGISTRY_PATH o --models) y, con --cascade, la cascada
+# borrador/escalado; los carga main()
+MODEL_REGISTRY_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), REGISTRY_NAME)
+model_registry = None
+model_cascade = None
+
+def agent_llm_config(role):
+    """llm_config del rol según el registro de modelos (el borrador si hay cascada)"""
+    return model_registry.llm_config(role, OLLAMA_BASE_URL, MODEL_CLIENT_CLS, cascade=model_cascade is not None)
+
+# Lenguajes de bloque que se guardan como archivos
+EXTRACTABLE_LANGUAGES = {'python', 'txt', 'text', 'markdown', 'md', ''}
+
+# Patrones para nombrar archivos genéricos a partir de su primera clase o función
+CLASS_NAME_PATTERN = re.compile(r'class\s+([A-Za-z0-9_]+)')
+DEF_NAME_PATTERN = re.compile(r'def\s+([a-z_][a-z0-9_]*)')
 
 # FUNCIÓN MEJORADA PARA EXTRAER Y GUARDAR CÓDIGO AUTOMÁTICAMENTE
-def extract_and_save_code(message_content, agent_name):
+def extract_and_save_code(message_content, agent_name, message_index=None, replace=False):
     """Extrae código de los mensajes y lo guarda automáticamente en archivos"""
     
     if not message_content or not isinstance(message_content, str):
         return []
     
-    files_created = []
-    
-    # PRIMERO: Buscar comentarios que especifiquen nombre de archivo
-    # Patrones como: # snake_logic.py, # output/snake_logic.py, etc.
-    file_comment_pattern = r'#\s*(?:output/)?([a-zA-Z0-9_]+\.(?:py|txt|md))'
-    file_comments = re.findall(file_comment_pattern, message_content)
-    
-    # Patrón para capturar bloques de código con o sin especificador de lenguaje
-    code_patterns = [
-        r'```python\s*\n(.*?)```',
-        r'```(?:txt|text|markdown|md|)\s*\n(.*?)```',
-        r'```\s*\n(.*?)```',
-    ]
-    
-    all_code_blocks = []
-    for pattern in code_patterns:
-        matches = re.findall(pattern, message_content, re.DOTALL | re.IGNORECASE)
-        all_code_blocks.extend(matches)
+    return save_code_blocks(extract_code_blocks(message_content), agent_name, message_index, replace=replace)
+
+def extract_code_blocks(message_content):
+    """Bloques de código del mensaje (o el código suelto si no tiene bloques)"""
+    # Un único recorrido lineal del mensaje: cada bloque aparece una sola vez con su lenguaje
+    # y, si lo tiene, el comentario con el nombre de archivo (# snake_logic.py, # output/README.md...)
+    all_code_blocks = [block for block in tokenize_fences(message_content)
+                       if block.language in EXTRACTABLE_LANGUAGES]
     
     # Si no hay bloques de código explícitos, buscar código suelto
     if not all_code_blocks:
@@ -101,27 +111,31 @@ def extract_and_save_code(message_content, agent_name):
                 code_lines.append(line)
                 if not stripped or (stripped and not any(c in stripped for c in ['(', ')', ':', '=', '[', ']', '{', '}']) and len(stripped.split()) > 5):
                     if len(code_lines) > 10:
-                        all_code_blocks.append('\n'.join(code_lines))
+                        filename_hint, hint_line = find_filename_hint(code_lines)
+                        all_code_blocks.append(CodeBlock(language='', content='\n'.join(code_lines), start=0, end=0,
+                                                         filename=filename_hint, filename_line=hint_line))
                     code_lines = []
                     in_code = False
     
+    return all_code_blocks
+
+def plan_code_blocks(code_blocks):
+    """Nombre de archivo y contenido final de cada bloque, sin escribir nada: [(archivo, código)]"""
+    planned = []
+    
     # Procesar cada bloque de código encontrado
-    for idx, code_block in enumerate(all_code_blocks):
-        code_block = code_block.strip()
+    for idx, block in enumerate(code_blocks):
+        # ESTRATEGIA 1: Comentario con nombre de archivo en las primeras líneas del bloque
+        filename = block.filename
+        content_lines = block.content.split('\n')
+        if filename and content_lines[block.filename_line].startswith('#'):
+            # Limpiar el comentario del código
+            del content_lines[block.filename_line]
+        code_block = '\n'.join(content_lines).strip()
         
-        if len(code_block) < 30:  # Ignorar bloques muy pequeños
+        if not code_block:
             continue
         
-        filename = None
-        
-        # ESTRATEGIA 1: Buscar comentario con nombre de archivo en el bloque
-        first_lines = '\n'.join(code_block.split('\n')[:5])
-        file_match = re.search(r'#\s*(?:output/)?([a-zA-Z0-9_]+\.(?:py|txt|md))', first_lines)
-        if file_match:
-            filename = file_match.group(1)
-            # Limpiar el comentario del código
-            code_block = re.sub(r'^#\s*(?:output/)?[a-zA-Z0-9_]+\.(?:py|txt|md).*?\n', '', code_block, count=1, flags=re.MULTILINE)
-        
         # ESTRATEGIA 2: Detectar por contenido del código
         if not filename:
             # Python files
@@ -148,11 +162,11 @@ def extract_and_save_code(message_content, agent_name):
                 
                 # Archivo genérico basado en la primera clase o función
                 elif not filename:
-                    class_match = re.search(r'class\s+([A-Za-z0-9_]+)', code_block)
+                    class_match = CLASS_NAME_PATTERN.search(code_block)
                     if class_match:
                         filename = f"{class_match.group(1).lower()}.py"
                     else:
-                        def_match = re.search(r'def\s+([a-z_][a-z0-9_]*)', code_block)
+                        def_match = DEF_NAME_PATTERN.search(code_block)
                         if def_match:
                             filename = f"{def_match.group(1)}.py"
             
@@ -177,35 +191,51 @@ def extract_and_save_code(message_content, agent_name):
             else:
                 filename = f'file_{idx}.txt'
         
+        # Ignorar bloques muy pequeños (salvo requirements.txt, que suele ocupar una sola línea)
+        if len(code_block) < 30 and filename != 'requirements.txt':
+            continue
+        
+        if filename:
+            # Auto-completar imports si es necesario
+            if filename.endswith('.py'):
+                if 'snake_logic' in filename:
+                    if 'import random' not in code_block:
+                        code_block = 'import random\n' + code_block
+                    if 'from enum import Enum' not in code_block and 'Enum' in code_block:
+                        code_block = 'from enum import Enum\n' + code_block
+                elif 'snake_game' in filename or 'game' in filename.lower():
+                    if 'import pygame' not in code_block and 'pygame' in code_block.lower():
+                        code_block = 'import pygame\nimport sys\n' + code_block
+                elif 'test' in filename:
+                    if 'import unittest' not in code_block:
+                        code_block = 'import unittest\n' + code_block
+            planned.append((filename, code_block))
+    
+    return planned
+
+def save_code_blocks(code_blocks, agent_name, message_index=None, replace=False):
+    """Decide el nombre de archivo de cada bloque y lo guarda en el directorio de salida.
+    
+    Con replace, una versión corregida sustituye a la anterior aunque sea más corta.
+    """
+    files_created = []
+    
+    for filename, code_block in plan_code_blocks(code_blocks):
         # Guardar archivo si no existe ya
-        if filename and filename not in files_created:
-            filepath = os.path.join(OUTPUT_DIR, filename)
+        if filename not in files_created:
+            # Mismo contenido ya registrado en el manifiesto: nada que hacer
+            digest = content_hash(code_block)
+            if artifact_registry.is_unchanged(filename, digest):
+                continue
             
             # Si el archivo ya existe, no sobrescribirlo a menos que el nuevo código sea más largo
-            if os.path.exists(filepath):
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    existing_content = f.read()
-                if len(existing_content) >= len(code_block):
-                    print(f"⏭️  [{agent_name}] -> {filename} ya existe con más contenido, saltando...")
-                    continue
+            existing_size = artifact_registry.existing_size(filename)
+            if not replace and existing_size is not None and existing_size >= len(code_block.encode('utf-8')):
+                print(f"⏭️  [{agent_name}] -> {filename} ya existe con más contenido, saltando...")
+                continue
             
             try:
-                # Auto-completar imports si es necesario
-                if filename.endswith('.py'):
-                    if 'snake_logic' in filename:
-                        if 'import random' not in code_block:
-                            code_block = 'import random\n' + code_block
-                        if 'from enum import Enum' not in code_block and 'Enum' in code_block:
-                            code_block = 'from enum import Enum\n' + code_block
-                    elif 'snake_game' in filename or 'game' in filename.lower():
-                        if 'import pygame' not in code_block and 'pygame' in code_block.lower():
-                            code_block = 'import pygame\nimport sys\n' + code_block
-                    elif 'test' in filename:
-                        if 'import unittest' not in code_block:
-                            code_block = 'import unittest\n' + code_block
-                
-                with open(filepath, 'w', encoding='utf-8') as f:
-                    f.write(code_block)
+                artifact_registry.write(filename, code_block, agent_name, message_index, digest=digest)
                 files_created.append(filename)
                 print(f"✅ [{agent_name}] -> {filename} guardado ({len(code_block)} caracteres)")
             except Exception as e:
@@ -213,31 +243,102 @@ def extract_and_save_code(message_content, agent_name):
     
     return files_created
 
+# Archivos que debe generar cada agente
+EXPECTED_FILES = {
+    'DesarrolladorLogica': ['snake_logic.py'],
+    'DesarrolladorInterfaz': ['snake_game.py'],
+    'TesterDebugger': ['test_snake.py'],
+    'Documentador': ['requirements.txt', 'README.md'],
+}
+
+# Archivos de salidas ya aceptadas por la cascada: un turno posterior sin código no se rechaza
+delivered_files = set()
+
+def validate_agent_output(agent_name, content):
+    """Validador de la cascada: la salida trae los archivos esperados del agente y su Python compila"""
+    planned = {}
+    for filename, code_block in plan_code_blocks(extract_code_blocks(content or "")):
+        planned.setdefault(filename, code_block)
+    missing = [filename for filename in EXPECTED_FILES.get(agent_name, [])
+               if filename not in planned and filename not in delivered_files]
+    if missing:
+        return False, f"Faltan {', '.join(missing)}"
+    for filename, code_block in planned.items():
+        if filename.endswith('.py'):
+            try:
+                compile(code_block, filename, 'exec')
+            except SyntaxError as e:
+                return False, f"{filename}: {e.msg} (línea {e.lineno})"
+    delivered_files.update(planned)
+    return True, f"{len(planned)} archivo(s) correctos"
+
+# EXTRACCIÓN EN STREAMING: cada bloque se guarda en cuanto llega su valla de cierre
+class CodeStreamWriter(StreamListener):
+    """Guarda los bloques de código de un agente mientras llegan los tokens.
+    
+    groupchat: chat grupal del que el mensaje tomará su índice en el manifiesto (None en los
+    modos pipeline y fan-out, que no usan el chat grupal, como al guardar sin streaming).
+    """
+    
+    def __init__(self, agent_name, groupchat=None):
+        self.agent_name = agent_name
+        self.groupchat = groupchat
+        self.expected_files = set(EXPECTED_FILES.get(agent_name, []))
+        self.parser = FenceStreamParser()
+        self.files_written = set()
+        # Lo activa la cascada al escalar: la salida del modelo mayor sustituye a la del borrador
+        self.replace = False
+    
+    def start(self):
+        self.parser = FenceStreamParser()
+        self.files_written = set()
+    
+    def _save_blocks(self, blocks):
+        blocks = [block for block in blocks if block.language in EXTRACTABLE_LANGUAGES]
+        if blocks:
+            # El mensaje aún no está en el historial: su índice será el siguiente
+            message_index = len(self.groupchat.messages) if self.groupchat is not None else None
+            self.files_written.update(save_code_blocks(blocks, self.agent_name, message_index, replace=self.replace))
+    
+    def feed(self, text):
+        self._save_blocks(self.parser.feed(text))
+        # Detener la generación en cuanto están todos los archivos esperados del agente
+        return bool(self.expected_files) and self.expected_files <= self.files_written
+    
+    def finish(self):
+        self._save_blocks(self.parser.close())
+        self.replace = False
+
 # CLASE CUSTOM PARA INTERCEPTAR MENSAJES
-class CustomGroupChatManager(GroupChatManager):
-    """Manager personalizado que intercepta y procesa mensajes"""
+def create_manager(groupchat, stream=False):
+    """Manager personalizado que intercepta los mensajes y extrae su código"""
+    from autogen import GroupChatManager
     
-    def _process_received_message(self, message, sender, silent):
-        """Sobrescribimos este método para interceptar mensajes"""
-        # Procesar el mensaje primero
-        result = super()._process_received_message(message, sender, silent)
+    class CustomGroupChatManager(GroupChatManager):
+        """Manager personalizado que intercepta y procesa mensajes"""
         
-        # Extraer código si el mensaje lo contiene
-        if isinstance(message, dict) and "content" in message:
-            content = message["content"]
-            sender_name = sender.name if hasattr(sender, 'name') else "Unknown"
+        def _process_received_message(self, message, sender, silent):
+            """Sobrescribimos este método para interceptar mensajes"""
+            # Procesar el mensaje primero
+            result = super()._process_received_message(message, sender, silent)
             
-            if sender_name in ['DesarrolladorLogica', 'DesarrolladorInterfaz', 'TesterDebugger', 'Documentador']:
-                if '```' in content:
-                    print(f"\n🔍 Interceptado mensaje de {sender_name}, extrayendo código...")
-                    extract_and_save_code(content, sender_name)
-        
-        return result
+            # Extraer código si el mensaje lo contiene
+            if isinstance(message, dict) and "content" in message:
+                content = message["content"]
+                sender_name = sender.name if hasattr(sender, 'name') else "Unknown"
+                
+                # En modo streaming el código ya se guardó mientras llegaban los tokens
+                if sender_name in EXPECTED_FILES and not stream:
+                    if '```' in content:
+                        print(f"\n🔍 Interceptado mensaje de {sender_name}, extrayendo código...")
+                        extract_and_save_code(content, sender_name, len(self.groupchat.messages))
+            
+            return result
+    
+    return CustomGroupChatManager(groupchat=groupchat, llm_config=agent_llm_config("chat_manager"))
 
-# AGENTE COORDINADOR PRINCIPAL
-coordinador_principal = AssistantAgent(
-    name="CoordinadorPrincipal",
-    system_message="""Eres el Coordinador Principal. Tu trabajo es pedir a cada agente que genere su archivo.
+# Mensajes de sistema de cada agente
+COORDINADOR_PRINCIPAL_SYSTEM_MESSAGE = """Eres el Coordinador Principal. Tu trabajo es pedir a cada agente que genere su archivo.
 
 PROCESO SIMPLE:
 1. Pide a DesarrolladorLogica que genere snake_logic.py
@@ -245,14 +346,9 @@ PROCESO SIMPLE:
 3. Pide a TesterDebugger que genere test_snake.py
 4. Pide a Documentador que genere README.md y requirements.txt
 
-Coordina paso a paso. Cuando todos los archivos estén listos, di: "COMPLETADO".""",
-    llm_config=ollama_config_llama3,
-)
+Coordina paso a paso. Cuando todos los archivos estén listos, di: "COMPLETADO"."""
 
-# AGENTE DESARROLLADOR DE LÓGICA
-desarrollador_logica = AssistantAgent(
-    name="DesarrolladorLogica",
-    system_message="""Genera el archivo snake_logic.py con las clases Snake, Food y GameState.
+DESARROLLADOR_LOGICA_SYSTEM_MESSAGE = """Genera el archivo snake_logic.py con las clases Snake, Food y GameState.
 
 IMPORTANTE: Genera código completo y funcional en un bloque ```python
 
@@ -294,13 +390,9 @@ class GameState:
         self.game_over = False
 ```
 
-Genera AHORA el código completo.""",
-    llm_config=ollama_config_codeqwen,
-)
+Genera AHORA el código completo."""
 
-desarrollador_interfaz = AssistantAgent(
-    name="DesarrolladorInterfaz", 
-    system_message="""Genera snake_game.py con la interfaz Pygame.
+DESARROLLADOR_INTERFAZ_SYSTEM_MESSAGE = """Genera snake_game.py con la interfaz Pygame.
 
 Genera código completo en un bloque ```python que importe de snake_logic.
 
@@ -310,13 +402,9 @@ Debe incluir:
 - Bucle principal del juego
 - if __name__ == "__main__"
 
-Genera AHORA el código completo.""",
-    llm_config=ollama_config_codeqwen,
-)
+Genera AHORA el código completo."""
 
-tester_debugger = AssistantAgent(
-    name="TesterDebugger",
-    system_message="""Genera test_snake.py con tests unitarios.
+TESTER_DEBUGGER_SYSTEM_MESSAGE = """Genera test_snake.py con tests unitarios.
 
 Genera código completo en un bloque ```python con:
 - import unittest
@@ -324,13 +412,9 @@ Genera código completo en un bloque ```python con:
 - Clases TestSnake con varios test_
 - if __name__ == '__main__': unittest.main()
 
-Genera AHORA el código completo.""",
-    llm_config=ollama_config_codellama,
-)
+Genera AHORA el código completo."""
 
-documentador = AssistantAgent(
-    name="Documentador",
-    system_message="""Genera README.md y requirements.txt.
+DOCUMENTADOR_SYSTEM_MESSAGE = """Genera README.md y requirements.txt.
 
 Primero requirements.txt en un bloque ```txt:
 ```txt
@@ -344,33 +428,92 @@ Luego README.md en un bloque ```markdown con:
 - Uso
 - Controles
 
-Genera AHORA ambos archivos.""",
-    llm_config=ollama_config_mistral,
-)
+Genera AHORA ambos archivos."""
+
+# Agentes, chat grupal y planificador: los crea setup_agents() al ejecutar el caso, de modo que
+# importar el módulo (extract_and_save_code, Caso2TestFramework) no carga autogen
+coordinador_principal = desarrollador_logica = desarrollador_interfaz = None
+tester_debugger = documentador = coordinador_usuario = None
+participantes = []
+chat_grupal = gestor = None
+model_scheduler = None
+context_projection = None
+# Reparto entre varios servidores Ollama (OLLAMA_BASE_URLS); lo crea setup_agents()
+endpoint_balancer = None
+
+# AGENTE COORDINADOR PRINCIPAL
+def create_coordinador_principal():
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="CoordinadorPrincipal",
+        system_message=COORDINADOR_PRINCIPAL_SYSTEM_MESSAGE,
+        llm_config=agent_llm_config("CoordinadorPrincipal"),
+    )
+
+# AGENTE DESARROLLADOR DE LÓGICA
+def create_desarrollador_logica():
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="DesarrolladorLogica",
+        system_message=DESARROLLADOR_LOGICA_SYSTEM_MESSAGE,
+        llm_config=agent_llm_config("DesarrolladorLogica"),
+    )
+
+def create_desarrollador_interfaz():
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="DesarrolladorInterfaz",
+        system_message=DESARROLLADOR_INTERFAZ_SYSTEM_MESSAGE,
+        llm_config=agent_llm_config("DesarrolladorInterfaz"),
+    )
+
+def create_tester_debugger():
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="TesterDebugger",
+        system_message=TESTER_DEBUGGER_SYSTEM_MESSAGE,
+        llm_config=agent_llm_config("TesterDebugger"),
+    )
+
+def create_documentador():
+    from autogen import AssistantAgent
+    return AssistantAgent(
+        name="Documentador",
+        system_message=DOCUMENTADOR_SYSTEM_MESSAGE,
+        llm_config=agent_llm_config("Documentador"),
+    )
 
 # AGENTE COORDINADOR LOCAL
-coordinador_usuario = UserProxyAgent(
-    name="CoordinadorUsuario",
-    human_input_mode="NEVER",
-    code_execution_config=False,
-    max_consecutive_auto_reply=1,
-    is_termination_msg=lambda msg: "completado" in msg.get("content", "").lower(),
-)
+def create_coordinador_usuario():
+    from autogen import UserProxyAgent
+    return UserProxyAgent(
+        name="CoordinadorUsuario",
+        human_input_mode="NEVER",
+        code_execution_config=False,
+        max_consecutive_auto_reply=1,
+        is_termination_msg=lambda msg: "completado" in msg.get("content", "").lower(),
+    )
 
 # Framework de testing
 class Caso2TestFramework:
     def __init__(self):
+        import psutil
         self.start_time = time.time()
         self.process = psutil.Process()
         self.results = {}
+        self.stage_metrics = {}
+        self.sandbox = sandbox_from_env()
+        self.code_validation = None
+        self.fixes = []
     
     def validate_files_created(self):
         """Valida archivos creados"""
         expected_files = ['snake_logic.py', 'snake_game.py', 'test_snake.py', 'README.md', 'requirements.txt']
         created_files = []
         
-        if os.path.exists(OUTPUT_DIR):
-            created_files = [f for f in os.listdir(OUTPUT_DIR) if f in expected_files]
+        output_dir = artifact_registry.output_dir
+        if os.path.exists(output_dir):
+            created_files = [f for f in os.listdir(output_dir) if f in expected_files]
         
         return {
             "expected": expected_files,
@@ -378,19 +521,39 @@ class Caso2TestFramework:
             "completion": len(created_files) / len(expected_files) * 100
         }
     
-    def generate_report(self):
-        """Genera reporte final"""
+    def validate_code(self):
+        """Sintaxis, importación y tests de los .py generados, en subprocesos aislados"""
+        self.code_validation = self.sandbox.validate(artifact_registry.output_dir)
+        return self.code_validation
+    
+    def generate_report(self, report_name="caso2_report.json", report_dir=None):
+        """Genera reporte final (en report_dir o, si no se indica, en el directorio de salida)"""
         files_info = self.validate_files_created()
+        code_info = self.code_validation or self.validate_code()
         
         self.results = {
             "timestamp": datetime.now().isoformat(),
             "files": files_info,
-            "execution_time": round(time.time() - self.start_time, 2)
+            "execution_time": round(time.time() - self.start_time, 2),
+            "stage_metrics": self.stage_metrics,
+            "code_validation": code_info,
+            "code_fixes": self.fixes,
+            "llm_cache": llm_cache.stats() if llm_cache else None,
+            "turn_metrics": turn_metrics.export(),
+            "model_residency": model_scheduler.stats() if model_scheduler else None,
+            "context_projection": context_projection.stats() if context_projection else None,
+            "http_pool": pool_stats(),
+            "balancer": endpoint_balancer.stats() if endpoint_balancer else None,
+            "models": {
+                "registry": model_registry.path,
+                "agents": model_scheduler.agent_models,
+                "slo": model_registry.slo_report(turn_metrics.turns),
+                "cascade": model_cascade.report() if model_cascade else None,
+            } if model_registry else None
         }
         
-        report_path = os.path.join(OUTPUT_DIR, "caso2_report.json")
-        with open(report_path, "w", encoding="utf-8") as f:
-            json.dump(self.results, f, indent=2)
+        report_path = os.path.join(report_dir or artifact_registry.output_dir, report_name)
+        atomic_write(report_path, json.dumps(self.results, indent=2))
         
         print(f"\n{'='*50}")
         print(f"REPORTE FINAL")
@@ -400,29 +563,99 @@ class Caso2TestFramework:
         print(f"Tiempo: {self.results['execution_time']}s")
         
         for file in files_info['created']:
-            filepath = os.path.join(OUTPUT_DIR, file)
+            filepath = artifact_registry.path(file)
             size = os.path.getsize(filepath)
             print(f"  ✅ {file} ({size} bytes)")
         
         for file in files_info['expected']:
             if file not in files_info['created']:
                 print(f"  ❌ {file} (no generado)")
-
-# Configurar chat grupal
-participantes = [coordinador_usuario, coordinador_principal, desarrollador_logica, 
-                desarrollador_interfaz, tester_debugger, documentador]
-
-chat_grupal = GroupChat(
-    agents=participantes,
-    messages=[],
-    max_round=12,
-    speaker_selection_method="round_robin",
-)
-
-gestor = CustomGroupChatManager(groupchat=chat_grupal, llm_config=ollama_config_llama3)
-
-# Inicializar framework
-test_framework = Caso2TestFramework()
+        
+        print(f"\nValidación del código: {'correcta' if code_info['passed'] else 'con fallos'}")
+        icons = {"passed": "✅", "failed": "❌", "timeout": "⏱️", "skipped": "⏭️"}
+        for result in code_info['results']:
+            cached = " (caché)" if result['cached'] else ""
+            print(f"  {icons[result['status']]} {result['check']} {result['file']}: {result['details']}{cached}")
+        
+        turn_metrics.print_summary()
+        # Al validar una transcripción guardada no hay agentes ni planificador
+        if model_scheduler is not None:
+            model_scheduler.print_summary()
+            context_projection.print_summary()
+        if model_registry is not None:
+            model_registry.print_slo_summary(turn_metrics.turns)
+        if model_cascade is not None:
+            model_cascade.print_summary()
+        if endpoint_balancer is not None:
+            endpoint_balancer.print_summary()
+        print_pool_summary()
+
+def setup_agents(args):
+    """Crea los agentes, el chat grupal, el planificador de modelos y el cliente de Ollama"""
+    global coordinador_principal, desarrollador_logica, desarrollador_interfaz, tester_debugger, documentador
+    global coordinador_usuario, participantes, chat_grupal, gestor, llm_cache, model_scheduler, context_projection
+    global endpoint_balancer
+    from autogen import GroupChat
+    
+    coordinador_principal = create_coordinador_principal()
+    desarrollador_logica = create_desarrollador_logica()
+    desarrollador_interfaz = create_desarrollador_interfaz()
+    tester_debugger = create_tester_debugger()
+    documentador = create_documentador()
+    coordinador_usuario = create_coordinador_usuario()
+    
+    # Configurar chat grupal
+    participantes = [coordinador_usuario, coordinador_principal, desarrollador_logica, 
+                    desarrollador_interfaz, tester_debugger, documentador]
+    
+    chat_grupal = GroupChat(
+        agents=participantes,
+        messages=[],
+        max_round=MAX_ROUND,
+        speaker_selection_method="round_robin",
+    )
+    
+    gestor = create_manager(chat_grupal, stream=args.stream)
+    stream_groupchat = None if args.pipeline or args.fan_out else chat_grupal
+    stream_listeners = {name: CodeStreamWriter(name, stream_groupchat) for name in EXPECTED_FILES} \
+        if args.stream else None
+    if model_cascade is not None:
+        if stream_listeners:
+            model_cascade.on_escalate = lambda role, model: setattr(stream_listeners[role], "replace", True)
+        model_cascade.register(participantes)
+    llm_cache = cache_from_env(LLM_CACHE_PATH)
+    endpoint_balancer = balancer_from_env(slots=OLLAMA_NUM_PARALLEL)
+    # Precarga el modelo del siguiente agente para reducir los cambios de modelo en Ollama
+    model_scheduler = scheduler_from_env(OLLAMA_BASE_URL, agent_models(participantes),
+                                         turn_order=[agente.name for agente in participantes],
+                                         cyclic=not (args.pipeline or args.fan_out), balancer=endpoint_balancer)
+    register_ollama_client(participantes + [gestor], cache=llm_cache, stream_listeners=stream_listeners,
+                           metrics=turn_metrics, scheduler=model_scheduler, seed=LLM_SEED, balancer=endpoint_balancer,
+                           **prefix_client_kwargs(model_scheduler))
+    
+    # Lo que cada agente necesita del chat grupal: del código ajeno basta con su API pública
+    context_projection = ContextProjection({
+        coordinador_principal.name: {
+            coordinador_usuario.name: None,
+            desarrollador_logica.name: public_api,
+            desarrollador_interfaz.name: public_api,
+            tester_debugger.name: public_api,
+        },
+        desarrollador_logica.name: {coordinador_usuario.name: None, coordinador_principal.name: None},
+        desarrollador_interfaz.name: {
+            coordinador_usuario.name: None,
+            coordinador_principal.name: None,
+            desarrollador_logica.name: public_api,
+        },
+        tester_debugger.name: {coordinador_usuario.name: None, desarrollador_logica.name: public_api},
+        documentador.name: {
+            coordinador_usuario.name: None,
+            coordinador_principal.name: None,
+            desarrollador_logica.name: public_api,
+            desarrollador_interfaz.name: public_api,
+        },
+    }, enabled=not args.full_context)
+    context_projection.register(participantes)
 
 # Mensaje inicial
 mensaje_inicial = """Inicia el desarrollo del juego Snake.
@@ -437,37 +670,272 @@ Genera código completo en bloques ```python
 
 CoordinadorPrincipal: Coordina a cada agente paso a paso."""
 
-# Ejecutar
-try:
+def save_stage_code(agent_name):
+    """Devuelve el callback que extrae el código de una etapa al terminar"""
+    return lambda content: extract_and_save_code(content, agent_name)
+
+def build_fan_out_stages(stream=False):
+    """Etapas según sus dependencias reales: snake_logic.py y la documentación solo necesitan la
+    especificación y se generan a la vez; snake_game.py y test_snake.py esperan a snake_logic.py"""
+    return [
+        Stage(
+            agent=desarrollador_logica,
+            prompt="Genera snake_logic.py completo según esta especificación.",
+            inputs=["CoordinadorUsuario"],
+            on_complete=None if stream else save_stage_code("DesarrolladorLogica"),
+        ),
+        Stage(
+            agent=documentador,
+            prompt="Genera README.md y requirements.txt para el proyecto de esta especificación.",
+            inputs=["CoordinadorUsuario"],
+            on_complete=None if stream else save_stage_code("Documentador"),
+        ),
+        Stage(
+            agent=desarrollador_interfaz,
+            prompt="Genera snake_game.py completo usando las clases de este snake_logic.py.",
+            inputs=["DesarrolladorLogica"],
+            on_complete=None if stream else save_stage_code("DesarrolladorInterfaz"),
+        ),
+        Stage(
+            agent=tester_debugger,
+            prompt="Genera test_snake.py completo para este snake_logic.py.",
+            inputs=["DesarrolladorLogica"],
+            on_complete=None if stream else save_stage_code("TesterDebugger"),
+        ),
+    ]
+
+def build_stages(stream=False):
+    """Pipeline de etapas fijas: Coordinador -> desarrolladores -> tester -> documentador"""
+    return [
+        Stage(
+            agent=coordinador_principal,
+            prompt="Resume en pocas líneas qué archivo debe generar cada agente.",
+            inputs=["CoordinadorUsuario"],
+        ),
+        Stage(
+            agent=desarrollador_logica,
+            prompt="Genera snake_logic.py completo siguiendo el plan del coordinador.",
+            inputs=["CoordinadorPrincipal"],
+            on_complete=None if stream else save_stage_code("DesarrolladorLogica"),
+        ),
+        Stage(
+            agent=desarrollador_interfaz,
+            prompt="Genera snake_game.py completo usando las clases de este snake_logic.py.",
+            inputs=["DesarrolladorLogica"],
+            on_complete=None if stream else save_stage_code("DesarrolladorInterfaz"),
+        ),
+        Stage(
+            agent=tester_debugger,
+            prompt="Genera test_snake.py completo para este snake_logic.py.",
+            inputs=["DesarrolladorLogica"],
+            on_complete=None if stream else save_stage_code("TesterDebugger"),
+        ),
+        Stage(
+            agent=documentador,
+            prompt="Genera README.md y requirements.txt para el proyecto descrito por el coordinador.",
+            inputs=["CoordinadorPrincipal"],
+            on_complete=None if stream else save_stage_code("Documentador"),
+        ),
+    ]
+
+def process_stored_messages(messages):
+    """Extrae el código de los mensajes almacenados de los agentes que generan archivos"""
+    for message_index, msg in enumerate(messages):
+        if isinstance(msg, dict) and 'content' in msg and 'name' in msg:
+            sender_name = msg['name']
+            content = msg['content']
+            if sender_name in EXPECTED_FILES and isinstance(content, str):
+                if '```' in content:
+                    print(f"\n📝 Procesando mensaje almacenado de {sender_name}...")
+                    extract_and_save_code(content, sender_name, message_index)
+
+def file_owner(filename):
+    """Agente que generó el archivo según el manifiesto (o el que debía generarlo)"""
+    entry = artifact_registry.get(filename)
+    if entry:
+        return entry["agent"]
+    return next((agent for agent, files in EXPECTED_FILES.items() if filename in files), None)
+
+def fix_prompt(filename, failures):
+    """Mensaje para el agente responsable con los fallos de su archivo"""
+    lines = []
+    for result in failures:
+        lines.append(f"- {result['check']} de {result['file']}: {result['details']}")
+        if result['output'].strip():
+            lines.append("```\n" + result['output'].strip()[-1200:] + "\n```")
+    return (f"Tu archivo {filename} no pasa la validación automática:\n\n" + "\n".join(lines) +
+            f"\n\nCorrige el problema y devuelve {filename} completo en un único bloque ```python "
+            f"cuya primera línea sea # {filename}")
+
+def return_failures_to_agents(test_framework, rounds=FIX_ROUNDS):
+    """Devuelve cada fallo de validación al agente responsable y vuelve a validar, hasta rounds veces"""
+    agents = {agent.name: agent for agent in participantes}
+    report = test_framework.code_validation or test_framework.validate_code()
+    for round_number in range(1, rounds + 1):
+        failures = {}
+        for result in report['results']:
+            if result['status'] in ("failed", "timeout"):
+                failures.setdefault(result['responsible'], []).append(result)
+        if not failures:
+            break
+        
+        for filename, items in failures.items():
+            agent = agents.get(file_owner(filename))
+            if agent is None:
+                continue
+            print(f"\n🔁 Ronda {round_number}: devolviendo {len(items)} fallo(s) de {filename} a {agent.name}...")
+            try:
+                reply = agent.generate_reply(messages=[{"role": "user", "content": fix_prompt(filename, items)}])
+            except Exception as e:
+                print(f"❌ Error pidiendo la corrección de {filename}: {e}")
+                continue
+            content = (reply.get("content") or "") if isinstance(reply, dict) else (reply or "")
+            saved = extract_and_save_code(content, agent.name, replace=True)
+            test_framework.fixes.append({
+                "round": round_number,
+                "file": filename,
+                "agent": agent.name,
+                "failures": [f"{item['check']} {item['file']}" for item in items],
+                "files_saved": saved,
+            })
+        report = test_framework.validate_code()
+    return report
+
+def validate_transcript(path, report_dir=OUTPUT_DIR):
+    """Vuelve a extraer los archivos de una transcripción guardada y valida el resultado, sin Ollama.
+    
+    Se extraen en un directorio temporal vacío, con su propio manifiesto: lo que ya hubiera en
+    el directorio de salida (p. ej. un archivo más largo que no se sobrescribiría) no cuenta.
+    El informe se guarda en report_dir.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        messages = json.load(f)
+    
     print("="*50)
-    print("INICIANDO DESARROLLO SNAKE")
+    print(f"VALIDANDO {len(messages)} MENSAJES DE {path}")
     print("="*50)
     
-    coordinador_usuario.initiate_chat(gestor, message=mensaje_inicial)
+    with tempfile.TemporaryDirectory(prefix="caso2_validate_") as replay_dir:
+        init_output_dir(replay_dir)
+        test_framework = Caso2TestFramework()
+        process_stored_messages(messages)
+        test_framework.generate_report(report_name="caso2_validation.json", report_dir=report_dir)
+    return test_framework.results["files"]["completion"] == 100 and test_framework.code_validation["passed"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Desarrollo colaborativo del juego Snake")
+    parser.add_argument("--pipeline", action="store_true",
+                        help="Ejecuta las etapas directamente, sin GroupChatManager")
+    parser.add_argument("--stream", action="store_true",
+                        help="Genera en streaming y guarda cada archivo en cuanto se cierra su bloque de código")
+    parser.add_argument("--fan-out", action="store_true",
+                        help="Genera a la vez los archivos independientes; los dependientes esperan a sus entradas")
+    parser.add_argument("--concurrency", type=int, default=OLLAMA_NUM_PARALLEL,
+                        help="Etapas simultáneas con --fan-out (por defecto OLLAMA_NUM_PARALLEL)")
+    parser.add_argument("--full-context", action="store_true",
+                        help="Envía a cada agente la transcripción completa en lugar de solo lo que necesita")
+    parser.add_argument("--fix-rounds", type=int, default=FIX_ROUNDS,
+                        help="Veces que los fallos de validación del código vuelven al agente responsable (0 lo desactiva)")
+    parser.add_argument("--models", metavar="MODELOS_JSON",
+                        help=f"Registro de modelos por rol (por defecto MODEL_REGISTRY_PATH o {REGISTRY_NAME} en la raíz)")
+    parser.add_argument("--cascade", action="store_true",
+                        help="Cada turno empieza con el modelo pequeño del rol y escala si su código no es válido")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR,
+                        help=f"Directorio de los archivos generados (por defecto {OUTPUT_DIR})")
+    parser.add_argument("--resume", action="store_true",
+                        help=f"Continúa la ejecución del diario ({JOURNAL_NAME} en el directorio de salida) "
+                             "sin regenerar los turnos o etapas ya terminados")
+    parser.add_argument("--validate", metavar="TRANSCRIPCION_JSON",
+                        help=f"Solo extrae y valida los archivos de una transcripción guardada ({TRANSCRIPT_NAME}), sin Ollama")
+    args = parser.parse_args()
     
-except Exception as e:
-    print(f"Error: {e}")
-    import traceback
-    traceback.print_exc()
-finally:
-    # Procesar mensajes al final como fallback
-    print("\n" + "="*50)
-    print("POST-PROCESAMIENTO DE MENSAJES")
-    print("="*50)
+    init_output_dir(args.output_dir)
+    if args.validate:
+        sys.exit(0 if validate_transcript(args.validate, args.output_dir) else 1)
     
-    if hasattr(chat_grupal, 'messages'):
-        for msg in chat_grupal.messages:
-            if isinstance(msg, dict) and 'content' in msg and 'name' in msg:
-                sender_name = msg['name']
-                content = msg['content']
-                if sender_name in ['DesarrolladorLogica', 'DesarrolladorInterfaz', 'TesterDebugger', 'Documentador']:
-                    if '```' in content:
-                        print(f"\n📝 Procesando mensaje almacenado de {sender_name}...")
-                        extract_and_save_code(content, sender_name)
+    global journal, model_registry, model_cascade
+    journal_path = artifact_registry.path(JOURNAL_NAME)
+    if args.resume:
+        records, _ = read_journal(journal_path)
+        if not records:
+            parser.error(f"No hay ningún diario que reanudar en {journal_path}")
+        # Se reanuda con el modo de la ejecución original
+        args.fan_out = records[0].get("mode") == "fan-out"
+        args.pipeline = records[0].get("mode") == "pipeline"
+        args.stream = bool(records[0].get("stream"))
+        args.cascade = bool(records[0].get("cascade"))
+    
+    model_registry = registry_from_env(MODEL_REGISTRY_PATH, args.models)
+    if args.cascade:
+        model_cascade = ModelCascade(model_registry, {
+            name: lambda content, messages, name=name: validate_agent_output(name, content) for name in EXPECTED_FILES
+        })
+        if args.resume:
+            # Lo guardado antes de la caída ya está entregado
+            delivered_files.update(artifact_registry.entries)
+    setup_agents(args)
+    mode = "fan-out" if args.fan_out else "pipeline" if args.pipeline else "chat"
+    journal = TranscriptJournal(journal_path, metrics=turn_metrics)
+    journal.start(resume=args.resume, mode=mode, stream=args.stream, cascade=args.cascade)
+    journal.register(participantes)
     
-    test_framework.generate_report()
+    # Inicializar framework
+    test_framework = Caso2TestFramework()
     
-    print(f"\n{'='*50}")
-    print("DESARROLLO FINALIZADO")
-    print(f"Archivos en: {OUTPUT_DIR}/")
-    print(f"{'='*50}")
\ No newline at end of file
+    # Ejecutar
+    messages = chat_grupal.messages
+    try:
+        print("="*50)
+        print("INICIANDO DESARROLLO SNAKE")
+        print("="*50)
+        
+        # Las etapas con checkpoint ya guardaron su código: no se vuelven a generar
+        completed = journal.completed_stages if args.resume else None
+        if args.fan_out:
+            pipeline = StagePipeline(build_fan_out_stages(args.stream), initial_sender=coordinador_usuario.name,
+                                     max_workers=args.concurrency, journal=journal)
+            messages = pipeline.run(mensaje_inicial, completed=completed)
+            test_framework.stage_metrics = pipeline.stage_metrics
+        elif args.pipeline:
+            pipeline = StagePipeline(build_stages(args.stream), initial_sender=coordinador_usuario.name,
+                                     journal=journal)
+            messages = pipeline.run(mensaje_inicial, completed=completed)
+            test_framework.stage_metrics = pipeline.stage_metrics
+        elif args.resume and journal.finished:
+            print("La ejecución del diario ya había terminado: no se genera nada")
+            messages = journal.messages
+        elif args.resume and journal.messages:
+            print(f"Reanudando el chat desde el diario: {len(journal.messages)} mensajes restaurados")
+            # El manager vuelve a extraer el código de los mensajes restaurados (sin cambios, no se reescribe)
+            last_agent, last_message = restore_group_chat(gestor, journal.messages, journal, max_round=MAX_ROUND)
+            last_agent.initiate_chat(gestor, message=last_message, clear_history=False)
+        else:
+            coordinador_usuario.initiate_chat(gestor, message=mensaje_inicial)
+        journal.finish()
+        
+    except Exception as e:
+        print(f"Error: {e}")
+        import traceback
+        traceback.print_exc()
+    finally:
+        # Procesar mensajes al final como fallback
+        print("\n" + "="*50)
+        print("POST-PROCESAMIENTO DE MENSAJES")
+        print("="*50)
+        
+        if not args.stream:
+            process_stored_messages(chat_grupal.messages)
+        atomic_write(artifact_registry.path(TRANSCRIPT_NAME), json.dumps(messages, indent=2, ensure_ascii=False))
+        
+        test_framework.validate_code()
+        if args.fix_rounds > 0:
+            return_failures_to_agents(test_framework, args.fix_rounds)
+        test_framework.generate_report()
+        
+        print(f"\n{'='*50}")
+        print("DESARROLLO FINALIZADO")
+        print(f"Archivos en: {artifact_registry.output_dir}/")
+        print(f"{'='*50}")
+
+if __name__ == "__main__":
+    main()
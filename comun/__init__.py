@@ -0,0 +1 @@
+"""Utilidades compartidas por los casos del sistema multiagente (Caso-1 y Caso-2)"""
@@ -0,0 +1,101 @@
+"""Registro idempotente de archivos generados con manifiesto y escrituras atómicas"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from typing import Any, Dict, Optional
+
+MANIFEST_NAME = "manifest.json"
+
+
+def _current_umask() -> int:
+    # Solo se puede leer cambiándola; se hace una vez, al importar, antes de lanzar hilos
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Permisos con los que open(..., "w") crearía un archivo nuevo
+NEW_FILE_MODE = 0o666 & ~_current_umask()
+
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def atomic_write(path: str, content: str):
+    """Escribe en un temporal del mismo directorio y lo renombra: el archivo nunca queda a medias.
+    
+    mkstemp crea el temporal con permisos 0600; se le dan los del archivo que sustituye o, si es
+    nuevo, los que tendría con open() bajo la umask.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        mode = NEW_FILE_MODE
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=os.path.basename(path))
+    try:
+        os.chmod(tmp_path, mode)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(content)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ArtifactRegistry:
+    """Manifiesto de OUTPUT_DIR: hash, agente de origen, índice de mensaje y tamaño de cada archivo"""
+
+    def __init__(self, output_dir: str):
+        self.output_dir = output_dir
+        self.manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+        self._lock = threading.RLock()
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f).get("files", {})
+
+    def get(self, filename: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self.entries.get(filename)
+
+    def is_unchanged(self, filename: str, digest: str) -> bool:
+        """True si el archivo ya está registrado con exactamente este contenido"""
+        entry = self.get(filename)
+        return entry is not None and entry["sha256"] == digest and os.path.exists(self.path(filename))
+
+    def existing_size(self, filename: str) -> Optional[int]:
+        """Tamaño actual según el manifiesto (o el sistema de archivos si no está registrado)"""
+        entry = self.get(filename)
+        if entry is not None:
+            return entry["size"]
+        path = self.path(filename)
+        return os.path.getsize(path) if os.path.exists(path) else None
+
+    def path(self, filename: str) -> str:
+        return os.path.join(self.output_dir, filename)
+
+    def write(self, filename: str, content: str, agent: str, message_index: Optional[int] = None,
+              digest: Optional[str] = None):
+        """Escribe el archivo de forma atómica y lo registra en el manifiesto"""
+        digest = digest or content_hash(content)
+        with self._lock:
+            atomic_write(self.path(filename), content)
+            self.entries[filename] = {
+                "sha256": digest,
+                "agent": agent,
+                "message_index": message_index,
+                "size": len(content.encode("utf-8")),
+                "updated": time.time(),
+            }
+            self._save_manifest()
+
+    def _save_manifest(self):
+        atomic_write(self.manifest_path, json.dumps({"files": self.entries}, indent=2, ensure_ascii=False))
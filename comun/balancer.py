@@ -0,0 +1,244 @@
+"""Reparto de las generaciones entre varios servidores Ollama, con comprobaciones de salud.
+
+Con OLLAMA_BASE_URLS (varias URL separadas por comas, con el formato de OLLAMA_BASE_URL)
+cada generación va al servidor con menos peticiones en curso. Se prefieren los servidores
+que ya tienen cargado el modelo pedido mientras les queden slots libres (OLLAMA_NUM_PARALLEL),
+porque en CPU cargar un modelo cuesta más que esperar un turno.
+
+Un servidor que falla (conexión rechazada, error 5xx o 429) queda fuera del reparto tras
+eject_after fallos seguidos durante eject_seconds, y la petición se repite en otro. Las
+comprobaciones de salud (GET /api/ps, que además dice qué modelos tiene cargados) lo
+devuelven al reparto en cuanto responde, o lo sacan antes de que le llegue una petición.
+Si todos están fuera, se prueba el que antes volvería, en lugar de fallar sin intentarlo.
+
+- OLLAMA_BASE_URLS: servidores del reparto (con menos de dos no hay reparto)
+- OLLAMA_LB_RETRIES: otros servidores que se prueban tras un fallo (2)
+- OLLAMA_LB_EJECT_AFTER: fallos seguidos para sacar un servidor del reparto (1)
+- OLLAMA_LB_EJECT_SECONDS: segundos fuera del reparto (30)
+- OLLAMA_LB_HEALTH_INTERVAL: segundos entre comprobaciones de salud (10; 0 las desactiva)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import httpx
+
+from comun.http_pool import endpoint_pool
+from comun.scheduler import native_root_url
+
+DEFAULT_RETRIES = 2
+DEFAULT_EJECT_AFTER = 1
+DEFAULT_EJECT_SECONDS = 30.0
+DEFAULT_HEALTH_INTERVAL = 10.0
+HEALTH_TIMEOUT = 5.0
+
+
+def model_key(name: str) -> str:
+    """Nombre del modelo sin la etiqueta por defecto (/api/ps devuelve "llama3:latest")"""
+    return name[:-len(":latest")] if name.endswith(":latest") else name
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Fallo del servidor o de la conexión, que otro servidor puede no tener"""
+    from openai import APIConnectionError
+
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status >= 500 or status == 429
+    return isinstance(error, (httpx.TransportError, APIConnectionError, ConnectionError, TimeoutError))
+
+
+class Endpoint:
+    """Estado de un servidor del reparto"""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+        self.root_url = native_root_url(self.base_url)
+        self.outstanding = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.last_error: Optional[str] = None
+        # Modelos cargados, del menos al más reciente
+        self.loaded: "OrderedDict[str, float]" = OrderedDict()
+
+    def available(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+
+class EndpointBalancer:
+    """Elige servidor para cada generación, repite en otro si falla y vigila su salud.
+
+    slots: peticiones simultáneas que atiende cada servidor (OLLAMA_NUM_PARALLEL).
+    max_loaded: modelos residentes por servidor (OLLAMA_MAX_LOADED_MODELS; 0 = sin límite),
+    para estimar cuáles siguen cargados entre comprobaciones de salud.
+    """
+
+    def __init__(self, base_urls: Iterable[str], slots: int = 1, max_loaded: int = 1, retries: int = DEFAULT_RETRIES,
+                 eject_after: int = DEFAULT_EJECT_AFTER, eject_seconds: float = DEFAULT_EJECT_SECONDS,
+                 health_interval: float = DEFAULT_HEALTH_INTERVAL):
+        self.endpoints = [Endpoint(base_url) for base_url in base_urls]
+        self.slots = max(1, slots)
+        self.max_loaded = max_loaded
+        self.retries = retries
+        self.eject_after = max(1, eject_after)
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self.retried = 0
+        self.health_checks = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._health_thread: Optional[threading.Thread] = None
+
+    @property
+    def base_urls(self) -> List[str]:
+        return [endpoint.base_url for endpoint in self.endpoints]
+
+    def _acquire(self, model: str, exclude: List[Endpoint]) -> Optional[Endpoint]:
+        """Reserva el servidor para la petición (None si ya se han probado todos)"""
+        key = model_key(model)
+        now = time.time()
+        with self._lock:
+            untried = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+            if not untried:
+                return None
+            candidates = [endpoint for endpoint in untried if endpoint.available(now)]
+            if not candidates:
+                # Todos fuera del reparto: el que antes volvería
+                candidates = [min(untried, key=lambda endpoint: endpoint.ejected_until)]
+            warm = [endpoint for endpoint in candidates if key in endpoint.loaded and endpoint.outstanding < self.slots]
+            chosen = min(warm or candidates,
+                         key=lambda endpoint: (endpoint.outstanding, key not in endpoint.loaded, endpoint.requests))
+            chosen.outstanding += 1
+            chosen.requests += 1
+            return chosen
+
+    def _loaded(self, endpoint: Endpoint, model: str):
+        endpoint.loaded[model_key(model)] = time.time()
+        endpoint.loaded.move_to_end(model_key(model))
+        while self.max_loaded and len(endpoint.loaded) > self.max_loaded:
+            endpoint.loaded.popitem(last=False)
+
+    def _eject(self, endpoint: Endpoint, error: str):
+        """Con el bloqueo tomado: fuera del reparto durante eject_seconds"""
+        if endpoint.available(time.time()):
+            endpoint.ejections += 1
+            print(f"⚠️  {endpoint.base_url} fuera del reparto durante {self.eject_seconds:.0f}s: {error}")
+        endpoint.ejected_until = time.time() + self.eject_seconds
+        endpoint.loaded.clear()
+
+    def call(self, model: str, request: Callable[[str], Any]) -> Any:
+        """request(base_url) en el servidor elegido; si falla, en otro hasta retries veces"""
+        tried: List[Endpoint] = []
+        while True:
+            endpoint = self._acquire(model, tried)
+            try:
+                result = request(endpoint.base_url)
+            except Exception as e:
+                retry = is_retryable(e) and len(tried) < self.retries and len(tried) + 1 < len(self.endpoints)
+                with self._lock:
+                    endpoint.outstanding -= 1
+                    endpoint.failures += 1
+                    endpoint.consecutive_failures += 1
+                    endpoint.last_error = str(e)
+                    if is_retryable(e) and endpoint.consecutive_failures >= self.eject_after:
+                        self._eject(endpoint, str(e))
+                    if retry:
+                        self.retried += 1
+                if not retry:
+                    raise
+                tried.append(endpoint)
+                continue
+            with self._lock:
+                endpoint.outstanding -= 1
+                endpoint.consecutive_failures = 0
+                self._loaded(endpoint, model)
+            return result
+
+    def check_health(self):
+        """Una pasada por todos los servidores: los que responden vuelven al reparto"""
+        for endpoint in self.endpoints:
+            try:
+                response = endpoint_pool(endpoint.root_url).client.get(f"{endpoint.root_url}/api/ps",
+                                                                       timeout=HEALTH_TIMEOUT)
+                response.raise_for_status()
+                models = [model_key(item.get("name") or item.get("model") or "")
+                          for item in response.json().get("models") or []]
+            except Exception as e:
+                with self._lock:
+                    endpoint.last_error = str(e)
+                    self._eject(endpoint, str(e))
+                continue
+            with self._lock:
+                if not endpoint.available(time.time()):
+                    print(f"✅ {endpoint.base_url} vuelve al reparto")
+                endpoint.ejected_until = 0.0
+                endpoint.consecutive_failures = 0
+                endpoint.loaded = OrderedDict((name, time.time()) for name in models if name)
+        with self._lock:
+            self.health_checks += 1
+
+    def start(self):
+        """Primera comprobación (qué modelos tiene cargados cada servidor) y, si hay intervalo, las periódicas"""
+        self.check_health()
+        if self.health_interval > 0 and self._health_thread is None:
+            self._health_thread = threading.Thread(target=self._health_loop, daemon=True)
+            self._health_thread.start()
+        return self
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            self.check_health()
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self) -> Dict[str, Any]:
+        now = time.time()
+        with self._lock:
+            return {
+                "slots": self.slots,
+                "retries": self.retries,
+                "eject_after": self.eject_after,
+                "eject_seconds": self.eject_seconds,
+                "health_interval": self.health_interval,
+                "health_checks": self.health_checks,
+                "retried": self.retried,
+                "endpoints": [{
+                    "base_url": endpoint.base_url,
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "ejections": endpoint.ejections,
+                    "available": endpoint.available(now),
+                    "loaded": list(endpoint.loaded),
+                    "last_error": endpoint.last_error,
+                } for endpoint in self.endpoints],
+            }
+
+    def print_summary(self):
+        stats = self.stats()
+        print(f"\nReparto entre {len(stats['endpoints'])} servidores ({stats['retried']} peticiones repetidas en otro):")
+        for endpoint in stats["endpoints"]:
+            state = "" if endpoint["available"] else ", fuera del reparto"
+            print(f"- {endpoint['base_url']}: {endpoint['requests']} peticiones, {endpoint['failures']} fallos, "
+                  f"{endpoint['ejections']} expulsiones{state}")
+
+
+def balancer_from_env(slots: int = 1) -> Optional[EndpointBalancer]:
+    """Reparto entre los servidores de OLLAMA_BASE_URLS (None si hay menos de dos)"""
+    base_urls = [url.strip() for url in os.environ.get("OLLAMA_BASE_URLS", "").split(",") if url.strip()]
+    if len(base_urls) < 2:
+        return None
+    return EndpointBalancer(
+        base_urls,
+        slots=slots,
+        max_loaded=int(os.environ.get("OLLAMA_MAX_LOADED_MODELS", "1")),
+        retries=int(os.environ.get("OLLAMA_LB_RETRIES", str(DEFAULT_RETRIES))),
+        eject_after=int(os.environ.get("OLLAMA_LB_EJECT_AFTER", str(DEFAULT_EJECT_AFTER))),
+        eject_seconds=float(os.environ.get("OLLAMA_LB_EJECT_SECONDS", str(DEFAULT_EJECT_SECONDS))),
+        health_interval=float(os.environ.get("OLLAMA_LB_HEALTH_INTERVAL", str(DEFAULT_HEALTH_INTERVAL))),
+    ).start()
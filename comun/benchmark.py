@@ -0,0 +1,237 @@
+"""Benchmark de extremo a extremo de ambos casos contra el servidor simulado.
+
+Ejecuta Caso1.py y Caso2.py como subprocesos apuntando a un StubOllamaServer local y
+separa el tiempo total en: arranque de Python/autogen, tiempo de modelo simulado y
+sobrecarga del framework (bucle del GroupChat, validación con regex, extracción de archivos).
+El tiempo de carga de modelos simulado (--load-time) se descuenta aparte.
+
+También mide la extracción de bloques de código sobre transcripciones sintéticas de
+varios MB, comparando el tokenizador de una pasada con los tres patrones regex anteriores.
+
+Con --endpoints N se arrancan N servidores simulados en puertos distintos y los casos
+reparten sus peticiones entre ellos (OLLAMA_BASE_URLS, ver comun/balancer.py).
+
+Uso:
+    python -m comun.benchmark --runs 5 --latency 0.2 --tps 50
+    python -m comun.benchmark --endpoints 3 --tps 50 --load-time 2
+    python -m comun.benchmark --extraction --sizes-mb 1 2 4 8
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+from typing import Any, Dict, List
+
+from comun.fences import tokenize_fences
+from comun.metrics import summarize
+from comun.question_bank import BANK_NAME
+from comun.stub_server import DEFAULT_SCRIPT, StubOllamaServer, load_script
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CASES = {
+    "caso1": os.path.join(REPO_ROOT, "Caso-1", "Caso1.py"),
+    "caso2": os.path.join(REPO_ROOT, "Caso-2", "Caso2.py"),
+}
+
+
+def measure_startup(runs: int = 3) -> float:
+    """Tiempo medio de arrancar el intérprete e importar autogen"""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "import autogen"], check=True, capture_output=True)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def run_case(case: str, servers: List[StubOllamaServer], timeout: float) -> Dict[str, Any]:
+    """Ejecuta un caso en un directorio temporal y devuelve sus tiempos (sumando los de todos los servidores)"""
+    for server in servers:
+        server.state.reset_stats()
+    env = {
+        **os.environ,
+        "OLLAMA_BASE_URL": servers[0].base_url,
+        "LLM_CACHE_MODE": "passthrough",
+        "PYTHONIOENCODING": "utf-8",
+    }
+    if len(servers) > 1:
+        env["OLLAMA_BASE_URLS"] = ",".join(server.base_url for server in servers)
+
+    with tempfile.TemporaryDirectory(prefix=f"bench_{case}_") as workdir:
+        # Banco de preguntas vacío en cada ejecución: abrirlo reconstruye su índice LSH
+        env["QUESTION_BANK_PATH"] = os.path.join(workdir, BANK_NAME)
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, CASES[case]], cwd=workdir, env=env,
+                              capture_output=True, text=True, timeout=timeout)
+        wall_time = time.perf_counter() - start
+
+    snapshots = [server.state.snapshot() for server in servers]
+
+    def total(name):
+        return sum(stats[name] for stats in snapshots)
+
+    return {
+        "case": case,
+        "returncode": proc.returncode,
+        "wall_time": wall_time,
+        "model_time": total("model_time"),
+        "requests": total("requests"),
+        "requests_by_endpoint": [stats["requests"] for stats in snapshots],
+        "failures": total("failures"),
+        "prompt_tokens": total("prompt_tokens"),
+        "completion_tokens": total("completion_tokens"),
+        "model_loads": total("loads"),
+        "load_time": total("load_time"),
+        "stderr_tail": proc.stderr[-500:] if proc.returncode else "",
+    }
+
+
+def run_benchmark(cases: List[str], runs: int, timeout: float, endpoints: int = 1, **server_kwargs) -> Dict[str, Any]:
+    startup_time = measure_startup()
+    report: Dict[str, Any] = {"config": {**server_kwargs, "runs": runs, "endpoints": endpoints},
+                              "startup_time": round(startup_time, 4), "cases": {}}
+    report["config"].pop("script", None)
+
+    with ExitStack() as stack:
+        servers = [stack.enter_context(StubOllamaServer(**server_kwargs)) for _ in range(endpoints)]
+        for case in cases:
+            results = []
+            for run in range(runs):
+                result = run_case(case, servers, timeout)
+                result["framework_overhead"] = max(
+                    0.0, result["wall_time"] - result["model_time"] - result["load_time"] - startup_time
+                )
+                results.append(result)
+                print(f"[{case}] ejecución {run + 1}/{runs}: {result['wall_time']:.2f}s total, "
+                      f"{result['model_time']:.2f}s modelo, {result['framework_overhead']:.2f}s framework, "
+                      f"{result['requests']} peticiones {result['requests_by_endpoint']}, "
+                      f"{result['model_loads']} cargas de modelo")
+                if result["returncode"]:
+                    print(f"  ⚠️  código de salida {result['returncode']}: {result['stderr_tail']}")
+
+            report["cases"][case] = {
+                "runs": results,
+                "wall_time": summarize([r["wall_time"] for r in results]),
+                "model_time": summarize([r["model_time"] for r in results]),
+                "framework_overhead": summarize([r["framework_overhead"] for r in results]),
+                "requests": summarize([r["requests"] for r in results]),
+                "model_loads": summarize([r["model_loads"] for r in results]),
+            }
+    return report
+
+
+# Patrones que usaba extract_and_save_code antes del tokenizador (se solapan entre sí)
+LEGACY_CODE_PATTERNS = [
+    r'```python\s*\n(.*?)```',
+    r'```(?:txt|text|markdown|md|)\s*\n(.*?)```',
+    r'```\s*\n(.*?)```',
+]
+
+
+def synthetic_transcript(size_mb: float) -> str:
+    """Concatena respuestas de los agentes de Caso 2 (prosa + bloques) hasta el tamaño pedido"""
+    replies = [rule["reply"] for rule in DEFAULT_SCRIPT if "```" in rule["reply"]]
+    prose = "Explicación del código generado, con detalles de diseño y decisiones tomadas. " * 5
+    target = int(size_mb * 1024 * 1024)
+    parts, size, index = [], 0, 0
+    while size < target:
+        part = f"{prose}\n\n{replies[index % len(replies)]}\n\n"
+        parts.append(part)
+        size += len(part)
+        index += 1
+    return "".join(parts)
+
+
+def legacy_extract_blocks(text: str) -> List[str]:
+    blocks = []
+    for pattern in LEGACY_CODE_PATTERNS:
+        blocks.extend(re.findall(pattern, text, re.DOTALL | re.IGNORECASE))
+    return blocks
+
+
+def run_extraction_benchmark(sizes_mb: List[float], repeats: int = 3) -> Dict[str, Any]:
+    """Mide el coste de extraer los bloques de transcripciones cada vez más grandes"""
+    results = []
+    for size_mb in sizes_mb:
+        text = synthetic_transcript(size_mb)
+        row = {"size_mb": size_mb}
+        for name, extract in (("tokenizer", tokenize_fences), ("legacy_regex", legacy_extract_blocks)):
+            times = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                blocks = extract(text)
+                times.append(time.perf_counter() - start)
+            row[name] = {
+                "seconds": round(min(times), 4),
+                "seconds_per_mb": round(min(times) / size_mb, 4),
+                "blocks": len(blocks),
+            }
+        results.append(row)
+        print(f"{size_mb:>6.1f} MB  tokenizador {row['tokenizer']['seconds_per_mb']:.4f}s/MB "
+              f"({row['tokenizer']['blocks']} bloques)  regex {row['legacy_regex']['seconds_per_mb']:.4f}s/MB "
+              f"({row['legacy_regex']['blocks']} bloques)")
+    return {"extraction": results}
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{'='*60}")
+    print("RESUMEN DEL BENCHMARK")
+    print(f"{'='*60}")
+    print(f"Arranque de Python + autogen: {report['startup_time']:.2f}s")
+    for case, summary in report["cases"].items():
+        print(f"\n{case}:")
+        for metric in ("wall_time", "model_time", "framework_overhead"):
+            values = summary[metric]
+            print(f"  {metric:<20} p50={values['p50']:.3f}s  p95={values['p95']:.3f}s  media={values['mean']:.3f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de los casos contra un Ollama simulado")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=sorted(CASES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--tps", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load-time", type=float, default=0.0, help="Segundos que tarda en cargarse un modelo")
+    parser.add_argument("--max-loaded", type=int, default=0, help="Modelos residentes a la vez (0 = sin límite)")
+    parser.add_argument("--script", help="Guion JSON de respuestas para el servidor simulado")
+    parser.add_argument("--endpoints", type=int, default=1,
+                        help="Servidores simulados entre los que se reparten las peticiones")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--extraction", action="store_true",
+                        help="Mide solo la extracción de bloques de código sobre transcripciones sintéticas")
+    parser.add_argument("--sizes-mb", nargs="+", type=float, default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    if args.extraction:
+        report = run_extraction_benchmark(args.sizes_mb)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nResultados guardados en {args.output}")
+        return
+
+    report = run_benchmark(
+        args.cases, args.runs, args.timeout, endpoints=args.endpoints,
+        script=load_script(args.script) if args.script else None,
+        latency=args.latency, tokens_per_second=args.tps,
+        failure_rate=args.failure_rate, seed=args.seed,
+        load_time=args.load_time, max_loaded=args.max_loaded,
+    )
+    print_report(report)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados guardados en {args.output}")
+
+
+if __name__ == "__main__":
+    main()
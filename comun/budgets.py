@@ -0,0 +1,101 @@
+"""Secuencias de parada y presupuestos de tokens (num_predict) por agente.
+
+Cada etapa sabe cuánto ocupa su salida (20 respuestas SÍ/NO no necesitan 2.000 tokens) y
+con qué frase termina. El cliente de Ollama recibe por agente un presupuesto (max_tokens,
+que Ollama aplica como num_predict) y sus secuencias de parada.
+
+Las paradas se aplican en el cliente sobre el streaming y no en el servidor: Ollama quita
+de la salida la secuencia que detiene la generación, y las comprobaciones de terminación
+necesitan ver la frase. La respuesta se corta justo después de la frase y se cierra el
+stream, con lo que el servidor deja de generar.
+
+budget_report() compara en cada agente los tokens generados con su presupuesto: los
+turnos cortados por una parada, los tokens que quedaban por debajo del presupuesto y los
+turnos que lo agotaron (finish_reason "length").
+"""
+import math
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Margen sobre el tamaño esperado de la salida
+DEFAULT_MARGIN = 1.5
+
+
+def token_budget(items: int, tokens_per_item: int, overhead: int = 0, margin: float = DEFAULT_MARGIN) -> int:
+    """Presupuesto para items elementos de unos tokens_per_item tokens más overhead, con margen"""
+    return int(math.ceil((items * tokens_per_item + overhead) * margin))
+
+
+def find_stop(text: str, stops: Iterable[str], start: int = 0) -> Optional[Tuple[int, str]]:
+    """(fin, secuencia) de la primera secuencia de parada que aparece en text a partir de start"""
+    best = None
+    for stop in stops:
+        index = text.find(stop, start)
+        if index != -1 and (best is None or index < best[0]):
+            best = (index, stop)
+    return (best[0] + len(best[1]), best[1]) if best else None
+
+
+class StopScanner:
+    """Busca las secuencias de parada en el texto que llega por trozos.
+
+    Una secuencia puede quedar repartida entre varios trozos: en cada uno se busca desde
+    len(secuencia más larga) - 1 caracteres antes de su inicio.
+    """
+
+    def __init__(self, stops: Iterable[str]):
+        self.stops = [stop for stop in stops if stop]
+        self.longest = max((len(stop) for stop in self.stops), default=0)
+        self.text = ""
+        self.matched: Optional[str] = None
+
+    def feed(self, chunk: str) -> str:
+        """Parte del trozo que se conserva; si contiene el final de una parada, matched dice cuál"""
+        if not self.stops or self.matched is not None:
+            return chunk
+        previous = len(self.text)
+        self.text += chunk
+        found = find_stop(self.text, self.stops, max(0, previous - self.longest + 1))
+        if found is None:
+            return chunk
+        end, self.matched = found
+        self.text = self.text[:end]
+        return chunk[:end - previous]
+
+
+def budget_report(turns: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Por agente: tokens generados frente al presupuesto y tokens cortados por las paradas.
+
+    tokens_cut es lo que quedaba de presupuesto en los turnos detenidos por una parada (lo
+    más que el modelo habría podido seguir generando tras la frase de cierre).
+    """
+    report: Dict[str, Dict[str, Any]] = {}
+    for turn in turns:
+        if turn.get("max_tokens") is None:
+            continue
+        agent = report.setdefault(turn["agent"], {
+            "turns": 0, "max_tokens": None, "budget_tokens": 0, "completion_tokens": 0,
+            "stopped_turns": 0, "tokens_cut": 0, "exhausted_turns": 0,
+        })
+        agent["turns"] += 1
+        agent["max_tokens"] = turn["max_tokens"]
+        agent["budget_tokens"] += turn["max_tokens"]
+        agent["completion_tokens"] += turn["completion_tokens"]
+        if turn.get("stop_sequence"):
+            agent["stopped_turns"] += 1
+            agent["tokens_cut"] += max(0, turn["max_tokens"] - turn["completion_tokens"])
+        elif turn.get("finish_reason") == "length":
+            agent["exhausted_turns"] += 1
+    for agent in report.values():
+        agent["budget_used"] = round(agent["completion_tokens"] / agent["budget_tokens"], 4) if agent["budget_tokens"] else 0.0
+    return report
+
+
+def print_budget_summary(turns: List[Dict[str, Any]]):
+    report = budget_report(turns)
+    if not report:
+        return
+    print("\nPresupuestos de tokens:")
+    for name, agent in report.items():
+        print(f"- {name}: {agent['completion_tokens']}/{agent['budget_tokens']} tokens ({agent['budget_used']:.0%}) "
+              f"en {agent['turns']} turnos; {agent['stopped_turns']} cortados por parada "
+              f"({agent['tokens_cut']} tokens de presupuesto sin usar), {agent['exhausted_turns']} agotaron el presupuesto")
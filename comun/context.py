@@ -0,0 +1,194 @@
+"""Proyección del historial: cada agente recibe solo los mensajes que necesita.
+
+En un GroupChat cada agente recibe la transcripción acumulada completa, así que el
+prompt crece con cada respuesta larga anterior (p. ej. el snake_game.py entero que le
+llega al Documentador) y, en CPU, el prefill se come buena parte del turno. Cada agente
+declara de qué remitentes necesita el último mensaje y, opcionalmente, una vista que lo
+reduce (solo la lista de preguntas, solo la API pública de un módulo).
+
+La proyección se aplica con el hook process_all_messages_before_reply: cambia lo que se
+envía al modelo, no el historial guardado del chat.
+"""
+import ast
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from comun.fences import tokenize_fences
+
+View = Callable[[str], str]
+
+
+def estimate_tokens(chars: int) -> int:
+    """Aproximación de tokens a partir de caracteres (~4 por token)"""
+    return chars // 4
+
+
+class ContextProjection:
+    """Recorta el historial de cada agente a lo que declara necesitar.
+
+    needs: {agente: {remitente: vista o None}}. De cada remitente declarado se envía solo
+    su último mensaje, pasado por la vista si la hay. Los mensajes sin remitente (los
+    propios del agente, las instrucciones del pipeline o de una reparación) se envían tal
+    cual. Los agentes que no aparecen en needs reciben la transcripción completa.
+    """
+
+    def __init__(self, needs: Dict[str, Dict[str, Optional[View]]], enabled: bool = True):
+        self.needs = needs
+        self.enabled = enabled
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def register(self, agents):
+        """Instala el hook en los agentes con necesidades declaradas"""
+        for agent in agents:
+            if agent.name in self.needs:
+                agent.register_hook("process_all_messages_before_reply", self._hook(agent.name))
+
+    def _hook(self, agent_name: str):
+        return lambda messages: self.project(agent_name, messages)
+
+    def project(self, agent_name: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        needs = self.needs.get(agent_name)
+        if not self.enabled or needs is None or not messages:
+            return messages
+
+        latest = {}
+        for index, message in enumerate(messages):
+            if message.get("name") in needs:
+                latest[message["name"]] = index
+
+        projected = []
+        chars_in = chars_out = 0
+        for index, message in enumerate(messages):
+            content = message.get("content")
+            size = len(content) if isinstance(content, str) else 0
+            chars_in += size
+            name = message.get("name")
+            if name is None:
+                projected.append(message)
+                chars_out += size
+            elif latest.get(name) == index:
+                view = needs[name]
+                if view and isinstance(content, str):
+                    message = {**message, "content": view(content)}
+                    size = len(message["content"])
+                projected.append(message)
+                chars_out += size
+
+        if not projected:
+            # Nada de lo declarado ha llegado todavía: al menos el mensaje que pide la respuesta
+            projected = [messages[-1]]
+            content = messages[-1].get("content")
+            chars_out = len(content) if isinstance(content, str) else 0
+
+        with self._lock:
+            stats = self._stats.setdefault(agent_name, {
+                "replies": 0, "messages_in": 0, "messages_out": 0, "chars_in": 0, "chars_out": 0,
+            })
+            stats["replies"] += 1
+            stats["messages_in"] += len(messages)
+            stats["messages_out"] += len(projected)
+            stats["chars_in"] += chars_in
+            stats["chars_out"] += chars_out
+        return projected
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            by_agent = {name: dict(stats) for name, stats in self._stats.items()}
+        for stats in by_agent.values():
+            stats["estimated_tokens_saved"] = estimate_tokens(stats["chars_in"] - stats["chars_out"])
+        chars_in = sum(stats["chars_in"] for stats in by_agent.values())
+        chars_out = sum(stats["chars_out"] for stats in by_agent.values())
+        return {
+            "enabled": self.enabled,
+            "chars_in": chars_in,
+            "chars_out": chars_out,
+            "estimated_tokens_saved": estimate_tokens(chars_in - chars_out),
+            "by_agent": by_agent,
+        }
+
+    def print_summary(self):
+        stats = self.stats()
+        if not stats["enabled"] or not stats["by_agent"]:
+            return
+        reduction = 1 - stats["chars_out"] / stats["chars_in"] if stats["chars_in"] else 0.0
+        print(f"\nProyección de contexto: {stats['chars_in']} -> {stats['chars_out']} caracteres enviados "
+              f"({reduction:.0%} menos, ~{stats['estimated_tokens_saved']} tokens de prefill ahorrados)")
+
+
+def _signature(node: ast.AST, indent: str) -> List[str]:
+    prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+    returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+    lines = [f"{indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}: ..."]
+    docstring = ast.get_docstring(node)
+    if docstring:
+        lines[0] = lines[0][:-len(" ...")]
+        lines.append(f'{indent}    """{docstring.strip().splitlines()[0]}"""')
+    return lines
+
+
+def _class_api(node: ast.ClassDef) -> List[str]:
+    bases = ", ".join(ast.unparse(base) for base in node.bases)
+    lines = [f"class {node.name}({bases}):" if bases else f"class {node.name}:"]
+    docstring = ast.get_docstring(node)
+    if docstring:
+        lines.append(f'    """{docstring.strip().splitlines()[0]}"""')
+    for child in node.body:
+        if isinstance(child, (ast.Assign, ast.AnnAssign)):
+            # Atributos de clase (p. ej. los miembros de un Enum)
+            lines.append(f"    {ast.unparse(child)}")
+        elif isinstance(child, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            if child.name.startswith("_") and child.name != "__init__":
+                continue
+            lines.extend(_signature(child, "    "))
+            if child.name == "__init__":
+                attributes = []
+                for statement in ast.walk(child):
+                    targets = statement.targets if isinstance(statement, ast.Assign) else (
+                        [statement.target] if isinstance(statement, ast.AnnAssign) else [])
+                    for target in targets:
+                        if (isinstance(target, ast.Attribute) and isinstance(target.value, ast.Name)
+                                and target.value.id == "self" and not target.attr.startswith("_")
+                                and target.attr not in attributes):
+                            attributes.append(target.attr)
+                if attributes:
+                    comment = f"# atributos: {', '.join(attributes)}"
+                    if lines[-1].endswith(": ..."):
+                        lines[-1] += f"  {comment}"
+                    else:
+                        lines.append(f"        {comment}")
+    if len(lines) == 1:
+        lines.append("    ...")
+    return lines
+
+
+def public_api(content: str) -> str:
+    """Solo la API pública del primer bloque Python: clases, firmas, atributos y constantes.
+
+    Si el contenido no tiene código Python analizable, se devuelve tal cual.
+    """
+    blocks = [block for block in tokenize_fences(content) if block.language in ("python", "py", "")]
+    source = blocks[0].content if blocks else content
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return content
+
+    lines = []
+    for node in tree.body:
+        if isinstance(node, ast.ClassDef) and not node.name.startswith("_"):
+            lines.extend(_class_api(node))
+        elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and not node.name.startswith("_"):
+            lines.extend(_signature(node, ""))
+        elif isinstance(node, ast.Assign) and all(
+                isinstance(target, ast.Name) and target.id.isupper() for target in node.targets):
+            lines.append(ast.unparse(node))
+        else:
+            continue
+        lines.append("")
+    if not lines:
+        return content
+
+    filename = blocks[0].filename if blocks else None
+    header = f"# API pública de {filename}" if filename else "# API pública"
+    return f"```python\n{header}\n" + "\n".join(lines).rstrip() + "\n```"
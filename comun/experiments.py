@@ -0,0 +1,237 @@
+"""Ejecutor de experimentos: N réplicas independientes de un caso en paralelo.
+
+Cada réplica corre en su propio proceso (ProcessPoolExecutor, un proceso nuevo por
+réplica) dentro de un directorio de trabajo aislado y con su propia semilla (LLM_SEED).
+Los resultados se agregan en un CSV con una fila por réplica y un resumen JSON con la
+tasa de éxito, la distribución de tiempos y, en Caso 1, la tasa de sesgo por categoría
+con intervalos de confianza del 95%.
+
+Uso:
+    python -m comun.experiments caso1 --runs 20 --workers 4 --seed 100
+    python -m comun.experiments caso2 --runs 5 --workers 2 -- --pipeline
+"""
+import argparse
+import csv
+import json
+import os
+import runpy
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, List
+
+from comun.benchmark import CASES
+from comun.bias import BIAS_CATEGORIES, normalize, wilson_interval
+from comun.llm_cache import run_cache_env
+from comun.metrics import summarize
+from comun.question_bank import BANK_NAME
+
+RESULT_FILES = {
+    "caso1": "test_results.json",
+    "caso2": os.path.join("Caso-2", "output", "caso2_report.json"),
+}
+
+
+def category_column(category: str) -> str:
+    return normalize(category).replace(" ", "_")
+
+
+def run_replica(case: str, index: int, seed: int, run_dir: str, script_args: List[str]) -> Dict[str, Any]:
+    """Ejecuta una réplica dentro del proceso trabajador y devuelve su fila de resultados"""
+    os.makedirs(run_dir, exist_ok=True)
+    os.chdir(run_dir)
+    os.environ["LLM_SEED"] = str(seed)
+    # En record, cada réplica graba su propia caché en lugar de escribir todas en la misma
+    os.environ.update(run_cache_env(run_dir))
+    # Y su propio banco de preguntas: las réplicas no comparten archivos
+    os.environ["QUESTION_BANK_PATH"] = os.path.join(os.path.abspath(run_dir), BANK_NAME)
+
+    # Toda la salida de la réplica va a su propio log (el proceso es exclusivo de esta réplica)
+    log = open("output.log", "w", encoding="utf-8")
+    os.dup2(log.fileno(), 1)
+    os.dup2(log.fileno(), 2)
+
+    sys.argv = [CASES[case]] + script_args
+    error = None
+    start = time.perf_counter()
+    try:
+        runpy.run_path(CASES[case], run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            error = f"SystemExit: {e.code}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        traceback.print_exc()
+    wall_time = time.perf_counter() - start
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    return collect_row(case, index, seed, run_dir, wall_time, error)
+
+
+def collect_row(case: str, index: int, seed: int, run_dir: str, wall_time: float, error) -> Dict[str, Any]:
+    """Lee el fichero de resultados de la réplica y lo resume en una fila plana"""
+    row: Dict[str, Any] = {
+        "case": case,
+        "run": index,
+        "seed": seed,
+        "run_dir": run_dir,
+        "success": False,
+        "error": error or "",
+        "wall_time": round(wall_time, 4),
+        "execution_time": None,
+        "tests_total": None,
+        "tests_passed": None,
+        "completion": None,
+        "code_passed": None,
+        "prompt_tokens": None,
+        "completion_tokens": None,
+    }
+    if case == "caso1":
+        for category in BIAS_CATEGORIES:
+            row[f"pairs_{category_column(category)}"] = 0
+            row[f"divergent_{category_column(category)}"] = 0
+
+    result_path = os.path.join(run_dir, RESULT_FILES[case])
+    if not os.path.exists(result_path):
+        row["error"] = row["error"] or f"No se generó {RESULT_FILES[case]}"
+        return row
+    with open(result_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    summary = (data.get("turn_metrics") or {}).get("summary", {})
+    row["prompt_tokens"] = sum(agent["prompt_tokens"] for agent in summary.values())
+    row["completion_tokens"] = sum(agent["completion_tokens"] for agent in summary.values())
+
+    if case == "caso1":
+        tests = data.get("test_results", {})
+        row["tests_total"] = len(tests)
+        row["tests_passed"] = sum(1 for test in tests.values() if test["passed"])
+        row["execution_time"] = row["wall_time"]
+        row["success"] = not error and bool(tests) and row["tests_passed"] == row["tests_total"]
+        for category, rates in (data.get("bias_rates") or {}).items():
+            row[f"pairs_{category_column(category)}"] = rates["pairs"]
+            row[f"divergent_{category_column(category)}"] = rates["divergent"]
+    else:
+        row["execution_time"] = data.get("execution_time")
+        row["completion"] = data["files"]["completion"]
+        # Los archivos deben existir y además compilar, importarse y pasar sus tests
+        row["code_passed"] = (data.get("code_validation") or {}).get("passed", True)
+        row["success"] = not error and row["completion"] == 100 and row["code_passed"]
+    return row
+
+
+def aggregate(case: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Tasa de éxito y tasas de sesgo con IC de Wilson al 95%; tiempos con p50/p95"""
+    successes = sum(1 for row in rows if row["success"])
+    low, high = wilson_interval(successes, len(rows))
+    report: Dict[str, Any] = {
+        "case": case,
+        "runs": len(rows),
+        "successes": successes,
+        "success_rate": round(successes / len(rows), 4) if rows else 0.0,
+        "success_ci95": [round(low, 4), round(high, 4)],
+        "wall_time": summarize([row["wall_time"] for row in rows]),
+        "execution_time": summarize([row["execution_time"] for row in rows if row["execution_time"] is not None]),
+        "errors": [{"run": row["run"], "error": row["error"]} for row in rows if row["error"]],
+    }
+
+    if case == "caso1":
+        # Los pares de todas las réplicas se combinan; la dispersión entre réplicas va aparte
+        report["bias_rates"] = {}
+        for category in BIAS_CATEGORIES:
+            column = category_column(category)
+            pairs = sum(row[f"pairs_{column}"] for row in rows)
+            divergent = sum(row[f"divergent_{column}"] for row in rows)
+            low, high = wilson_interval(divergent, pairs)
+            per_run = [row[f"divergent_{column}"] / row[f"pairs_{column}"] for row in rows if row[f"pairs_{column}"]]
+            report["bias_rates"][category] = {
+                "pairs": pairs,
+                "divergent": divergent,
+                "rate": round(divergent / pairs, 4) if pairs else 0.0,
+                "ci95": [round(low, 4), round(high, 4)],
+                "per_run": summarize(per_run),
+            }
+    else:
+        report["completion"] = summarize([row["completion"] for row in rows if row["completion"] is not None])
+    return report
+
+
+def run_experiments(case: str, runs: int, workers: int, base_seed: int, output_dir: str,
+                    script_args: List[str]) -> Dict[str, Any]:
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    rows = []
+
+    # max_tasks_per_child=1: cada réplica empieza con un intérprete limpio (los casos guardan su estado en variables del módulo)
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as executor:
+        futures = {}
+        for index in range(runs):
+            run_dir = os.path.join(output_dir, f"run_{index:03d}")
+            future = executor.submit(run_replica, case, index, base_seed + index, run_dir, script_args)
+            futures[future] = (index, run_dir)
+
+        for future in as_completed(futures):
+            index, run_dir = futures[future]
+            try:
+                row = future.result()
+            except Exception as e:
+                row = collect_row(case, index, base_seed + index, run_dir, 0.0, f"{type(e).__name__}: {e}")
+            rows.append(row)
+            print(f"[{case}] réplica {index + 1}/{runs} (semilla {row['seed']}): "
+                  f"{'OK' if row['success'] else 'FALLO'} en {row['wall_time']:.2f}s"
+                  + (f" - {row['error']}" if row["error"] else ""))
+
+    rows.sort(key=lambda row: row["run"])
+    with open(os.path.join(output_dir, "results.csv"), "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+    report = aggregate(case, rows)
+    report["config"] = {"runs": runs, "workers": workers, "base_seed": base_seed, "script_args": script_args}
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    return report
+
+
+def print_report(report: Dict[str, Any]):
+    print(f"\n{'='*60}")
+    print(f"RESUMEN DEL EXPERIMENTO ({report['case']}, {report['runs']} réplicas)")
+    print(f"{'='*60}")
+    print(f"Éxito: {report['successes']}/{report['runs']} ({report['success_rate']:.0%}, "
+          f"IC95% {report['success_ci95'][0]:.0%}-{report['success_ci95'][1]:.0%})")
+    print(f"Tiempo por réplica: p50={report['wall_time']['p50']:.2f}s  p95={report['wall_time']['p95']:.2f}s")
+    for category, rates in report.get("bias_rates", {}).items():
+        print(f"- {category}: {rates['divergent']}/{rates['pairs']} pares con respuestas distintas "
+              f"({rates['rate']:.0%}, IC95% {rates['ci95'][0]:.0%}-{rates['ci95'][1]:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Réplicas independientes de un caso en paralelo")
+    parser.add_argument("case", choices=sorted(CASES))
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--seed", type=int, default=0, help="Semilla de la primera réplica (las demás, consecutivas)")
+    parser.add_argument("--output-dir", help="Directorio del experimento (por defecto experiments/<caso>_<fecha>)")
+    parser.epilog = "Los argumentos tras '--' se pasan al script del caso (p. ej. -- --pipeline)"
+
+    # Todo lo que va tras '--' es del script del caso
+    argv = sys.argv[1:]
+    split = argv.index("--") if "--" in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+    script_args = argv[split + 1:]
+
+    output_dir = args.output_dir or os.path.join(
+        "experiments", f"{args.case}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    )
+
+    report = run_experiments(args.case, args.runs, args.workers, args.seed, output_dir, script_args)
+    print_report(report)
+    print(f"\nResultados en {os.path.abspath(output_dir)}/results.csv y summary.json")
+
+
+if __name__ == "__main__":
+    main()
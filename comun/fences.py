@@ -0,0 +1,196 @@
+"""Análisis de bloques de código markdown (```lenguaje ... ```) en una sola pasada"""
+import re
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+FENCE = "```"
+
+# Comentario con nombre de archivo en las primeras líneas del bloque: "# snake_logic.py", "# output/README.md"
+FILENAME_COMMENT = re.compile(r'#\s*(?:output/)?([a-zA-Z0-9_]+\.(?:py|txt|md))')
+FILENAME_HINT_LINES = 5
+
+
+def utf8_length(text: str) -> int:
+    """Bytes de text en UTF-8 (los sustitutos sueltos de un JSON mal formado cuentan 3, sin fallar)"""
+    return len(text.encode("utf-8", "surrogatepass"))
+
+
+@dataclass
+class CodeBlock:
+    """Bloque de código cerrado, desde la valla de apertura hasta el final de la de cierre.
+
+    start/end son índices de carácter en el str analizado (text[start:end] es el bloque);
+    byte_start/byte_end, las mismas posiciones en bytes de su codificación UTF-8, que
+    difieren en cuanto el texto lleva tildes o emojis. filename_line es el índice de la línea
+    del comentario con el nombre de archivo, si lo hay.
+    """
+    language: str
+    content: str
+    start: int
+    end: int
+    byte_start: int = 0
+    byte_end: int = 0
+    filename: Optional[str] = None
+    filename_line: Optional[int] = None
+
+
+class FenceStreamParser:
+    """Consume texto por trozos y devuelve cada bloque en cuanto llega su valla de cierre.
+
+    Trabaja por líneas completas: una valla solo se reconoce cuando su línea ha terminado,
+    por lo que los trozos pueden cortar el texto en cualquier punto. Cada carácter se
+    examina una sola vez, así que el coste es lineal en el tamaño total del texto.
+    """
+
+    def __init__(self):
+        self._pending = ""      # Línea incompleta pendiente de procesar
+        self._offset = 0        # Posición en el texto total del inicio de _pending
+        self._byte_offset = 0   # La misma posición, en bytes UTF-8
+        self._language: Optional[str] = None
+        self._block_start = 0
+        self._block_byte_start = 0
+        self._block_lines: List[str] = []
+        self.blocks: List[CodeBlock] = []
+
+    @property
+    def inside_block(self) -> bool:
+        return self._language is not None
+
+    def feed(self, text: str) -> List[CodeBlock]:
+        """Añade texto y devuelve los bloques que se han cerrado con él"""
+        buffer = self._pending + text
+        closed = []
+        position = 0
+        while True:
+            newline = buffer.find("\n", position)
+            if newline < 0:
+                break
+            line = buffer[position:newline]
+            block = self._process_line(line, self._offset + position, self._byte_offset)
+            if block:
+                closed.append(block)
+            self._byte_offset += utf8_length(line) + 1
+            position = newline + 1
+        self._offset += position
+        self._pending = buffer[position:]
+        return closed
+
+    def close(self) -> List[CodeBlock]:
+        """Procesa la última línea sin salto final (p. ej. una valla de cierre al acabar el texto)"""
+        if not self._pending:
+            return []
+        line, self._pending = self._pending, ""
+        block = self._process_line(line, self._offset, self._byte_offset)
+        self._offset += len(line)
+        self._byte_offset += utf8_length(line)
+        return [block] if block else []
+
+    def _process_line(self, line: str, line_start: int, line_byte_start: int) -> Optional[CodeBlock]:
+        if self._language is None:
+            stripped = line.lstrip()
+            if stripped.startswith(FENCE):
+                indent = len(line) - len(stripped)
+                self._language = stripped[len(FENCE):].strip().lower()
+                self._block_start = line_start + indent
+                self._block_byte_start = line_byte_start + utf8_length(line[:indent])
+                self._block_lines = []
+            return None
+
+        # Valla de cierre: la primera de la línea, aunque la siga texto ("``` (fin del archivo)")
+        # o esté pegada al final de la última línea de código; lo que la sigue se descarta
+        fence_index = line.find(FENCE)
+        if fence_index < 0:
+            self._block_lines.append(line)
+            return None
+
+        if line[:fence_index].strip():
+            self._block_lines.append(line[:fence_index])
+
+        block = CodeBlock(
+            language=self._language,
+            content="\n".join(self._block_lines),
+            start=self._block_start,
+            end=line_start + fence_index + len(FENCE),
+            byte_start=self._block_byte_start,
+            byte_end=line_byte_start + utf8_length(line[:fence_index]) + len(FENCE),
+        )
+        self._add_filename_hint(block)
+        self._language = None
+        self._block_lines = []
+        self.blocks.append(block)
+        return block
+
+    def _add_filename_hint(self, block: CodeBlock):
+        block.filename, block.filename_line = find_filename_hint(self._block_lines)
+
+
+def find_filename_hint(lines: List[str]) -> Tuple[Optional[str], Optional[int]]:
+    """Busca un comentario con nombre de archivo en las primeras líneas; devuelve (nombre, índice de línea)"""
+    for index, line in enumerate(lines[:FILENAME_HINT_LINES]):
+        match = FILENAME_COMMENT.search(line)
+        if match:
+            return match.group(1), index
+    return None, None
+
+
+def tokenize_fences(text: str) -> List[CodeBlock]:
+    """Devuelve, en una única pasada lineal, cada bloque de código del texto una sola vez.
+
+    Aplica las mismas reglas que FenceStreamParser, pero salta de valla en valla con
+    str.find en lugar de recorrer el texto línea a línea. Las posiciones en bytes se
+    calculan codificando solo el tramo desde la anterior, así que también son lineales.
+    """
+    blocks = []
+    length = len(text)
+    position = 0
+    ascii_only = text.isascii()
+    counted_chars = counted_bytes = 0
+
+    def byte_offset(index: int) -> int:
+        nonlocal counted_chars, counted_bytes
+        if ascii_only:
+            return index
+        counted_bytes += utf8_length(text[counted_chars:index])
+        counted_chars = index
+        return counted_bytes
+
+    while True:
+        # Valla de apertura: solo espacios delante en su línea
+        open_index = text.find(FENCE, position)
+        if open_index < 0:
+            break
+        line_start = text.rfind("\n", 0, open_index) + 1
+        if text[line_start:open_index].strip():
+            position = open_index + len(FENCE)
+            continue
+        open_line_end = text.find("\n", open_index)
+        if open_line_end < 0:
+            break
+        body_start = open_line_end + 1
+
+        # Valla de cierre: la primera tras la línea de apertura, la siga o no texto en su línea
+        close_index = text.find(FENCE, body_start)
+        if close_index < 0:
+            break
+        close_line_end = text.find("\n", close_index)
+        if close_line_end < 0:
+            close_line_end = length
+
+        close_line_start = text.rfind("\n", 0, close_index) + 1
+        lines = text[body_start:close_line_start - 1].split("\n") if close_line_start > body_start else []
+        prefix = text[close_line_start:close_index]
+        if prefix.strip():
+            lines.append(prefix)
+
+        block = CodeBlock(
+            language=text[open_index + len(FENCE):open_line_end].strip().lower(),
+            content="\n".join(lines),
+            start=open_index,
+            end=close_index + len(FENCE),
+            byte_start=byte_offset(open_index),
+            byte_end=byte_offset(close_index + len(FENCE)),
+        )
+        block.filename, block.filename_line = find_filename_hint(lines)
+        blocks.append(block)
+        position = close_line_end + 1
+    return blocks
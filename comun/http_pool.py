@@ -0,0 +1,165 @@
+"""Cliente HTTP compartido por endpoint, con keep-alive, para todas las peticiones a Ollama.
+
+Cada agente tiene su propio config_list apuntando al mismo OLLAMA_BASE_URL; sin esto, cada
+uno (y el GroupChatManager) construiría su cliente OpenAI con su propia conexión. Aquí hay
+un único httpx.Client por endpoint (esquema, host y puerto) en todo el proceso, con un
+número acotado de conexiones que se mantienen abiertas entre peticiones, y un único
+cliente OpenAI por base_url y api_key encima de él. La API compatible con OpenAI, la API
+nativa /api/chat y las cargas del planificador comparten así las mismas conexiones.
+
+Límites y tiempos de espera (se leen al crear el pool de cada endpoint):
+
+- OLLAMA_HTTP_MAX_CONNECTIONS: conexiones simultáneas como máximo (8)
+- OLLAMA_HTTP_MAX_KEEPALIVE: conexiones inactivas que se mantienen abiertas (las mismas)
+- OLLAMA_HTTP_KEEPALIVE_EXPIRY: segundos que una conexión inactiva sigue abierta (300)
+- OLLAMA_HTTP_TIMEOUT: segundos de espera de lectura, escritura y turno en el pool (600)
+- OLLAMA_HTTP_CONNECT_TIMEOUT: segundos para establecer una conexión (10)
+
+Cada petición se sigue con la extensión trace de httpcore: si abre conexión cuenta como
+nueva (con su tiempo de conexión), si no puede abrirla como fallida y si no, como reutilizada.
+"""
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+DEFAULT_MAX_CONNECTIONS = 8
+DEFAULT_KEEPALIVE_EXPIRY = 300.0
+DEFAULT_TIMEOUT = 600.0
+DEFAULT_CONNECT_TIMEOUT = 10.0
+
+
+def endpoint_of(base_url: str) -> str:
+    """Esquema, host y puerto de la URL: /v1 y /api del mismo servidor comparten pool"""
+    parts = urlsplit(str(base_url))
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class EndpointPool:
+    """httpx.Client con keep-alive de un endpoint y estadísticas de reutilización de conexiones"""
+
+    def __init__(self, endpoint: str, max_connections: int = DEFAULT_MAX_CONNECTIONS,
+                 max_keepalive: int = DEFAULT_MAX_CONNECTIONS, keepalive_expiry: float = DEFAULT_KEEPALIVE_EXPIRY,
+                 timeout: float = DEFAULT_TIMEOUT, connect_timeout: float = DEFAULT_CONNECT_TIMEOUT):
+        self.endpoint = endpoint
+        self.max_connections = max_connections
+        self.max_keepalive = max_keepalive
+        self.keepalive_expiry = keepalive_expiry
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive,
+                                keepalive_expiry=keepalive_expiry),
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            event_hooks={"request": [self._on_request]},
+        )
+        self._openai: Dict[Any, Any] = {}
+        self._lock = threading.Lock()
+        self.agents = set()
+        self.requests = 0
+        self.new_connections = 0
+        self.failed_connections = 0
+        self.connect_time = 0.0
+
+    def attach(self, agent_name: str):
+        """Anota un agente que usa el endpoint (para saber entre cuántos se reparte el pool)"""
+        with self._lock:
+            self.agents.add(agent_name)
+
+    def openai_client(self, base_url: str, api_key: str, max_retries: Optional[int] = None):
+        """Cliente OpenAI compartido por todos los agentes con esta base_url y api_key
+        (max_retries None deja los reintentos por defecto del cliente OpenAI)"""
+        from openai import OpenAI
+
+        key = (base_url, api_key, max_retries)
+        with self._lock:
+            if key not in self._openai:
+                kwargs = {"max_retries": max_retries} if max_retries is not None else {}
+                self._openai[key] = OpenAI(base_url=base_url, api_key=api_key, http_client=self.client, **kwargs)
+            return self._openai[key]
+
+    def _on_request(self, request: httpx.Request):
+        with self._lock:
+            self.requests += 1
+        connect_started: List[float] = []
+
+        def trace(event: str, info: Dict[str, Any]):
+            if event == "connection.connect_tcp.started":
+                connect_started.append(time.perf_counter())
+            elif event.endswith("send_request_headers.started") and connect_started:
+                # Conexión nueva (TCP y, si lo hay, TLS) lista para enviar la petición
+                elapsed = time.perf_counter() - connect_started.pop()
+                with self._lock:
+                    self.new_connections += 1
+                    self.connect_time += elapsed
+            elif event == "connection.connect_tcp.failed" and connect_started:
+                # Servidor caído: ni conexión nueva ni reutilizada
+                connect_started.pop()
+                with self._lock:
+                    self.failed_connections += 1
+
+        request.extensions["trace"] = trace
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            reused = max(0, self.requests - self.new_connections - self.failed_connections)
+            return {
+                "endpoint": self.endpoint,
+                "agents": len(self.agents),
+                "openai_clients": len(self._openai),
+                "requests": self.requests,
+                "new_connections": self.new_connections,
+                "failed_connections": self.failed_connections,
+                "reused_connections": reused,
+                "reuse_ratio": round(reused / self.requests, 4) if self.requests else 0.0,
+                "connect_time": round(self.connect_time, 4),
+                "avg_connect_time": round(self.connect_time / self.new_connections, 4) if self.new_connections else 0.0,
+                "max_connections": self.max_connections,
+                "max_keepalive": self.max_keepalive,
+                "keepalive_expiry": self.keepalive_expiry,
+                "timeout": self.timeout,
+                "connect_timeout": self.connect_timeout,
+            }
+
+    def close(self):
+        self.client.close()
+
+
+_pools: Dict[str, EndpointPool] = {}
+_pools_lock = threading.Lock()
+
+
+def endpoint_pool(base_url: str) -> EndpointPool:
+    """Pool del proceso para el endpoint de base_url (se crea la primera vez, según el entorno)"""
+    endpoint = endpoint_of(base_url)
+    with _pools_lock:
+        if endpoint not in _pools:
+            max_connections = int(os.environ.get("OLLAMA_HTTP_MAX_CONNECTIONS", str(DEFAULT_MAX_CONNECTIONS)))
+            _pools[endpoint] = EndpointPool(
+                endpoint,
+                max_connections=max_connections,
+                max_keepalive=int(os.environ.get("OLLAMA_HTTP_MAX_KEEPALIVE", str(max_connections))),
+                keepalive_expiry=float(os.environ.get("OLLAMA_HTTP_KEEPALIVE_EXPIRY", str(DEFAULT_KEEPALIVE_EXPIRY))),
+                timeout=float(os.environ.get("OLLAMA_HTTP_TIMEOUT", str(DEFAULT_TIMEOUT))),
+                connect_timeout=float(os.environ.get("OLLAMA_HTTP_CONNECT_TIMEOUT", str(DEFAULT_CONNECT_TIMEOUT))),
+            )
+        return _pools[endpoint]
+
+
+def pool_stats() -> List[Dict[str, Any]]:
+    """Estadísticas de cada endpoint usado en el proceso"""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [pool.stats() for pool in pools]
+
+
+def print_pool_summary():
+    for stats in pool_stats():
+        if not stats["requests"]:
+            continue
+        print(f"\nConexiones HTTP con {stats['endpoint']}: {stats['requests']} peticiones de {stats['agents']} "
+              f"agentes, {stats['reused_connections']} con conexión reutilizada ({stats['reuse_ratio']:.0%}), "
+              f"{stats['new_connections']} conexiones nuevas en {stats['connect_time']:.3f}s")
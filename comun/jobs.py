@@ -0,0 +1,689 @@
+"""Servicio local de trabajos: cola persistente de auditorías (Caso 1) y generaciones (Caso 2).
+
+En lugar de lanzar Caso1.py o Caso2.py a mano, cada usuario envía un trabajo al servicio
+(HTTP o socket Unix) y un grupo de trabajadores los ejecuta de uno en uno por trabajador,
+por orden de prioridad (mayor primero) y, a igual prioridad, de llegada. La cola está en
+SQLite, así que sobrevive a un reinicio del servicio.
+
+Cada trabajo corre como subproceso en su propio directorio (jobs/<id>/): ahí quedan su log
+(output.log), su diario (journal.jsonl), su banco de preguntas, su caché de respuestas en
+modo record y sus resultados (test_results.json o Caso-2/output/), así que los trabajos de
+distintos usuarios no se pisan. Los que estaban en
+marcha cuando el servicio se detuvo vuelven a la cola y continúan con --resume desde su
+diario. El progreso se lee del diario: mensajes escritos, etapas terminadas y último agente.
+
+- JOBS_DIR: directorio de los trabajos (jobs/ en la raíz del repositorio)
+- JOBS_DB_PATH: cola SQLite (JOBS_DIR/jobs.sqlite)
+- JOBS_WORKERS: trabajos simultáneos (1; todos comparten los servidores Ollama)
+- JOBS_HOST / JOBS_PORT: dirección HTTP del servicio (127.0.0.1:8765)
+- JOBS_SOCKET: socket Unix en lugar de HTTP por TCP
+- JOBS_URL: URL del servicio para las órdenes del cliente (http://JOBS_HOST:JOBS_PORT)
+- JOBS_CANCEL_GRACE: segundos entre SIGTERM y SIGKILL al cancelar (10)
+
+Uso:
+    python -m comun.jobs serve --workers 2
+    python -m comun.jobs submit caso1 --priority 5 -- --pipeline
+    python -m comun.jobs list
+    python -m comun.jobs show 3
+    python -m comun.jobs cancel 3
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from comun.benchmark import CASES, REPO_ROOT
+from comun.experiments import RESULT_FILES, collect_row
+from comun.journal import JOURNAL_NAME, read_journal
+from comun.llm_cache import run_cache_env
+from comun.question_bank import BANK_NAME
+
+DEFAULT_JOBS_DIR = os.path.join(REPO_ROOT, "jobs")
+DEFAULT_WORKERS = 1
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_CANCEL_GRACE = 10.0
+LOG_NAME = "output.log"
+LOG_TAIL = 20
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+# Rutas y modos que decide el servicio, no quien envía el trabajo
+RESERVED_ARGS = ("--output-dir", "--journal", "--resume", "--validate", "--import-bank")
+
+JOURNAL_PATHS = {
+    "caso1": JOURNAL_NAME,
+    "caso2": os.path.join("Caso-2", "output", JOURNAL_NAME),
+}
+
+
+class JobError(Exception):
+    """Petición inválida sobre la cola (status es el código HTTP que le corresponde)"""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def resumable(case: str, args: List[str]) -> bool:
+    """Los lotes de Caso 1 no escriben diario: se repiten desde el principio"""
+    return not (case == "caso1" and ("--batch" in args or "--sample" in args))
+
+
+class JobStore:
+    """Cola SQLite de trabajos con su estado, intentos y resultado"""
+
+    COLUMNS = ("id", "case_name", "args", "priority", "seed", "owner", "status", "job_dir", "created",
+               "started", "finished", "attempts", "pid", "exit_code", "error", "cancel_requested", "result")
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id INTEGER PRIMARY KEY,"
+            " case_name TEXT NOT NULL,"
+            " args TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " seed INTEGER,"
+            " owner TEXT,"
+            " status TEXT NOT NULL,"
+            " job_dir TEXT,"
+            " created REAL NOT NULL,"
+            " started REAL,"
+            " finished REAL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " pid INTEGER,"
+            " exit_code INTEGER,"
+            " error TEXT,"
+            " cancel_requested INTEGER NOT NULL DEFAULT 0,"
+            " result TEXT);"
+            "CREATE INDEX IF NOT EXISTS idx_jobs_queue ON jobs(status, priority, id);"
+        )
+        self._conn.commit()
+
+    def _row(self, row) -> Optional[Dict[str, Any]]:
+        if row is None:
+            return None
+        job = dict(zip(self.COLUMNS, row))
+        job = {"id": job.pop("id"), "case": job.pop("case_name"), **job}
+        job["args"] = json.loads(job["args"])
+        job["cancel_requested"] = bool(job["cancel_requested"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _select(self, where: str = "", params=()) -> List[Dict[str, Any]]:
+        rows = self._conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM jobs {where}", params).fetchall()
+        return [self._row(row) for row in rows]
+
+    def add(self, case: str, args: List[str], priority: int, seed: Optional[int], owner: Optional[str],
+            jobs_dir: str) -> Dict[str, Any]:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO jobs (case_name, args, priority, seed, owner, status, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (case, json.dumps(args), priority, seed, owner, QUEUED, time.time()),
+            )
+            job_dir = os.path.join(os.path.abspath(jobs_dir), f"{cursor.lastrowid:06d}")
+            self._conn.execute("UPDATE jobs SET job_dir = ? WHERE id = ?", (job_dir, cursor.lastrowid))
+            self._conn.commit()
+            return self._select("WHERE id = ?", (cursor.lastrowid,))[0]
+
+    def get(self, job_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            jobs = self._select("WHERE id = ?", (job_id,))
+        return jobs[0] if jobs else None
+
+    def list(self, status: Optional[str] = None, owner: Optional[str] = None) -> List[Dict[str, Any]]:
+        conditions, params = [], []
+        if status:
+            conditions.append("status = ?")
+            params.append(status)
+        if owner:
+            conditions.append("owner = ?")
+            params.append(owner)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        with self._lock:
+            return self._select(where + "ORDER BY id", params)
+
+    def position(self, job: Dict[str, Any]) -> Optional[int]:
+        """Puesto en la cola (1 = el siguiente en ejecutarse); None si no está en cola"""
+        if job["status"] != QUEUED:
+            return None
+        with self._lock:
+            ahead = self._conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority > ? OR (priority = ? AND id < ?))",
+                (QUEUED, job["priority"], job["priority"], job["id"]),
+            ).fetchone()[0]
+        return ahead + 1
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Pasa a RUNNING el trabajo en cola de mayor prioridad y lo devuelve"""
+        with self._lock:
+            jobs = self._select("WHERE status = ? ORDER BY priority DESC, id LIMIT 1", (QUEUED,))
+            if not jobs:
+                return None
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, started = ?, attempts = attempts + 1 WHERE id = ?",
+                (RUNNING, time.time(), jobs[0]["id"]),
+            )
+            self._conn.commit()
+            return self._select("WHERE id = ?", (jobs[0]["id"],))[0]
+
+    def update(self, job_id: int, **fields: Any):
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False) if fields["result"] is not None else None
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+            self._conn.commit()
+
+    def cancel_queued(self, job_id: int) -> bool:
+        """Cancela el trabajo si sigue en cola (False si ya lo ha tomado un trabajador)"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE jobs SET status = ?, cancel_requested = 1, finished = ? WHERE id = ? AND status = ?",
+                (CANCELLED, time.time(), job_id, QUEUED),
+            )
+            self._conn.commit()
+            return cursor.rowcount == 1
+
+    def requeue_running(self) -> int:
+        """Al arrancar: los trabajos que quedaron en marcha vuelven a la cola"""
+        with self._lock:
+            cursor = self._conn.execute("UPDATE jobs SET status = ?, pid = NULL WHERE status = ?", (QUEUED, RUNNING))
+            self._conn.commit()
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return {**{status: 0 for status in (QUEUED, RUNNING) + FINISHED}, **dict(rows)}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JobService:
+    """Grupo de trabajadores que toman trabajos de la cola y los ejecutan como subprocesos"""
+
+    def __init__(self, store: JobStore, jobs_dir: str, workers: int = DEFAULT_WORKERS,
+                 cancel_grace: float = DEFAULT_CANCEL_GRACE):
+        self.store = store
+        self.jobs_dir = jobs_dir
+        self.workers = max(1, workers)
+        self.cancel_grace = cancel_grace
+        self._processes: Dict[int, subprocess.Popen] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> "JobService":
+        requeued = self.store.requeue_running()
+        if requeued:
+            print(f"{requeued} trabajos interrumpidos vuelven a la cola")
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"job-worker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        return self
+
+    def stop(self):
+        """Detiene los trabajadores; los trabajos en marcha vuelven a la cola para reanudarse"""
+        with self._lock:
+            self._stopping = True
+            processes = list(self._processes.values())
+            self._wakeup.notify_all()
+        for process in processes:
+            self._terminate(process)
+        for thread in self._threads:
+            thread.join(timeout=self.cancel_grace + 5)
+
+    def submit(self, case: str, args: Optional[List[str]] = None, priority: int = 0, seed: Optional[int] = None,
+               owner: Optional[str] = None) -> Dict[str, Any]:
+        if case not in CASES:
+            raise JobError(f"Caso desconocido: {case} (opciones: {', '.join(sorted(CASES))})")
+        if seed is not None and (isinstance(seed, bool) or not isinstance(seed, int)):
+            raise JobError("seed debe ser un entero")
+        if owner is not None and not isinstance(owner, str):
+            raise JobError("owner debe ser una cadena")
+        if args is not None and not isinstance(args, (list, tuple)):
+            raise JobError("args debe ser una lista de cadenas")
+        args = list(args or [])
+        if not all(isinstance(arg, str) for arg in args):
+            raise JobError("args debe ser una lista de cadenas")
+        reserved = [arg for arg in args if arg.split("=", 1)[0] in RESERVED_ARGS]
+        if reserved:
+            raise JobError(f"El servicio decide estos argumentos: {', '.join(reserved)}")
+        job = self.store.add(case, args, int(priority), seed, owner, self.jobs_dir)
+        os.makedirs(job["job_dir"], exist_ok=True)
+        with self._lock:
+            self._wakeup.notify()
+        return job
+
+    def cancel(self, job_id: int) -> Dict[str, Any]:
+        job = self.get(job_id)
+        if job["status"] in FINISHED:
+            raise JobError(f"El trabajo {job_id} ya ha terminado ({job['status']})", status=409)
+        if not self.store.cancel_queued(job_id):
+            # En marcha: se marca y se detiene su proceso; el trabajador lo da por cancelado
+            self.store.update(job_id, cancel_requested=1)
+            with self._lock:
+                process = self._processes.get(job_id)
+            if process is not None:
+                threading.Thread(target=self._terminate, args=(process,), daemon=True).start()
+        return self.get(job_id)
+
+    def get(self, job_id: int) -> Dict[str, Any]:
+        job = self.store.get(job_id)
+        if job is None:
+            raise JobError(f"No existe el trabajo {job_id}", status=404)
+        return job
+
+    def status(self, job_id: int) -> Dict[str, Any]:
+        """Trabajo con su puesto en la cola y su progreso"""
+        job = self.get(job_id)
+        return {**job, "position": self.store.position(job), "progress": self.progress(job)}
+
+    def progress(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Progreso según el diario del trabajo (los lotes de Caso 1 solo tienen el log)"""
+        records, _ = read_journal(os.path.join(job["job_dir"], JOURNAL_PATHS[job["case"]]))
+        messages = [record for record in records if record["type"] == "message"]
+        runs = [record for record in records if record["type"] == "run"]
+        now = job["finished"] or time.time()
+        return {
+            "mode": runs[0].get("mode") if runs else None,
+            "resumes": sum(1 for record in runs if record.get("resumed")),
+            "messages": len(messages),
+            "completed_stages": [record["stage"] for record in records if record["type"] == "checkpoint"],
+            "last_agent": messages[-1]["name"] if messages else None,
+            "last_message_at": messages[-1]["time"] if messages else None,
+            "finished": any(record["type"] == "end" for record in records),
+            "elapsed": round(now - job["started"], 2) if job["started"] else None,
+        }
+
+    def log(self, job_id: int, tail: int = LOG_TAIL) -> List[str]:
+        path = os.path.join(self.get(job_id)["job_dir"], LOG_NAME)
+        if not os.path.exists(path):
+            return []
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            return [line.rstrip("\n") for line in deque(f, maxlen=max(1, tail))]
+
+    def result(self, job_id: int) -> Dict[str, Any]:
+        """Archivo de resultados del trabajo (test_results.json o caso2_report.json)"""
+        job = self.get(job_id)
+        path = os.path.join(job["job_dir"], RESULT_FILES[job["case"]])
+        if not os.path.exists(path):
+            raise JobError(f"El trabajo {job_id} no tiene resultados ({job['status']})", status=404)
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            running = sorted(self._processes)
+        return {"workers": self.workers, "running": running, "jobs": self.store.counts(), "db": self.store.path}
+
+    def _worker(self):
+        while True:
+            job = None
+            with self._lock:
+                while not self._stopping:
+                    job = self.store.claim()
+                    if job is not None:
+                        break
+                    self._wakeup.wait(timeout=5)
+                if self._stopping:
+                    if job is not None:
+                        self.store.update(job["id"], status=QUEUED)
+                    return
+            self._run(job)
+
+    def _command(self, job: Dict[str, Any]) -> List[str]:
+        command = [sys.executable, CASES[job["case"]], *job["args"]]
+        journal_path = os.path.join(job["job_dir"], JOURNAL_PATHS[job["case"]])
+        # Un intento anterior interrumpido: se continúa desde su diario
+        if job["attempts"] > 1 and resumable(job["case"], job["args"]) and read_journal(journal_path)[0]:
+            command.append("--resume")
+        return command
+
+    def _run(self, job: Dict[str, Any]):
+        job_dir = job["job_dir"]
+        os.makedirs(job_dir, exist_ok=True)
+        command = self._command(job)
+        env = {**os.environ, "PYTHONUNBUFFERED": "1"}
+        if job["seed"] is not None:
+            env["LLM_SEED"] = str(job["seed"])
+        # En record, cada trabajo graba su propia caché (se conserva entre intentos), y cada uno
+        # tiene su banco de preguntas
+        env.update(run_cache_env(job_dir))
+        env["QUESTION_BANK_PATH"] = os.path.join(job_dir, BANK_NAME)
+
+        print(f"▶️  Trabajo {job['id']} ({job['case']}, prioridad {job['priority']}, intento {job['attempts']}): "
+              f"{' '.join(command[2:]) or 'sin argumentos'}")
+        start = time.perf_counter()
+        with open(os.path.join(job_dir, LOG_NAME), "a", encoding="utf-8") as log:
+            log.write(f"=== intento {job['attempts']}: {' '.join(command)}\n")
+            log.flush()
+            try:
+                process = subprocess.Popen(command, cwd=job_dir, env=env, stdout=log, stderr=subprocess.STDOUT,
+                                           start_new_session=True)
+            except OSError as e:
+                self.store.update(job["id"], status=FAILED, finished=time.time(), error=str(e))
+                return
+            with self._lock:
+                self._processes[job["id"]] = process
+            self.store.update(job["id"], pid=process.pid)
+            if self.store.get(job["id"])["cancel_requested"]:
+                # Cancelado entre tomarlo de la cola y arrancar el proceso
+                self._terminate(process)
+            exit_code = process.wait()
+            with self._lock:
+                self._processes.pop(job["id"], None)
+                stopping = self._stopping
+        wall_time = time.perf_counter() - start
+
+        cancelled = self.store.get(job["id"])["cancel_requested"]
+        if stopping and not cancelled:
+            self.store.update(job["id"], status=QUEUED, pid=None)
+            print(f"⏸️  Trabajo {job['id']} interrumpido; continuará al reiniciar el servicio")
+            return
+        error = None if exit_code == 0 else f"código de salida {exit_code}"
+        status = CANCELLED if cancelled else SUCCEEDED if exit_code == 0 else FAILED
+        result = collect_row(job["case"], job["id"], job["seed"] or 0, job_dir, wall_time, error)
+        self.store.update(job["id"], status=status, finished=time.time(), pid=None, exit_code=exit_code,
+                          error=error, result=result)
+        icon = {SUCCEEDED: "✅", FAILED: "❌", CANCELLED: "🛑"}[status]
+        print(f"{icon} Trabajo {job['id']} ({job['case']}) {status} en {wall_time:.1f}s")
+
+    def _terminate(self, process: subprocess.Popen):
+        """SIGTERM al grupo del proceso (el caso y sus subprocesos) y SIGKILL si no termina"""
+        def send(sig):
+            try:
+                if hasattr(os, "killpg"):
+                    os.killpg(process.pid, sig)
+                else:
+                    process.terminate()
+            except ProcessLookupError:
+                pass
+
+        send(signal.SIGTERM)
+        try:
+            process.wait(timeout=self.cancel_grace)
+        except subprocess.TimeoutExpired:
+            send(getattr(signal, "SIGKILL", signal.SIGTERM))
+
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """API JSON del servicio:
+
+    POST /jobs                  {"case", "args", "priority", "seed", "owner"} -> trabajo en cola
+    GET  /jobs?status=&owner=   lista de trabajos
+    GET  /jobs/<id>             estado, puesto en la cola y progreso
+    GET  /jobs/<id>/log?tail=N  últimas líneas del log
+    GET  /jobs/<id>/result      archivo de resultados del caso
+    POST /jobs/<id>/cancel      cancela el trabajo (en cola o en marcha)
+    GET  /stats                 trabajadores y trabajos por estado
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def service(self) -> JobService:
+        return self.server.service
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError as e:
+            raise JobError(f"JSON inválido: {e}")
+        if not isinstance(body, dict):
+            raise JobError("El cuerpo debe ser un objeto JSON")
+        return body
+
+    def _send_json(self, status: int, payload: Any):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _route(self) -> List[str]:
+        return [part for part in urlsplit(self.path).path.split("/") if part]
+
+    def _job_id(self, part: str) -> int:
+        if not part.isdigit():
+            raise JobError(f"Identificador de trabajo inválido: {part}", status=404)
+        return int(part)
+
+    def _dispatch(self, handler):
+        try:
+            handler()
+        except JobError as e:
+            self._send_json(e.status, {"error": str(e)})
+
+    def do_GET(self):
+        self._dispatch(self._get)
+
+    def do_POST(self):
+        self._dispatch(self._post)
+
+    def _get(self):
+        route = self._route()
+        query = {key: values[-1] for key, values in parse_qs(urlsplit(self.path).query).items()}
+        if route == ["stats"]:
+            self._send_json(200, self.service.stats())
+        elif route == ["jobs"]:
+            self._send_json(200, {"jobs": self.service.store.list(query.get("status"), query.get("owner"))})
+        elif len(route) == 2 and route[0] == "jobs":
+            self._send_json(200, self.service.status(self._job_id(route[1])))
+        elif len(route) == 3 and route[0] == "jobs" and route[2] == "log":
+            tail = int(query["tail"]) if query.get("tail", "").isdigit() else LOG_TAIL
+            self._send_json(200, {"lines": self.service.log(self._job_id(route[1]), tail)})
+        elif len(route) == 3 and route[0] == "jobs" and route[2] == "result":
+            self._send_json(200, self.service.result(self._job_id(route[1])))
+        else:
+            self._send_json(404, {"error": f"ruta desconocida: {self.path}"})
+
+    def _post(self):
+        route = self._route()
+        if route == ["jobs"]:
+            body = self._read_json()
+            try:
+                job = self.service.submit(body.get("case"), body.get("args"), priority=int(body.get("priority", 0)),
+                                          seed=body.get("seed"), owner=body.get("owner"))
+            except (TypeError, ValueError) as e:
+                raise JobError(f"Trabajo inválido: {e}")
+            self._send_json(201, {**job, "position": self.service.store.position(job)})
+        elif len(route) == 3 and route[0] == "jobs" and route[2] == "cancel":
+            self._read_json()
+            self._send_json(200, self.service.cancel(self._job_id(route[1])))
+        else:
+            self._send_json(404, {"error": f"ruta desconocida: {self.path}"})
+
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service: JobService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT,
+                socket_path: Optional[str] = None):
+    """Servidor HTTP del servicio, por TCP o por el socket Unix socket_path"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        httpd = ThreadingUnixHTTPServer(socket_path, JobRequestHandler)
+    else:
+        httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+        httpd.daemon_threads = True
+    httpd.service = service
+    return httpd
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, socket_path: str, timeout: float = 30):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class JobClient:
+    """Cliente de la API del servicio (por TCP o socket Unix)"""
+
+    def __init__(self, url: Optional[str] = None, socket_path: Optional[str] = None):
+        self.url = url or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}"
+        self.socket_path = socket_path
+
+    def request(self, method: str, path: str, body: Optional[Dict[str, Any]] = None) -> Any:
+        if self.socket_path:
+            connection = UnixHTTPConnection(self.socket_path)
+        else:
+            parts = urlsplit(self.url)
+            connection = http.client.HTTPConnection(parts.hostname, parts.port or 80, timeout=30)
+        data = json.dumps(body or {}).encode("utf-8") if method == "POST" else None
+        try:
+            connection.request(method, path, body=data, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            payload = json.loads(response.read() or b"{}")
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise JobError(payload.get("error", f"HTTP {response.status}"), status=response.status)
+        return payload
+
+
+def service_from_env(jobs_dir: Optional[str] = None, workers: Optional[int] = None) -> JobService:
+    """Cola y trabajadores según JOBS_DIR, JOBS_DB_PATH, JOBS_WORKERS y JOBS_CANCEL_GRACE"""
+    jobs_dir = jobs_dir or os.environ.get("JOBS_DIR", DEFAULT_JOBS_DIR)
+    store = JobStore(os.environ.get("JOBS_DB_PATH", os.path.join(jobs_dir, "jobs.sqlite")))
+    return JobService(
+        store, jobs_dir,
+        workers=workers or int(os.environ.get("JOBS_WORKERS", str(DEFAULT_WORKERS))),
+        cancel_grace=float(os.environ.get("JOBS_CANCEL_GRACE", str(DEFAULT_CANCEL_GRACE))),
+    )
+
+
+def print_job(job: Dict[str, Any]):
+    position = f", puesto {job['position']} en la cola" if job.get("position") else ""
+    owner = f" de {job['owner']}" if job.get("owner") else ""
+    print(f"{job['id']:>5}  {job['case']}  {job['status']:<9}  prioridad {job['priority']}{owner}{position}  "
+          f"{' '.join(job['args'])}")
+
+
+def serve(args):
+    service = service_from_env(args.jobs_dir, args.workers).start()
+    httpd = make_server(service, args.host, args.port, args.socket)
+    where = args.socket or f"http://{args.host}:{args.port}"
+    print(f"Servicio de trabajos escuchando en {where} ({service.workers} trabajadores, cola en {service.store.path})")
+
+    def shutdown(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, shutdown)
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        service.stop()
+        service.store.close()
+        if args.socket and os.path.exists(args.socket):
+            os.unlink(args.socket)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio local de trabajos de Caso 1 y Caso 2")
+    # Dirección del servicio, común a todas las órdenes
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--url", default=os.environ.get("JOBS_URL"),
+                        help=f"URL del servicio (JOBS_URL, por defecto http://{DEFAULT_HOST}:{DEFAULT_PORT})")
+    common.add_argument("--socket", default=os.environ.get("JOBS_SOCKET"),
+                        help="Socket Unix del servicio en lugar de HTTP por TCP (JOBS_SOCKET)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", parents=[common], help="Arranca el servicio y sus trabajadores")
+    serve_parser.add_argument("--host", default=os.environ.get("JOBS_HOST", DEFAULT_HOST))
+    serve_parser.add_argument("--port", type=int, default=int(os.environ.get("JOBS_PORT", str(DEFAULT_PORT))))
+    serve_parser.add_argument("--workers", type=int, help=f"Trabajos simultáneos (JOBS_WORKERS, {DEFAULT_WORKERS})")
+    serve_parser.add_argument("--jobs-dir", help="Directorio de los trabajos (JOBS_DIR, jobs/ en la raíz)")
+
+    submit_parser = commands.add_parser("submit", parents=[common], help="Pone un trabajo en la cola",
+                                        epilog="Los argumentos tras '--' se pasan al script del caso")
+    submit_parser.add_argument("case", choices=sorted(CASES))
+    submit_parser.add_argument("--priority", type=int, default=0, help="Mayor primero (0)")
+    submit_parser.add_argument("--seed", type=int, help="LLM_SEED del trabajo")
+    submit_parser.add_argument("--owner", default=os.environ.get("USER"), help="Usuario que envía el trabajo")
+
+    list_parser = commands.add_parser("list", parents=[common], help="Lista los trabajos")
+    list_parser.add_argument("--status", choices=(QUEUED, RUNNING) + FINISHED)
+    list_parser.add_argument("--owner")
+
+    for name, help_text in (("show", "Estado y progreso de un trabajo"), ("cancel", "Cancela un trabajo"),
+                            ("log", "Últimas líneas del log de un trabajo")):
+        command_parser = commands.add_parser(name, parents=[common], help=help_text)
+        command_parser.add_argument("job_id", type=int)
+    commands.choices["log"].add_argument("--tail", type=int, default=LOG_TAIL)
+
+    # Todo lo que va tras '--' es del script del caso
+    argv = sys.argv[1:]
+    split = argv.index("--") if "--" in argv else len(argv)
+    args = parser.parse_args(argv[:split])
+    script_args = argv[split + 1:]
+
+    if args.command == "serve":
+        serve(args)
+        return
+
+    client = JobClient(args.url, args.socket)
+    try:
+        if args.command == "submit":
+            job = client.request("POST", "/jobs", {"case": args.case, "args": script_args, "priority": args.priority,
+                                                   "seed": args.seed, "owner": args.owner})
+            print(f"Trabajo {job['id']} en cola (puesto {job['position']}), directorio {job['job_dir']}")
+        elif args.command == "list":
+            query = "&".join(f"{key}={value}" for key, value in (("status", args.status), ("owner", args.owner)) if value)
+            for job in client.request("GET", f"/jobs?{query}" if query else "/jobs")["jobs"]:
+                print_job(job)
+        elif args.command == "show":
+            print(json.dumps(client.request("GET", f"/jobs/{args.job_id}"), indent=2, ensure_ascii=False))
+        elif args.command == "cancel":
+            print_job(client.request("POST", f"/jobs/{args.job_id}/cancel"))
+        elif args.command == "log":
+            print("\n".join(client.request("GET", f"/jobs/{args.job_id}/log?tail={args.tail}")["lines"]))
+    except (JobError, OSError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
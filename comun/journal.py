@@ -0,0 +1,175 @@
+"""Diario de la transcripción en JSONL de solo anexado, para reanudar ejecuciones interrumpidas.
+
+Cada mensaje se escribe en cuanto llega (una línea JSON, con flush y fsync) junto con las
+métricas de los turnos de LLM que lo produjeron. En modo pipeline, además, cada etapa
+terminada deja un checkpoint después de su on_complete (p. ej. tras guardar su código).
+Si Ollama cae en el turno 9, con --resume se reconstruye el estado desde el diario y se
+continúa desde la última etapa o el último mensaje completos, sin regenerar lo anterior.
+
+Tipos de registro: "run" (inicio o reanudación), "message", "checkpoint" y "end". Una línea
+final cortada por la caída se descarta al leer el diario.
+"""
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+def read_journal(path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """Registros válidos del diario y bytes que ocupan (lo que sigue es una línea incompleta)"""
+    records: List[Dict[str, Any]] = []
+    valid_bytes = 0
+    if not os.path.exists(path):
+        return records, valid_bytes
+    with open(path, "rb") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+            valid_bytes += len(line)
+    return records, valid_bytes
+
+
+class TranscriptJournal:
+    """Escribe la transcripción mensaje a mensaje y la reconstruye al reanudar.
+
+    metrics: TurnMetricsRecorder cuyos turnos se adjuntan a cada mensaje del agente que los
+    generó (y se restauran al reanudar).
+    """
+
+    def __init__(self, path: str, metrics=None):
+        self.path = path
+        self.metrics = metrics
+        self.records: List[Dict[str, Any]] = []
+        # Mientras se reconstruye el chat los mensajes ya están en el diario
+        self.paused = False
+        self._attached_turns = set()
+        self._file = None
+        self._lock = threading.Lock()
+
+    def start(self, resume: bool = False, **info: Any) -> List[Dict[str, Any]]:
+        """Abre el diario (vacío, o conservando sus registros si resume) y devuelve lo restaurado"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        restored: List[Dict[str, Any]] = []
+        if resume:
+            restored, valid_bytes = read_journal(self.path)
+            if os.path.exists(self.path):
+                # Sin la línea a medio escribir, para que lo nuevo empiece en una línea propia
+                with open(self.path, "r+b") as f:
+                    f.truncate(valid_bytes)
+        self.records = list(restored)
+        self._file = open(self.path, "a" if resume else "w", encoding="utf-8")
+        if self.metrics is not None:
+            self._restore_metrics()
+        self._write({"type": "run", "resumed": resume, **info})
+        return restored
+
+    def _restore_metrics(self):
+        self.metrics.restore([turn for record in self.records if record["type"] == "message"
+                              for turn in record.get("metrics", [])])
+        self._attached_turns.update(turn["turn"] for turn in list(self.metrics.turns))
+
+    def _write(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        record = {**record, "time": time.time()}
+        with self._lock:
+            if record["type"] == "message":
+                # Bajo el bloqueo: las etapas en paralelo terminan a la vez
+                record["index"] = sum(1 for previous in self.records if previous["type"] == "message")
+            self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self.records.append(record)
+        return record
+
+    def message(self, message: Dict[str, Any], stage: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Añade un mensaje con los turnos de su agente que aún no estaban en el diario"""
+        name = message.get("name")
+        turns = []
+        if self.metrics is not None:
+            with self._lock:
+                turns = [dict(turn) for turn in list(self.metrics.turns)
+                         if turn["agent"] == name and turn["turn"] not in self._attached_turns]
+                self._attached_turns.update(turn["turn"] for turn in turns)
+        return self._write({
+            "type": "message",
+            "name": name,
+            "role": message.get("role", "user"),
+            "content": message.get("content"),
+            "stage": stage,
+            "metrics": turns,
+        })
+
+    def checkpoint(self, stage: str):
+        """La etapa ha terminado, incluidos sus efectos (archivos guardados)"""
+        self._write({"type": "checkpoint", "stage": stage})
+
+    def finish(self, **info: Any):
+        self._write({"type": "end", **info})
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    @property
+    def messages(self) -> List[Dict[str, Any]]:
+        """Transcripción con el formato de GroupChat.messages"""
+        return [{"content": record["content"], "name": record["name"], "role": record["role"]}
+                for record in self.records if record["type"] == "message"]
+
+    @property
+    def completed_stages(self) -> Dict[str, str]:
+        """Salida de cada etapa con checkpoint"""
+        outputs = {record["stage"]: record["content"] for record in self.records
+                   if record["type"] == "message" and record.get("stage")}
+        return {record["stage"]: outputs[record["stage"]] for record in self.records
+                if record["type"] == "checkpoint" and record["stage"] in outputs}
+
+    @property
+    def finished(self) -> bool:
+        return any(record["type"] == "end" for record in self.records)
+
+    @property
+    def run_info(self) -> Dict[str, Any]:
+        """Datos del primer registro "run" (modo de la ejecución original)"""
+        return next((record for record in self.records if record["type"] == "run"), {})
+
+    def register(self, agents):
+        """Escribe cada mensaje que un agente envía al chat grupal (registrarlo después de los
+        hooks que lo modifican, para guardar el mensaje tal como llega)"""
+        for agent in agents:
+            agent.register_hook("process_message_before_send", self._hook)
+
+    def _hook(self, sender, message, recipient, silent):
+        content = message.get("content") if isinstance(message, dict) else message
+        if self.paused or not isinstance(content, str):
+            return message
+        messages = self.messages
+        # Al reanudar, el último mensaje restaurado se vuelve a enviar para continuar el chat
+        if messages and messages[-1]["name"] == sender.name and messages[-1]["content"] == content:
+            return message
+        role = message.get("role", "user") if isinstance(message, dict) else "user"
+        self.message({"name": sender.name, "role": role, "content": content})
+        return message
+
+
+def restore_group_chat(manager, messages: List[Dict[str, Any]], journal: TranscriptJournal, max_round: int):
+    """Carga en el chat grupal los mensajes del diario y devuelve (último agente, último mensaje).
+
+    Para continuar: last_agent.initiate_chat(manager, message=last_message, clear_history=False).
+    El round-robin sigue por el agente siguiente al último que habló, con las rondas que quedaban.
+    """
+    manager.groupchat.max_round = max(1, max_round - len(messages) + 1)
+    journal.paused = True
+    try:
+        return manager.resume(messages=messages, silent=True)
+    finally:
+        journal.paused = False
@@ -0,0 +1,152 @@
+"""Caché en disco de respuestas de LLM direccionada por contenido"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+CACHE_MODES = ("record", "replay", "passthrough")
+CACHE_NAME = "llm_cache.sqlite"
+# Segundos que una escritura espera a que otro proceso libere el archivo
+BUSY_TIMEOUT = 30.0
+
+# Parámetros que no influyen en el texto generado y no deben formar parte de la clave
+NON_SAMPLING_PARAMS = {"messages", "model", "stream", "api_type", "tags", "model_client_cls", "api_key", "base_url"}
+
+
+class CacheMissError(Exception):
+    """Se lanza en modo replay cuando una petición no está en la caché"""
+
+
+class LLMResponseCache:
+    """Caché SQLite de respuestas con expulsión LRU limitada por tamaño.
+
+    Modos:
+    - record: devuelve las respuestas guardadas y guarda las nuevas
+    - replay: solo devuelve respuestas guardadas (no necesita Ollama)
+    - passthrough: ignora la caché por completo
+    """
+
+    def __init__(self, path: str, mode: str = "record", max_size_mb: float = 256):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Modo de caché desconocido: {mode} (válidos: {', '.join(CACHE_MODES)})")
+
+        self.path = path
+        self.mode = mode
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT)
+        # WAL: las lecturas de otros procesos no bloquean las escrituras
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY,"
+            " response TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "passthrough"
+
+    @staticmethod
+    def make_key(model: str, base_url: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+        """Calcula la clave (sha256) a partir del modelo, la URL, los mensajes y los parámetros de muestreo"""
+        normalized_messages = [
+            {k: msg.get(k) for k in ("role", "name", "content") if msg.get(k) is not None}
+            for msg in messages
+        ]
+        sampling = {k: v for k, v in params.items() if k not in NON_SAMPLING_PARAMS and v is not None}
+        payload = json.dumps(
+            {"model": model, "base_url": base_url, "messages": normalized_messages, "params": sampling},
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Devuelve la respuesta guardada (o None) y actualiza su último acceso"""
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def set(self, key: str, response: Dict[str, Any]):
+        """Guarda una respuesta y expulsa las menos usadas si se supera el tamaño máximo"""
+        data = json.dumps(response, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, last_access) VALUES (?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), time.time()),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        """Elimina entradas por orden de último acceso hasta respetar el límite de tamaño"""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_size_bytes:
+            return
+
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if total <= self.max_size_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Estadísticas de uso de la caché"""
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "mode": self.mode,
+            "entries": entries,
+            "size_mb": round(size / 1024 / 1024, 3),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def cache_from_env(default_path: str) -> Optional[LLMResponseCache]:
+    """Crea la caché según LLM_CACHE_MODE, LLM_CACHE_PATH y LLM_CACHE_MAX_MB (None en modo passthrough)"""
+    mode = os.environ.get("LLM_CACHE_MODE", "passthrough")
+    if mode == "passthrough":
+        return None
+    path = os.environ.get("LLM_CACHE_PATH", default_path)
+    max_size_mb = float(os.environ.get("LLM_CACHE_MAX_MB", "256"))
+    return LLMResponseCache(path, mode=mode, max_size_mb=max_size_mb)
+
+
+def run_cache_env(run_dir: str) -> Dict[str, str]:
+    """LLM_CACHE_PATH propio de una ejecución aislada (réplica o trabajo) en modo record.
+
+    En replay la caché solo se lee, así que todas las ejecuciones pueden compartir la grabada.
+    """
+    if os.environ.get("LLM_CACHE_MODE", "passthrough") != "record":
+        return {}
+    return {"LLM_CACHE_PATH": os.path.join(os.path.abspath(run_dir), CACHE_NAME)}
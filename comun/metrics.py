@@ -0,0 +1,129 @@
+"""Métricas de latencia y rendimiento por agente y por turno"""
+import statistics
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+_local = threading.local()
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Percentil por el método del rango más cercano"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "mean": round(statistics.fmean(values), 4) if values else 0.0,
+        "p50": round(percentile(values, 50), 4),
+        "p95": round(percentile(values, 95), 4),
+        "min": round(min(values), 4) if values else 0.0,
+        "max": round(max(values), 4) if values else 0.0,
+    }
+
+
+def mark_enqueued(timestamp: Optional[float] = None):
+    """Marca en el hilo actual cuándo se encoló el turno que va a generarse (para medir la espera en cola)"""
+    _local.enqueued_at = timestamp if timestamp is not None else time.time()
+
+
+def pop_enqueued() -> Optional[float]:
+    enqueued_at = getattr(_local, "enqueued_at", None)
+    _local.enqueued_at = None
+    return enqueued_at
+
+
+class TurnMetricsRecorder:
+    """Acumula una entrada por cada generación de cada agente"""
+
+    def __init__(self):
+        self.turns: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def record(self, agent: str, model: str, queue_wait: float, time_to_first_token: Optional[float],
+               generation_time: float, prompt_tokens: int, completion_tokens: int, cached: bool = False,
+               **extra: Any) -> Dict[str, Any]:
+        # La velocidad de decodificación excluye el tiempo hasta el primer token (prefill)
+        decode_time = generation_time - (time_to_first_token or 0.0)
+        turn = {
+            "agent": agent,
+            "model": model,
+            "timestamp": time.time(),
+            "cached": cached,
+            "queue_wait": round(queue_wait, 4),
+            "time_to_first_token": round(time_to_first_token, 4) if time_to_first_token is not None else None,
+            "generation_time": round(generation_time, 4),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_second": round(completion_tokens / decode_time, 2) if decode_time > 0 else 0.0,
+            **extra,
+        }
+        with self._lock:
+            turn["turn"] = len(self.turns) + 1
+            self.turns.append(turn)
+        return turn
+
+    def restore(self, turns: List[Dict[str, Any]]):
+        """Añade turnos de una ejecución anterior (p. ej. desde el diario), renumerados a continuación"""
+        with self._lock:
+            for turn in turns:
+                self.turns.append({**turn, "turn": len(self.turns) + 1})
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Resumen p50/p95 por agente (las respuestas servidas desde caché no cuentan para los tiempos).
+
+        prefix_hit_rate y prefix_reuse solo aparecen con valor si los turnos traen datos del
+        prefijo (prefix_hit, prefix_chars, prompt_chars); prefill_time, si el servidor lo mide.
+        """
+        with self._lock:
+            turns = list(self.turns)
+
+        by_agent: Dict[str, List[Dict[str, Any]]] = {}
+        for turn in turns:
+            by_agent.setdefault(turn["agent"], []).append(turn)
+
+        summary = {}
+        for agent, agent_turns in by_agent.items():
+            generated = [t for t in agent_turns if not t["cached"]]
+            tracked = [t for t in generated if "prefix_hit" in t]
+            prompt_chars = sum(t["prompt_chars"] for t in tracked)
+            summary[agent] = {
+                "model": agent_turns[-1]["model"],
+                "turns": len(agent_turns),
+                "cached_turns": len(agent_turns) - len(generated),
+                "prompt_tokens": sum(t["prompt_tokens"] for t in agent_turns),
+                "completion_tokens": sum(t["completion_tokens"] for t in agent_turns),
+                "queue_wait": summarize([t["queue_wait"] for t in generated]),
+                "time_to_first_token": summarize([t["time_to_first_token"] for t in generated
+                                                  if t["time_to_first_token"] is not None]),
+                "generation_time": summarize([t["generation_time"] for t in generated]),
+                "tokens_per_second": summarize([t["tokens_per_second"] for t in generated]),
+                "prefill_time": summarize([t["prefill_time"] for t in generated if t.get("prefill_time") is not None]),
+                "prefix_hit_rate": round(sum(t["prefix_hit"] for t in tracked) / len(tracked), 4) if tracked else None,
+                "prefix_reuse": round(sum(t["prefix_chars"] for t in tracked) / prompt_chars, 4) if prompt_chars else None,
+            }
+        return summary
+
+    def export(self) -> Dict[str, Any]:
+        with self._lock:
+            turns = list(self.turns)
+        return {"turns": turns, "summary": self.summary()}
+
+    def print_summary(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print("\nMétricas por agente (p50 / p95):")
+        for agent, data in summary.items():
+            print(f"- {agent} ({data['model']}): {data['turns']} turnos, "
+                  f"espera {data['queue_wait']['p50']:.2f}/{data['queue_wait']['p95']:.2f}s, "
+                  f"TTFT {data['time_to_first_token']['p50']:.2f}/{data['time_to_first_token']['p95']:.2f}s, "
+                  f"generación {data['generation_time']['p50']:.2f}/{data['generation_time']['p95']:.2f}s, "
+                  f"{data['tokens_per_second']['p50']:.1f} tokens/s, "
+                  f"{data['prompt_tokens']}+{data['completion_tokens']} tokens"
+                  + (f", prefijo en caché {data['prefix_hit_rate']:.0%} de los turnos ({data['prefix_reuse'] or 0:.0%} del prompt)"
+                     if data["prefix_hit_rate"] is not None else ""))
@@ -0,0 +1,245 @@
+"""Registro declarativo de modelos por rol, con objetivos de latencia y cascada borrador/escalado.
+
+Qué modelo usa cada agente se declara en un único archivo (models.json en la raíz del
+repositorio, o el de MODEL_REGISTRY_PATH / --models) en lugar de en un config_list por
+agente. Cada rol (el nombre del agente) lista sus modelos candidatos, del más pequeño y
+rápido al más grande, con la latencia esperada de un turno en esta máquina, y puede fijar
+un objetivo de latencia (latency_slo, en segundos):
+
+    {
+      "roles": {
+        "Respondedor": {
+          "latency_slo": 30,
+          "candidates": [{"model": "llama3.2:1b", "latency": 6}, {"model": "llama3", "latency": 20}]
+        }
+      }
+    }
+
+Sin cascada, cada rol usa el candidato más grande cuya latencia esperada cumple su
+objetivo (o el más rápido si ninguno lo cumple). Con cascada, cada turno empieza por el
+candidato más pequeño y solo pasa al siguiente si el validador de la etapa rechaza la
+salida, así que los turnos fáciles se quedan en el camino barato.
+
+slo_report() compara la latencia medida de cada rol con su objetivo, para ajustar el archivo.
+"""
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from comun.metrics import summarize
+
+REGISTRY_NAME = "models.json"
+
+# Validador de la salida de un rol: (contenido, mensajes de la petición) -> (aceptada, detalles)
+Validator = Callable[[str, List[Dict[str, Any]]], Tuple[bool, str]]
+
+_local = threading.local()
+
+
+@contextmanager
+def use_model(agent_name: str, model: str):
+    """En este hilo, las peticiones de agent_name van a model (las de otros hilos no cambian)"""
+    overrides = getattr(_local, "models", None)
+    if overrides is None:
+        overrides = _local.models = {}
+    previous = overrides.get(agent_name)
+    overrides[agent_name] = model
+    try:
+        yield
+    finally:
+        if previous is None:
+            overrides.pop(agent_name, None)
+        else:
+            overrides[agent_name] = previous
+
+
+def model_override(agent_name: str) -> Optional[str]:
+    """Modelo fijado con use_model para agent_name en este hilo (None si no hay)"""
+    return (getattr(_local, "models", None) or {}).get(agent_name)
+
+
+class ModelRegistryError(Exception):
+    """Archivo de modelos inválido o rol sin declarar"""
+
+
+class ModelRegistry:
+    """Roles, sus modelos candidatos (de menor a mayor) y sus objetivos de latencia"""
+
+    def __init__(self, roles: Dict[str, Dict[str, Any]], path: Optional[str] = None):
+        self.path = path
+        self.roles = {}
+        for role, spec in roles.items():
+            candidates = [candidate if isinstance(candidate, dict) else {"model": candidate}
+                          for candidate in spec.get("candidates") or []]
+            if not candidates or not all(candidate.get("model") for candidate in candidates):
+                raise ModelRegistryError(f"El rol '{role}' necesita al menos un candidato con 'model'")
+            self.roles[role] = {"latency_slo": spec.get("latency_slo"), "candidates": candidates}
+
+    @classmethod
+    def load(cls, path: str) -> "ModelRegistry":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("roles") or {}, path=path)
+
+    def _role(self, role: str) -> Dict[str, Any]:
+        if role not in self.roles:
+            raise ModelRegistryError(f"El rol '{role}' no está en el registro de modelos ({self.path})")
+        return self.roles[role]
+
+    def candidates(self, role: str) -> List[str]:
+        return [candidate["model"] for candidate in self._role(role)["candidates"]]
+
+    def route(self, role: str) -> str:
+        """Candidato más grande que cumple el objetivo de latencia; si ninguno, el más rápido"""
+        spec = self._role(role)
+        slo = spec["latency_slo"]
+        candidates = spec["candidates"]
+        if slo is None:
+            return candidates[-1]["model"]
+        within = [candidate for candidate in candidates if candidate.get("latency") is None or candidate["latency"] <= slo]
+        if within:
+            return within[-1]["model"]
+        return min(candidates, key=lambda candidate: candidate["latency"])["model"]
+
+    def llm_config(self, role: str, base_url: str, model_client_cls: Optional[str] = None,
+                   cascade: bool = False) -> Dict[str, Any]:
+        """llm_config del agente: el modelo enrutado o, en cascada, el borrador (el primero)"""
+        entry = {
+            "base_url": base_url,
+            "api_key": "fake-key",
+            "model": self.candidates(role)[0] if cascade else self.route(role),
+        }
+        if model_client_cls:
+            entry["model_client_cls"] = model_client_cls
+        return {"config_list": [entry]}
+
+    def slo_report(self, turns: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Por rol: turnos por modelo, latencia medida (espera + generación) y turnos dentro del objetivo"""
+        by_role: Dict[str, List[Dict[str, Any]]] = {}
+        for turn in turns:
+            if turn["agent"] in self.roles and not turn["cached"]:
+                by_role.setdefault(turn["agent"], []).append(turn)
+        report = {}
+        for role, role_turns in by_role.items():
+            slo = self.roles[role]["latency_slo"]
+            latencies = [turn["queue_wait"] + turn["generation_time"] for turn in role_turns]
+            models: Dict[str, int] = {}
+            for turn in role_turns:
+                models[turn["model"]] = models.get(turn["model"], 0) + 1
+            report[role] = {
+                "latency_slo": slo,
+                "turns": len(role_turns),
+                "models": models,
+                "latency": summarize(latencies),
+                "within_slo": round(sum(latency <= slo for latency in latencies) / len(latencies), 4)
+                if slo is not None else None,
+            }
+        return report
+
+    def print_slo_summary(self, turns: List[Dict[str, Any]]):
+        report = self.slo_report(turns)
+        if not report:
+            return
+        print("\nObjetivos de latencia:")
+        for name, role in report.items():
+            slo = f"{role['within_slo']:.0%} de los turnos en {role['latency_slo']}s" if role["latency_slo"] is not None \
+                else "sin objetivo"
+            models = ", ".join(f"{model} ({count})" for model, count in role["models"].items())
+            print(f"- {name}: p50 {role['latency']['p50']:.2f}s, {slo}; {models}")
+
+
+class ModelCascade:
+    """Prueba primero el modelo pequeño de cada rol y escala al siguiente si el validador rechaza.
+
+    validators: {rol: Validator}. Solo los roles con validador y más de un candidato usan la
+    cascada. on_escalate(rol, modelo) se llama antes de cada intento con un modelo mayor
+    (p. ej. para que la nueva salida sustituya a los archivos guardados del borrador).
+    """
+
+    def __init__(self, registry: ModelRegistry, validators: Dict[str, Validator],
+                 on_escalate: Optional[Callable[[str, str], None]] = None):
+        self.registry = registry
+        self.validators = validators
+        self.on_escalate = on_escalate
+        self.attempts: List[Dict[str, Any]] = []
+        # Modelo cuya salida se usó en el último turno de cada rol (en todos los hilos y en cada uno)
+        self.final_models: Dict[str, str] = {}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def register(self, agents):
+        """Instala la respuesta en cascada (la primera que se consulta) en los agentes que la usan"""
+        from autogen import Agent
+
+        for agent in agents:
+            if agent.name in self.validators and len(self.registry.candidates(agent.name)) > 1:
+                agent.register_reply([Agent, None], self.reply, position=0)
+
+    def reply(self, recipient, messages=None, sender=None, config=None):
+        role = recipient.name
+        candidates = self.registry.candidates(role)
+        turn = []
+        for index, model in enumerate(candidates):
+            if index and self.on_escalate is not None:
+                self.on_escalate(role, model)
+            with use_model(role, model):
+                _, reply = recipient.generate_oai_reply(messages=messages, sender=sender, config=config)
+            content = (reply.get("content") or "") if isinstance(reply, dict) else (reply or "")
+            accepted, details = self.validators[role](content, messages or [])
+            turn.append({"role": role, "model": model, "accepted": accepted, "details": details})
+            if accepted:
+                break
+            if index + 1 < len(candidates):
+                print(f"⬆️  [{role}] {model} rechazado ({details}); se escala a {candidates[index + 1]}")
+        # La salida usada es la del intento aceptado o, si ninguno pasó, la del último
+        final = turn[-1]["model"]
+        if getattr(self._local, "models", None) is None:
+            self._local.models = {}
+        self._local.models[role] = final
+        with self._lock:
+            self.attempts.extend(turn)
+            self.final_models[role] = final
+        return True, reply
+
+    def final_model(self, role: str) -> Optional[str]:
+        """Modelo de la salida usada en el último turno de role en este hilo (los lotes concurrentes
+        responden cada uno en el suyo) o, si este hilo no ha tenido ninguno, en cualquiera"""
+        local = getattr(self._local, "models", None) or {}
+        if role in local:
+            return local[role]
+        with self._lock:
+            return self.final_models.get(role)
+
+    def report(self) -> Dict[str, Any]:
+        """Intentos y aceptaciones por rol y modelo; turnos resueltos con el borrador"""
+        with self._lock:
+            attempts = list(self.attempts)
+        roles: Dict[str, Dict[str, Any]] = {}
+        for attempt in attempts:
+            role = roles.setdefault(attempt["role"], {"turns": 0, "draft_accepted": 0, "escalations": 0, "models": {}})
+            model = role["models"].setdefault(attempt["model"], {"attempts": 0, "accepted": 0})
+            model["attempts"] += 1
+            model["accepted"] += attempt["accepted"]
+            draft = attempt["model"] == self.registry.candidates(attempt["role"])[0]
+            if draft:
+                role["turns"] += 1
+                role["draft_accepted"] += attempt["accepted"]
+            else:
+                role["escalations"] += 1
+        return {"roles": roles, "attempts": attempts}
+
+    def print_summary(self):
+        roles = self.report()["roles"]
+        if not roles:
+            return
+        print("\nCascada de modelos:")
+        for name, role in roles.items():
+            print(f"- {name}: {role['draft_accepted']}/{role['turns']} turnos resueltos con el borrador, "
+                  f"{role['escalations']} escalados")
+
+
+def registry_from_env(default_path: str, path: Optional[str] = None) -> ModelRegistry:
+    """Carga el registro de path, de MODEL_REGISTRY_PATH o de default_path"""
+    return ModelRegistry.load(path or os.environ.get("MODEL_REGISTRY_PATH", default_path))
@@ -0,0 +1,388 @@
+"""Cliente de modelo para autogen que envía las peticiones a Ollama (API compatible con OpenAI o nativa)"""
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from comun.balancer import EndpointBalancer
+from comun.budgets import StopScanner
+from comun.http_pool import endpoint_pool
+from comun.llm_cache import CacheMissError, LLMResponseCache, NON_SAMPLING_PARAMS
+from comun.metrics import TurnMetricsRecorder, pop_enqueued
+from comun.models import model_override
+from comun.prefix import PrefixTracker, stable_layout
+from comun.scheduler import ModelResidencyScheduler, native_root_url
+
+MODEL_CLIENT_CLS = "OllamaModelClient"
+
+# Parámetros OpenAI que la API nativa recibe como options
+NATIVE_OPTIONS = {
+    "seed": "seed",
+    "temperature": "temperature",
+    "top_p": "top_p",
+    "max_tokens": "num_predict",
+    "stop": "stop",
+    "frequency_penalty": "frequency_penalty",
+    "presence_penalty": "presence_penalty",
+}
+
+
+class StreamListener:
+    """Recibe los tokens de una respuesta en streaming a medida que llegan"""
+
+    def start(self):
+        """Se llama antes de cada generación"""
+
+    def feed(self, text: str) -> bool:
+        """Procesa un trozo de texto; devolver True detiene la generación"""
+        return False
+
+    def finish(self):
+        """Se llama al terminar la generación (completa o detenida)"""
+
+
+class OllamaModelClient:
+    """Implementa el protocolo ModelClient de autogen.
+
+    Se activa añadiendo "model_client_cls": "OllamaModelClient" a la entrada del
+    config_list y llamando a register_ollama_client() sobre los agentes.
+
+    Con metrics, cada generación se hace en streaming para medir el tiempo hasta el
+    primer token y queda registrada a nombre de agent_name. Con scheduler, cada generación
+    espera a que su modelo esté cargado y al terminar se precarga el del siguiente agente.
+    Con seed, las peticiones que no fijan otra semilla usan esa (muestreo reproducible).
+    response_formats asocia nombres de agente con un response_format (salida JSON con
+    esquema); se consulta en cada petición, así que puede rellenarse tras el registro.
+    generation_limits asocia nombres de agente con {"max_tokens", "stop"}: el presupuesto
+    de tokens (num_predict en Ollama) y las secuencias de parada, que se aplican sobre el
+    streaming conservando la secuencia en la respuesta (ver comun/budgets.py). También se
+    consulta en cada petición.
+
+    Con num_ctx (modo prefijo), los mensajes se ordenan con un prefijo estable y se envían
+    por la API nativa /api/chat con ese num_ctx y keep_alive, de modo que Ollama mantiene
+    el modelo cargado con el mismo contexto y puede reutilizar el prefijo en caché. Con
+    prefix_tracker, cada turno registra qué parte de su prompt coincide con uno anterior.
+
+    Con balancer, cada generación va al servidor que elige el reparto (ver comun/balancer.py)
+    y, si falla, se repite en otro; el turno registra el servidor que respondió. La clave de
+    la caché sigue siendo la de base_url: todos los servidores sirven los mismos modelos.
+    """
+
+    def __init__(self, config, cache: Optional[LLMResponseCache] = None,
+                 stream_listener: Optional[StreamListener] = None,
+                 metrics: Optional[TurnMetricsRecorder] = None, agent_name: Optional[str] = None,
+                 scheduler: Optional[ModelResidencyScheduler] = None, seed: Optional[int] = None,
+                 response_formats: Optional[Dict[str, Dict[str, Any]]] = None, num_ctx: Optional[int] = None,
+                 generation_limits: Optional[Dict[str, Dict[str, Any]]] = None, keep_alive: Optional[str] = None, prefix_tracker: Optional[PrefixTracker] = None,
+                 balancer: Optional[EndpointBalancer] = None, **kwargs):
+        self.model = config.get("model")
+        self.base_url = str(config.get("base_url")).rstrip("/")
+        self.api_key = config.get("api_key") or "fake-key"
+        self.cache = cache
+        self.stream_listener = stream_listener
+        self.metrics = metrics
+        self.scheduler = scheduler
+        self.seed = seed
+        self.response_formats = response_formats
+        self.generation_limits = generation_limits
+        self.num_ctx = num_ctx
+        self.keep_alive = keep_alive
+        self.prefix_tracker = prefix_tracker
+        self.balancer = balancer
+        self.agent_name = agent_name or self.model
+        for base_url in (balancer.base_urls if balancer is not None else [self.base_url]):
+            endpoint_pool(base_url).attach(self.agent_name)
+        self._clients: Dict[str, Any] = {}
+        self._client_lock = threading.Lock()
+
+    def _openai_client(self, base_url: str):
+        """Cliente OpenAI compartido del endpoint, solo cuando se necesita (en modo replay nunca se pide)"""
+        with self._client_lock:
+            if base_url not in self._clients:
+                # Con reparto, un fallo se repite enseguida en otro servidor y no en el mismo
+                self._clients[base_url] = endpoint_pool(base_url).openai_client(
+                    base_url, self.api_key, max_retries=0 if self.balancer is not None else None)
+            return self._clients[base_url]
+
+    def create(self, params: Dict[str, Any]):
+        from openai.types.chat import ChatCompletion
+
+        # La cascada de modelos fija en su hilo el modelo de cada intento
+        model = model_override(self.agent_name) or params.get("model") or self.model
+        enqueued_at = pop_enqueued()
+        messages = params["messages"]
+        request_params = {k: v for k, v in params.items() if k not in NON_SAMPLING_PARAMS}
+        if self.seed is not None:
+            request_params.setdefault("seed", self.seed)
+        if self.response_formats and self.agent_name in self.response_formats:
+            request_params.setdefault("response_format", self.response_formats[self.agent_name])
+        limits = (self.generation_limits or {}).get(self.agent_name) or {}
+        if limits.get("max_tokens"):
+            request_params.setdefault("max_tokens", limits["max_tokens"])
+        stops = list(limits.get("stop") or [])
+
+        key = None
+        if self.cache is not None and self.cache.enabled:
+            # Las paradas se aplican en el cliente, pero cambian la respuesta guardada
+            key_params = {**request_params, "stop_after": stops} if stops else request_params
+            key = self.cache.make_key(model, self.base_url, messages, key_params)
+            cached = self.cache.get(key)
+            if cached is not None:
+                response = ChatCompletion.model_validate(cached)
+                if self.stream_listener is not None:
+                    # El oyente procesa la respuesta guardada igual que si llegara en streaming
+                    self.stream_listener.start()
+                    self.stream_listener.feed(response.choices[0].message.content or "")
+                    self.stream_listener.finish()
+                self._record_turn(model, enqueued_at, time.time(), None, 0.0, response, cached=True)
+                return response
+            if self.cache.mode == "replay":
+                raise CacheMissError(f"Respuesta no encontrada en la caché para el modelo '{model}' (clave {key[:12]})")
+
+        if self.num_ctx is not None:
+            messages = stable_layout(messages)
+
+        if self.scheduler is not None:
+            self.scheduler.acquire(model, self.agent_name)
+        # Tras acquire: una carga del modelo vacía su caché de prefijos
+        extra = self.prefix_tracker.observe(model, messages) if self.prefix_tracker is not None else {}
+
+        request_start = time.time()
+        try:
+            if self.balancer is not None:
+                served = []
+
+                def generate(base_url):
+                    served.append(base_url)
+                    return self._generate(base_url, model, messages, request_params, stops)
+
+                response, first_token_at, stop_sequence, native_stats = self.balancer.call(model, generate)
+                extra.update(endpoint=served[-1], endpoint_attempts=len(served))
+            else:
+                response, first_token_at, stop_sequence, native_stats = self._generate(
+                    self.base_url, model, messages, request_params, stops)
+            extra.update(native_stats)
+        finally:
+            if self.scheduler is not None:
+                self.scheduler.release(self.agent_name, model)
+        time_to_first_token = first_token_at - request_start if first_token_at is not None else None
+        if limits:
+            extra.update(max_tokens=request_params.get("max_tokens"), stop_sequence=stop_sequence,
+                         finish_reason=response.choices[0].finish_reason)
+        self._record_turn(model, enqueued_at, request_start, time_to_first_token, time.time() - request_start, response,
+                          **extra)
+
+        if key is not None and self.cache.mode == "record":
+            self.cache.set(key, response.model_dump(mode="json", exclude_unset=True))
+
+        return response
+
+    def _generate(self, base_url: str, model: str, messages: List[Dict[str, Any]], request_params: Dict[str, Any],
+                  stops: List[str]):
+        """Una generación en base_url: (respuesta, primer token, parada, métricas nativas)"""
+        if self.num_ctx is not None:
+            return self._create_native(base_url, model, messages, request_params, stops)
+        if self.stream_listener is not None or self.metrics is not None or stops:
+            return (*self._create_streaming(base_url, model, messages, request_params, stops), {})
+        response = self._openai_client(base_url).chat.completions.create(model=model, messages=messages,
+                                                                         **request_params)
+        return response, None, None, {}
+
+    def _create_streaming(self, base_url: str, model: str, messages: List[Dict[str, Any]],
+                          request_params: Dict[str, Any], stops: Optional[List[str]] = None):
+        """Genera en streaming pasando cada trozo al oyente (si lo hay) y reconstruye un ChatCompletion.
+
+        Devuelve también el instante en que llegó el primer trozo con contenido y la secuencia
+        de parada que cortó la respuesta (o None).
+        """
+        from openai.types.chat import ChatCompletion
+
+        listener = self.stream_listener or StreamListener()
+        scanner = StopScanner(stops or [])
+        stream = self._openai_client(base_url).chat.completions.create(
+            model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **request_params
+        )
+
+        parts = []
+        usage = None
+        finish_reason = "stop"
+        completion_id = "chatcmpl-stream"
+        first_token_at = None
+        listener.start()
+        try:
+            for chunk in stream:
+                completion_id = chunk.id or completion_id
+                if chunk.usage is not None:
+                    usage = chunk.usage.model_dump()
+                if not chunk.choices:
+                    continue
+                choice = chunk.choices[0]
+                if choice.finish_reason:
+                    finish_reason = choice.finish_reason
+                if not choice.delta.content:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.time()
+                text = scanner.feed(choice.delta.content)
+                parts.append(text)
+                if listener.feed(text) or scanner.matched:
+                    # El oyente ya tiene lo que necesitaba o ha llegado la frase de cierre: cortar aquí
+                    finish_reason = "stop"
+                    break
+        finally:
+            stream.close()
+            listener.finish()
+
+        if usage is None:
+            # Sin uso reportado (p. ej. parada anticipada): Ollama envía aproximadamente un token por trozo
+            usage = {"prompt_tokens": 0, "completion_tokens": len(parts), "total_tokens": len(parts)}
+
+        response = ChatCompletion.model_validate({
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": finish_reason,
+                         "message": {"role": "assistant", "content": "".join(parts)}}],
+            "usage": usage,
+        })
+        return response, first_token_at, scanner.matched
+
+    def _native_payload(self, model: str, messages: List[Dict[str, Any]], request_params: Dict[str, Any]):
+        """Traduce la petición OpenAI a /api/chat; las opciones de muestreo van en options"""
+        options: Dict[str, Any] = {"num_ctx": self.num_ctx}
+        for name, option in NATIVE_OPTIONS.items():
+            if request_params.get(name) is not None:
+                options[option] = request_params[name]
+        payload: Dict[str, Any] = {
+            "model": model,
+            "messages": [{"role": m.get("role", "user"), "content": m.get("content") or ""} for m in messages],
+            "stream": True,
+            "options": options,
+        }
+        if self.keep_alive:
+            payload["keep_alive"] = self.keep_alive
+        response_format = request_params.get("response_format")
+        if response_format:
+            # Ollama recibe el esquema directamente en format (o "json" sin esquema)
+            schema = (response_format.get("json_schema") or {}).get("schema")
+            payload["format"] = schema or "json"
+        return payload
+
+    def _create_native(self, base_url: str, model: str, messages: List[Dict[str, Any]],
+                       request_params: Dict[str, Any], stops: Optional[List[str]] = None):
+        """Genera en streaming por /api/chat y reconstruye un ChatCompletion.
+
+        Devuelve también el instante del primer trozo con contenido, la secuencia de parada que
+        cortó la respuesta (o None) y las métricas del servidor: tokens de prompt evaluados (los
+        que no estaban en caché) y tiempo de prefill.
+        """
+        from openai.types.chat import ChatCompletion
+
+        payload = self._native_payload(model, messages, request_params)
+        listener = self.stream_listener or StreamListener()
+        scanner = StopScanner(stops or [])
+        parts = []
+        final: Dict[str, Any] = {}
+        finish_reason = "stop"
+        first_token_at = None
+        listener.start()
+        try:
+            with endpoint_pool(base_url).client.stream("POST", f"{native_root_url(base_url)}/api/chat",
+                                                       json=payload) as stream:
+                stream.raise_for_status()
+                for line in stream.iter_lines():
+                    if not line.strip():
+                        continue
+                    chunk = json.loads(line)
+                    if chunk.get("error"):
+                        raise RuntimeError(f"Ollama: {chunk['error']}")
+                    if chunk.get("done"):
+                        final = chunk
+                        finish_reason = "length" if chunk.get("done_reason") == "length" else "stop"
+                        break
+                    text = (chunk.get("message") or {}).get("content") or ""
+                    if not text:
+                        continue
+                    if first_token_at is None:
+                        first_token_at = time.time()
+                    text = scanner.feed(text)
+                    parts.append(text)
+                    if listener.feed(text) or scanner.matched:
+                        break
+        finally:
+            listener.finish()
+
+        prompt_tokens = final.get("prompt_eval_count", 0)
+        completion_tokens = final.get("eval_count", len(parts))
+        response = ChatCompletion.model_validate({
+            "id": f"chatcmpl-native-{int(time.time() * 1000)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": finish_reason,
+                         "message": {"role": "assistant", "content": "".join(parts)}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+        native_stats = {
+            "num_ctx": self.num_ctx,
+            "prompt_eval_count": final.get("prompt_eval_count"),
+            "prefill_time": round(final["prompt_eval_duration"] / 1e9, 4) if final.get("prompt_eval_duration") else None,
+            "load_time": round(final["load_duration"] / 1e9, 4) if final.get("load_duration") else None,
+        }
+        return response, first_token_at, scanner.matched, native_stats
+
+    def _record_turn(self, model: str, enqueued_at: Optional[float], request_start: float,
+                     time_to_first_token: Optional[float], generation_time: float, response, cached: bool = False,
+                     **extra: Any):
+        if self.metrics is None:
+            return
+        usage = self.get_usage(response)
+        self.metrics.record(
+            agent=self.agent_name,
+            model=model,
+            queue_wait=max(0.0, request_start - enqueued_at) if enqueued_at is not None else 0.0,
+            time_to_first_token=time_to_first_token,
+            generation_time=generation_time,
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+            cached=cached,
+            **extra,
+        )
+
+    def message_retrieval(self, response) -> List[Any]:
+        return [
+            choice.message if choice.message.tool_calls else choice.message.content
+            for choice in response.choices
+        ]
+
+    def cost(self, response) -> float:
+        # Los modelos locales no tienen coste
+        return 0.0
+
+    @staticmethod
+    def get_usage(response) -> Dict[str, Any]:
+        usage = response.usage
+        return {
+            "prompt_tokens": usage.prompt_tokens if usage else 0,
+            "completion_tokens": usage.completion_tokens if usage else 0,
+            "total_tokens": usage.total_tokens if usage else 0,
+            "cost": 0.0,
+            "model": response.model,
+        }
+
+
+def register_ollama_client(agents, stream_listeners: Optional[Dict[str, StreamListener]] = None, **kwargs):
+    """Registra OllamaModelClient en todos los agentes que usan un LLM.
+
+    stream_listeners asocia el nombre de un agente con el oyente que recibirá sus tokens;
+    con metrics, cada turno se registra bajo el nombre del agente.
+    """
+    stream_listeners = stream_listeners or {}
+    for agent in agents:
+        if getattr(agent, "llm_config", False):
+            agent.register_model_client(
+                model_client_cls=OllamaModelClient, stream_listener=stream_listeners.get(agent.name),
+                agent_name=agent.name, **kwargs
+            )
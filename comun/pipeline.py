@@ -0,0 +1,180 @@
+"""Ejecutor de etapas fijas que evita el GroupChatManager.
+
+Cada etapa llama directamente a su agente con un único mensaje construido a partir
+de las salidas de las etapas que declara como entrada, y se da por terminada en
+cuanto aparece su frase de completado (el texto posterior se descarta).
+
+Con max_workers > 1 las etapas se lanzan en cuanto terminan todas sus entradas, así que
+las que no dependen unas de otras se generan a la vez.
+
+Con un diario (comun.journal) cada etapa terminada se escribe con su checkpoint, y run()
+puede recibir las salidas de las etapas ya completadas para continuar sin repetirlas.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+
+@dataclass
+class Stage:
+    """Etapa del pipeline: un agente, su instrucción y las etapas de las que depende.
+
+    postprocess recibe la salida (ya cortada en la frase de completado) y devuelve la que
+    verán las etapas siguientes, p. ej. tras completar elementos que faltaban.
+    """
+    agent: Any
+    prompt: str
+    inputs: List[str] = field(default_factory=list)
+    completion_phrase: Optional[str] = None
+    on_complete: Optional[Callable[[str], Any]] = None
+    postprocess: Optional[Callable[[str], str]] = None
+
+    @property
+    def name(self) -> str:
+        return self.agent.name
+
+
+class PipelineError(Exception):
+    """Error de definición del pipeline (entradas desconocidas, ciclos, nombres repetidos)"""
+
+
+def truncate_at_phrase(content: str, phrase: Optional[str]) -> str:
+    """Corta el contenido justo después de la frase de completado, si aparece"""
+    if not phrase:
+        return content
+    index = content.find(phrase)
+    if index < 0:
+        return content
+    return content[:index + len(phrase)]
+
+
+class StagePipeline:
+    """Ejecuta las etapas en orden topológico según sus entradas declaradas.
+
+    max_workers limita cuántas etapas independientes se ejecutan a la vez (1: en serie).
+    journal: TranscriptJournal donde se escribe cada etapa al terminar (opcional).
+    """
+
+    def __init__(self, stages: List[Stage], initial_sender: str = "Coordinador", max_workers: int = 1,
+                 journal=None):
+        self.stages = stages
+        self.initial_sender = initial_sender
+        self.max_workers = max(1, max_workers)
+        self.journal = journal
+        self.outputs: Dict[str, str] = {}
+        self.stage_metrics: Dict[str, Dict[str, Any]] = {}
+        self.order = self._topological_order()
+        self._started_at = time.time()
+
+    def _topological_order(self) -> List[Stage]:
+        names = [stage.name for stage in self.stages]
+        if len(set(names)) != len(names):
+            raise PipelineError(f"Nombres de etapa repetidos: {names}")
+
+        known = set(names) | {self.initial_sender}
+        for stage in self.stages:
+            unknown = [name for name in stage.inputs if name not in known]
+            if unknown:
+                raise PipelineError(f"La etapa {stage.name} depende de etapas desconocidas: {unknown}")
+
+        # Kahn estable: respeta el orden de declaración entre etapas independientes
+        done = {self.initial_sender}
+        pending = list(self.stages)
+        order = []
+        while pending:
+            ready = next((stage for stage in pending if all(name in done for name in stage.inputs)), None)
+            if ready is None:
+                raise PipelineError(f"Dependencias circulares entre: {[stage.name for stage in pending]}")
+            order.append(ready)
+            done.add(ready.name)
+            pending.remove(ready)
+        return order
+
+    def build_message(self, stage: Stage) -> str:
+        """Instrucción de la etapa seguida únicamente de las salidas que declara como entrada"""
+        sections = [stage.prompt.strip()]
+        for name in stage.inputs:
+            sections.append(f"--- {name} ---\n{self.outputs[name].strip()}")
+        return "\n\n".join(sections)
+
+    def run_stage(self, stage: Stage) -> Dict[str, Any]:
+        """Genera la respuesta de una etapa y devuelve el mensaje en formato de GroupChat"""
+        start = time.time()
+        reply = stage.agent.generate_reply(messages=[{"role": "user", "content": self.build_message(stage)}])
+        content = (reply.get("content") or "") if isinstance(reply, dict) else (reply or "")
+
+        content = truncate_at_phrase(content, stage.completion_phrase)
+        if stage.postprocess:
+            content = stage.postprocess(content)
+        completed = stage.completion_phrase is None or stage.completion_phrase in content
+
+        self.outputs[stage.name] = content
+        self.stage_metrics[stage.name] = {
+            # Segundos desde el inicio del pipeline: muestra qué etapas se solaparon
+            "start": round(start - self._started_at, 3),
+            "time": round(time.time() - start, 3),
+            "completed": completed,
+            "chars": len(content),
+        }
+        print(f"[ETAPA] {stage.name}: {'completada' if completed else 'sin frase de completado'} "
+              f"({self.stage_metrics[stage.name]['time']:.2f}s)")
+
+        if stage.on_complete:
+            stage.on_complete(content)
+
+        message = {"content": content, "name": stage.name, "role": "user"}
+        if self.journal is not None:
+            # El checkpoint va después de on_complete: al reanudar, sus efectos ya están hechos
+            self.journal.message(message, stage=stage.name)
+            self.journal.checkpoint(stage.name)
+        return message
+
+    def run(self, initial_message: str = "", completed: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
+        """Ejecuta todas las etapas y devuelve la transcripción con el mismo formato que GroupChat.messages.
+
+        completed: salida de las etapas ya terminadas en una ejecución anterior; no se vuelven
+        a ejecutar (ni su on_complete) y sus salidas pasan tal cual a las etapas siguientes.
+        """
+        # Al reanudar, el mensaje inicial ya está en el diario
+        resumed = completed is not None
+        completed = completed or {}
+        self.outputs = {self.initial_sender: initial_message, **completed}
+        self.stage_metrics = {name: {"start": 0.0, "time": 0.0, "completed": True, "chars": len(content),
+                                     "resumed": True}
+                              for name, content in completed.items()}
+        self._started_at = time.time()
+        initial = {"content": initial_message, "name": self.initial_sender, "role": "user"}
+        if self.journal is not None and not resumed:
+            self.journal.message(initial)
+        replies = {name: {"content": content, "name": name, "role": "user"} for name, content in completed.items()}
+        for name in completed:
+            print(f"[ETAPA] {name}: restaurada del diario")
+        if self.max_workers == 1:
+            for stage in self.order:
+                if stage.name not in replies:
+                    replies[stage.name] = self.run_stage(stage)
+        else:
+            replies.update(self._run_concurrent(set(completed)))
+
+        # La transcripción mantiene el orden topológico aunque las etapas terminen en otro
+        return [initial] + [replies[stage.name] for stage in self.order]
+
+    def _run_concurrent(self, completed=frozenset()) -> Dict[str, Dict[str, Any]]:
+        """Lanza cada etapa en cuanto están todas sus entradas; devuelve la respuesta de cada una"""
+        replies: Dict[str, Dict[str, Any]] = {}
+        done = {self.initial_sender} | set(completed)
+        pending = [stage for stage in self.order if stage.name not in completed]
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for stage in [stage for stage in pending if all(name in done for name in stage.inputs)]:
+                    pending.remove(stage)
+                    running[executor.submit(self.run_stage, stage)] = stage
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    stage = running.pop(future)
+                    # on_complete ya ha terminado (p. ej. la extracción del código): sus dependientes pueden empezar
+                    replies[stage.name] = future.result()
+                    done.add(stage.name)
+        return replies
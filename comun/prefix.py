@@ -0,0 +1,116 @@
+"""Prompts con prefijo estable para aprovechar la caché de prefijos (KV) de Ollama.
+
+Ollama reutiliza el cálculo del prompt anterior mientras el nuevo empiece por los mismos
+tokens, el modelo siga cargado y no cambie num_ctx (un num_ctx distinto obliga a
+recargarlo). En modo prefijo (OLLAMA_PREFIX_CACHE=1) cada petición se construye con los
+mensajes de sistema primero y el contenido normalizado, y se envía por la API nativa
+/api/chat con el mismo num_ctx y keep_alive que usa el planificador al cargar el modelo.
+
+PrefixTracker estima en el cliente qué parte de cada prompt coincide con uno anterior del
+mismo modelo, para informar de la tasa de aciertos del prefijo en cualquier modo.
+"""
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+DEFAULT_NUM_CTX = 8192
+
+
+def prefix_cache_enabled() -> bool:
+    return os.environ.get("OLLAMA_PREFIX_CACHE", "0") == "1"
+
+
+def num_ctx_from_env() -> Optional[int]:
+    """num_ctx fijo para todas las peticiones y cargas en modo prefijo (None fuera de él)"""
+    if not prefix_cache_enabled():
+        return None
+    return int(os.environ.get("OLLAMA_NUM_CTX", str(DEFAULT_NUM_CTX)))
+
+
+def normalize_content(text: str) -> str:
+    """Mismos bytes para el mismo texto: saltos de línea \\n y sin espacios al final de cada línea"""
+    lines = text.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def stable_layout(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Mensajes de sistema unidos al principio (parte fija) seguidos del resto (parte variable)"""
+    system = [normalize_content(m["content"]) for m in messages
+              if m.get("role") == "system" and isinstance(m.get("content"), str)]
+    rest = [{**m, "content": normalize_content(m["content"])} if isinstance(m.get("content"), str) else m
+            for m in messages if m.get("role") != "system"]
+    return ([{"role": "system", "content": "\n\n".join(system)}] if system else []) + rest
+
+
+def render_prompt(messages: List[Dict[str, Any]]) -> str:
+    """Texto lineal del prompt tal como lo tokeniza el servidor (rol y contenido por mensaje)"""
+    return "".join(f"<{m.get('role', 'user')}>\n{m.get('content') or ''}\n" for m in messages)
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    limit = min(len(a), len(b))
+    index = 0
+    while index < limit and a[index] == b[index]:
+        index += 1
+    return index
+
+
+class PrefixTracker:
+    """Estima cuánto de cada prompt puede reutilizar la caché de prefijos del servidor.
+
+    Imita a Ollama: cada modelo tiene slots prompts en caché (OLLAMA_NUM_PARALLEL) y cada
+    petición usa el de prefijo común más largo. Hay acierto cuando el prefijo común cubre
+    toda la parte fija (los mensajes de sistema). Las cargas y descargas que hace el
+    planificador vacían la caché del modelo; las que decida el servidor por su cuenta no
+    se ven, así que es una cota superior de lo que reutiliza Ollama.
+    """
+
+    def __init__(self, slots: int = 1):
+        self.slots = max(1, slots)
+        self._prompts: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, model: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        text = render_prompt(messages)
+        fixed = len(render_prompt([m for m in messages if m.get("role") == "system"]))
+        with self._lock:
+            cached = self._prompts.setdefault(model, [])
+            best_index, best = None, 0
+            for index, previous in enumerate(cached):
+                length = common_prefix_length(previous, text)
+                if length > best:
+                    best_index, best = index, length
+            if best_index is not None and best == len(cached[best_index]):
+                # El prompt continúa el del slot: ese slot pasa a contenerlo
+                cached.pop(best_index)
+            elif len(cached) >= self.slots:
+                # Si no, ocupa un slot libre o el usado hace más tiempo
+                cached.pop(0)
+            cached.append(text)
+        return {
+            "prompt_chars": len(text),
+            "prefix_chars": best,
+            "prefix_hit": fixed > 0 and best >= fixed,
+        }
+
+    def forget(self, model: str):
+        """El modelo se ha descargado o recargado: su caché de prefijos se pierde"""
+        with self._lock:
+            self._prompts.pop(model, None)
+
+
+def prefix_client_kwargs(scheduler, slots: Optional[int] = None) -> Dict[str, Any]:
+    """Argumentos de register_ollama_client según OLLAMA_PREFIX_CACHE y OLLAMA_NUM_CTX.
+
+    Las peticiones usan el keep_alive del planificador, y sus cargas y descargas vacían la
+    caché estimada. slots es el OLLAMA_NUM_PARALLEL del servidor.
+    """
+    if slots is None:
+        slots = int(os.environ.get("OLLAMA_NUM_PARALLEL", "1"))
+    tracker = PrefixTracker(slots=slots)
+    scheduler.reset_listeners.append(tracker.forget)
+    return {
+        "num_ctx": num_ctx_from_env(),
+        "keep_alive": scheduler.keep_alive if prefix_cache_enabled() else None,
+        "prefix_tracker": tracker,
+    }
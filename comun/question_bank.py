@@ -0,0 +1,278 @@
+"""Banco persistente de pares de preguntas, sin duplicados, para auditorías a gran escala.
+
+Cada par (pregunta neutra y pregunta con sesgo) se guarda una sola vez en SQLite con su
+categoría de sesgo, el modelo que lo generó y las respuestas de cada modelo respondedor.
+Los duplicados exactos (también con otra puntuación, tildes o mayúsculas) se detectan por
+el hash del par normalizado. Los candidatos a casi duplicado salen de MinHash sobre shingles
+de caracteres y un índice LSH por bandas, de modo que cada inserción solo compara con los
+pares que comparten algún cubo. Un candidato solo descarta el par si la similitud exacta
+del par y la de cada una de sus dos preguntas llegan al umbral: las preguntas de auditoría
+son cortas y salen de la misma plantilla, y "dirija una empresa" frente a "dirija un
+hospital" son dos pruebas distintas. Las firmas se guardan con cada par y el índice LSH se
+reconstruye en memoria al abrir el banco.
+"""
+import hashlib
+from collections import Counter
+import json
+import operator
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from comun.bias import normalize, pair_category
+
+BANK_NAME = "question_bank.sqlite"
+# Similitud de Jaccard (del par y de cada pregunta) a partir de la cual un par es casi duplicado
+NEAR_DUPLICATE_THRESHOLD = 0.9
+# Los candidatos cuya similitud estimada queda a menos de este margen del umbral se comprueban
+# con la similitud exacta (la estimación con 60 permutaciones tiene un error típico de ~0.05)
+ESTIMATE_MARGIN = 0.15
+SHINGLE_SIZE = 5
+# Segundos que una escritura espera a que otro proceso libere el archivo
+BUSY_TIMEOUT = 30.0
+# 60 permutaciones en 12 bandas de 5 filas: un par con similitud 0.8 es candidato el 99% de
+# las veces y uno con 0.4 (misma plantilla de pregunta, otro contenido) solo el 12%
+NUM_PERMUTATIONS = 60
+BANDS = 12
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+# Cada permutación es un XOR con una máscara fija sobre el hash de 32 bits del shingle: las
+# firmas guardadas siguen siendo comparables entre ejecuciones y el mínimo se calcula en C
+_rng = random.Random(1)
+_MASKS = [_rng.getrandbits(32) for _ in range(NUM_PERMUTATIONS)]
+
+
+def canonical_text(question: str) -> str:
+    """Pregunta sin tildes, mayúsculas, signos ni espacios repetidos"""
+    return " ".join(re.sub(r"[^\w\s]", " ", normalize(question)).split())
+
+
+def pair_hash(a: str, b: str) -> str:
+    return hashlib.sha256(f"{canonical_text(a)}\n{canonical_text(b)}".encode("utf-8")).hexdigest()
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[int]:
+    """Hashes de los fragmentos de size caracteres del texto"""
+    if len(text) <= size:
+        grams = {text}
+    else:
+        grams = {text[i:i + size] for i in range(len(text) - size + 1)}
+    return [int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=4).digest(), "little")
+            for gram in grams]
+
+
+def minhash(a: str, b: str) -> List[int]:
+    """Firma MinHash del par: la pregunta neutra y la sesgada forman un único texto"""
+    values = shingles(f"{canonical_text(a)} | {canonical_text(b)}")
+    return [min(map(mask.__xor__, values)) for mask in _MASKS]
+
+
+def estimated_similarity(signature_a: List[int], signature_b: List[int]) -> float:
+    """Jaccard estimada: fracción de permutaciones con el mismo mínimo"""
+    return sum(map(operator.eq, signature_a, signature_b)) / len(signature_a)
+
+
+def jaccard(text_a: str, text_b: str) -> float:
+    """Similitud de Jaccard exacta entre los shingles de dos textos"""
+    shingles_a, shingles_b = set(shingles(text_a)), set(shingles(text_b))
+    return len(shingles_a & shingles_b) / len(shingles_a | shingles_b)
+
+
+def pair_similarity(a: str, b: str, other_a: str, other_b: str) -> float:
+    """Similitud exacta de dos pares: la menor entre la del par completo y la de cada pregunta"""
+    a, b, other_a, other_b = map(canonical_text, (a, b, other_a, other_b))
+    return min(jaccard(f"{a} | {b}", f"{other_a} | {other_b}"), jaccard(a, other_a), jaccard(b, other_b))
+
+
+class QuestionBank:
+    """Banco SQLite de pares de preguntas con deduplicación exacta y aproximada.
+
+    add() devuelve si el par se ha añadido o si ya existía (duplicado exacto o casi
+    duplicado, con el id del par existente). Las respuestas se guardan por modelo
+    respondedor, así que el mismo par puede auditarse con varios modelos.
+    """
+
+    def __init__(self, path: str, near_threshold: float = NEAR_DUPLICATE_THRESHOLD):
+        self.path = path
+        self.near_threshold = near_threshold
+        self.added = 0
+        self.duplicates = 0
+        self.near_duplicates = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=BUSY_TIMEOUT)
+        # WAL: las lecturas de otros procesos no bloquean las escrituras
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS pairs ("
+            " id INTEGER PRIMARY KEY,"
+            " hash TEXT NOT NULL UNIQUE,"
+            " a TEXT NOT NULL,"
+            " b TEXT NOT NULL,"
+            " category TEXT NOT NULL,"
+            " source_model TEXT,"
+            " signature TEXT NOT NULL,"
+            " created REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_pairs_category ON pairs(category);"
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " pair_id INTEGER NOT NULL REFERENCES pairs(id),"
+            " model TEXT NOT NULL,"
+            " answer_a TEXT,"
+            " answer_b TEXT,"
+            " updated REAL NOT NULL,"
+            " PRIMARY KEY (pair_id, model));"
+        )
+        self._conn.commit()
+
+        self._signatures: Dict[int, List[int]] = {}
+        self._buckets: Dict[Any, List[int]] = {}
+        for pair_id, signature in self._conn.execute("SELECT id, signature FROM pairs"):
+            self._index(pair_id, json.loads(signature))
+
+    def _index(self, pair_id: int, signature: List[int]):
+        self._signatures[pair_id] = signature
+        for band in range(BANDS):
+            bucket = (band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+            self._buckets.setdefault(bucket, []).append(pair_id)
+
+    def add(self, a: str, b: str, source_model: Optional[str] = None) -> Dict[str, Any]:
+        with self._lock:
+            result = self._add(a, b, source_model)
+            self._conn.commit()
+        return result
+
+    def add_many(self, pairs: Iterable[Dict[str, str]], source_model: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Añade los pares {"a", "b"} en una sola transacción"""
+        with self._lock:
+            results = [self._add(pair["a"], pair["b"], pair.get("source_model") or source_model) for pair in pairs]
+            self._conn.commit()
+        return results
+
+    def _add(self, a: str, b: str, source_model: Optional[str]) -> Dict[str, Any]:
+        key = pair_hash(a, b)
+        row = self._conn.execute("SELECT id FROM pairs WHERE hash = ?", (key,)).fetchone()
+        if row:
+            self.duplicates += 1
+            return {"status": "duplicate", "id": row[0], "similarity": 1.0}
+
+        signature = minhash(a, b)
+        shared_bands = Counter()
+        for band in range(BANDS):
+            bucket = (band, tuple(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]))
+            shared_bands.update(self._buckets.get(bucket, ()))
+        # Los que comparten más bandas primero: un casi duplicado suele aparecer enseguida
+        best_id, best = None, 0.0
+        for pair_id, _ in shared_bands.most_common():
+            if estimated_similarity(signature, self._signatures[pair_id]) < self.near_threshold - ESTIMATE_MARGIN:
+                continue
+            other_a, other_b = self._conn.execute("SELECT a, b FROM pairs WHERE id = ?", (pair_id,)).fetchone()
+            similarity = pair_similarity(a, b, other_a, other_b)
+            if similarity > best:
+                best_id, best = pair_id, similarity
+                if best >= self.near_threshold:
+                    break
+        if best_id is not None and best >= self.near_threshold:
+            self.near_duplicates += 1
+            return {"status": "near_duplicate", "id": best_id, "similarity": round(best, 3)}
+
+        cursor = self._conn.execute(
+            "INSERT INTO pairs (hash, a, b, category, source_model, signature, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (key, a, b, pair_category(a, b), source_model, json.dumps(signature), time.time()),
+        )
+        self._index(cursor.lastrowid, signature)
+        self.added += 1
+        return {"status": "added", "id": cursor.lastrowid, "similarity": round(best, 3)}
+
+    def record_answers(self, answers: Iterable[Dict[str, Any]], model: str):
+        """Guarda las respuestas {"id", "answer_a", "answer_b"} de un modelo respondedor"""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO answers (pair_id, model, answer_a, answer_b, updated) VALUES (?, ?, ?, ?, ?)",
+                [(item["id"], model, item.get("answer_a"), item.get("answer_b"), now) for item in answers],
+            )
+            self._conn.commit()
+
+    def sample(self, count: int, category: Optional[str] = None, seed: Optional[int] = None,
+               unanswered_by: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Hasta count pares al azar (reproducible con seed), opcionalmente de una categoría
+        o solo los que aún no ha respondido un modelo"""
+        query = "SELECT id FROM pairs"
+        conditions, params = [], []
+        if category:
+            conditions.append("category = ?")
+            params.append(category)
+        if unanswered_by:
+            conditions.append("id NOT IN (SELECT pair_id FROM answers WHERE model = ?)")
+            params.append(unanswered_by)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            ids = [pair_id for (pair_id,) in self._conn.execute(query + " ORDER BY id", params)]
+            chosen = sorted(random.Random(seed).sample(ids, min(count, len(ids))))
+            rows = []
+            # Por tramos: SQLite limita el número de parámetros de una consulta
+            for start in range(0, len(chosen), 500):
+                chunk = chosen[start:start + 500]
+                rows.extend(self._conn.execute(
+                    f"SELECT id, a, b, category, source_model FROM pairs WHERE id IN ({','.join('?' * len(chunk))})",
+                    chunk))
+        return [{"id": row[0], "a": row[1], "b": row[2], "category": row[3], "source_model": row[4]}
+                for row in sorted(rows)]
+
+    def answers(self, pair_id: int) -> Dict[str, Dict[str, Optional[str]]]:
+        """Respuestas guardadas de un par por modelo"""
+        with self._lock:
+            rows = self._conn.execute("SELECT model, answer_a, answer_b FROM answers WHERE pair_id = ?",
+                                      (pair_id,)).fetchall()
+        return {model: {"answer_a": answer_a, "answer_b": answer_b} for model, answer_a, answer_b in rows}
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._conn.execute("SELECT COUNT(*) FROM pairs").fetchone()[0]
+            by_category = dict(self._conn.execute("SELECT category, COUNT(*) FROM pairs GROUP BY category"))
+            answered = dict(self._conn.execute("SELECT model, COUNT(*) FROM answers GROUP BY model"))
+        return {
+            "path": self.path,
+            "pairs": total,
+            "by_category": by_category,
+            "answered_by_model": answered,
+            "added": self.added,
+            "duplicates": self.duplicates,
+            "near_duplicates": self.near_duplicates,
+            "near_threshold": self.near_threshold,
+        }
+
+    def print_summary(self):
+        stats = self.stats()
+        print(f"\nBanco de preguntas: {stats['pairs']} pares ({stats['added']} añadidos, "
+              f"{stats['duplicates']} duplicados y {stats['near_duplicates']} casi duplicados descartados)")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def load_pairs_file(path: str) -> List[Dict[str, str]]:
+    """Pares {"a", "b"} de un JSON (lista) o de un JSONL (un par por línea)"""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+    if path.endswith(".jsonl"):
+        items = [json.loads(line) for line in text.splitlines() if line.strip()]
+    else:
+        items = json.loads(text)
+    return [{"a": item["a"], "b": item["b"]} for item in items]
+
+
+def bank_from_env(default_path: str) -> QuestionBank:
+    """Abre el banco según QUESTION_BANK_PATH y QUESTION_BANK_NEAR_THRESHOLD"""
+    return QuestionBank(
+        os.environ.get("QUESTION_BANK_PATH", default_path),
+        near_threshold=float(os.environ.get("QUESTION_BANK_NEAR_THRESHOLD", str(NEAR_DUPLICATE_THRESHOLD))),
+    )
@@ -0,0 +1,259 @@
+"""Validación aislada del código generado: sintaxis, importación y tests unitarios.
+
+Que un archivo exista no quiere decir que funcione. Cada archivo .py se compila (sin
+ejecutarlo), cada módulo se importa y cada test_*.py se ejecuta con unittest. Las
+importaciones y los tests corren en subprocesos independientes, en paralelo, cada uno
+sobre una copia de los archivos en un directorio temporal, con pygame sin pantalla
+(SDL_VIDEODRIVER=dummy) y con límites de tiempo y de memoria.
+
+Los resultados se guardan en caché por el hash del archivo y de los módulos locales
+que importa: volver a validar sin cambios no lanza ningún subproceso. Cada fallo indica
+el archivo responsable (el del último marco de la traza que pertenece al código generado).
+"""
+import ast
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set
+
+from comun.artifacts import atomic_write, content_hash
+
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MEMORY_MB = 1024
+CACHE_NAME = "validation_cache.json"
+# Salida guardada de cada comprobación (el final, que es donde está la traza)
+OUTPUT_TAIL = 2000
+
+# pygame sin ventana ni audio y sin escribir .pyc en la copia temporal
+HEADLESS_ENV = {
+    "SDL_VIDEODRIVER": "dummy",
+    "SDL_AUDIODRIVER": "dummy",
+    "PYGAME_HIDE_SUPPORT_PROMPT": "1",
+    "PYTHONDONTWRITEBYTECODE": "1",
+}
+
+# Se ejecuta dentro del subproceso: aplica los límites y después importa el módulo o lanza sus tests
+BOOTSTRAP = """
+import sys
+memory_mb, cpu_seconds, check, module = sys.argv[1:5]
+try:
+    import resource
+    if int(memory_mb) > 0:
+        limit = int(memory_mb) * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    resource.setrlimit(resource.RLIMIT_CPU, (int(cpu_seconds), int(cpu_seconds)))
+except (ImportError, ValueError, OSError):
+    pass
+if check == "import":
+    __import__(module)
+else:
+    import unittest
+    unittest.main(module=None, argv=["unittest", "-v", module])
+"""
+
+TRACE_FILE_PATTERN = re.compile(r'File "([^"]+)", line (\d+)')
+MISSING_MODULE_PATTERN = re.compile(r"ModuleNotFoundError: No module named '([^'.]+)")
+EXCEPTION_LINE_PATTERN = re.compile(r"^[A-Za-z_][\w.]*(?:Error|Exception|Exit|Interrupt)\b.*$", re.MULTILINE)
+
+
+def local_imports(source: str) -> Set[str]:
+    """Nombres de primer nivel de los módulos que importa el código"""
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        return set()
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name.split(".")[0] for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module.split(".")[0])
+    return names
+
+
+def module_dependencies(filename: str, sources: Dict[str, str]) -> List[str]:
+    """El archivo y todos los archivos locales que importa, directa o indirectamente"""
+    seen = []
+    pending = [filename]
+    while pending:
+        current = pending.pop()
+        if current in seen:
+            continue
+        seen.append(current)
+        for name in local_imports(sources[current]):
+            if f"{name}.py" in sources:
+                pending.append(f"{name}.py")
+    return sorted(seen)
+
+
+def blame(output: str, filename: str, sources: Dict[str, str]) -> str:
+    """Archivo generado del último marco de la traza; si no aparece ninguno, el validado"""
+    for path, _ in reversed(TRACE_FILE_PATTERN.findall(output)):
+        name = os.path.basename(path)
+        if name in sources:
+            return name
+    return filename
+
+
+class CodeSandbox:
+    """Valida los .py de un directorio en subprocesos aislados, con caché por contenido.
+
+    timeout: segundos por comprobación (también fija el límite de CPU). memory_mb: límite
+    de memoria virtual de cada subproceso (0 sin límite; en Windows no se aplica).
+    """
+
+    def __init__(self, timeout: float = DEFAULT_TIMEOUT, memory_mb: int = DEFAULT_MEMORY_MB,
+                 workers: Optional[int] = None):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.workers = workers or min(4, os.cpu_count() or 1)
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.cache_hits = 0
+        self.run_time = 0.0
+
+    def validate(self, directory: str) -> Dict[str, Any]:
+        """Comprueba todos los .py del directorio y devuelve los resultados de cada comprobación"""
+        sources = {}
+        for name in sorted(os.listdir(directory)):
+            if name.endswith(".py") and not name.startswith("."):
+                with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                    sources[name] = f.read()
+
+        cache_path = os.path.join(directory, CACHE_NAME)
+        cache = {}
+        if os.path.exists(cache_path):
+            with open(cache_path, "r", encoding="utf-8") as f:
+                cache = json.load(f)
+
+        results = []
+        jobs = []
+        for filename, source in sources.items():
+            try:
+                compile(source, filename, "exec")
+                results.append(self._result("syntax", filename, "passed", "Sintaxis correcta"))
+            except SyntaxError as e:
+                results.append(self._result("syntax", filename, "failed", f"SyntaxError: {e.msg} (línea {e.lineno})"))
+                continue
+            check = "unittest" if filename.startswith("test_") else "import"
+            key = self._cache_key(check, filename, sources)
+            if key in cache:
+                results.append({**cache[key], "cached": True})
+                with self._lock:
+                    self.cache_hits += 1
+            else:
+                jobs.append((check, filename, key))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self._run, check, filename, sources) for check, filename, _ in jobs]
+            for (_, _, key), future in zip(jobs, futures):
+                result = future.result()
+                results.append(result)
+                # Una dependencia que falta en el entorno no depende del código: se vuelve a comprobar
+                if result["status"] != "skipped":
+                    cache[key] = result
+
+        if jobs:
+            atomic_write(cache_path, json.dumps(cache, indent=2, ensure_ascii=False))
+        return {
+            "passed": all(result["status"] in ("passed", "skipped") for result in results),
+            "results": results,
+            "stats": self.stats(),
+        }
+
+    def _cache_key(self, check: str, filename: str, sources: Dict[str, str]) -> str:
+        files = [[name, content_hash(sources[name])] for name in module_dependencies(filename, sources)]
+        return content_hash(json.dumps([check, filename, files, self.timeout, self.memory_mb]))
+
+    @staticmethod
+    def _result(check: str, filename: str, status: str, details: str, output: str = "",
+                seconds: float = 0.0, responsible: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "check": check,
+            "file": filename,
+            "status": status,
+            "details": details,
+            "output": output[-OUTPUT_TAIL:],
+            "seconds": round(seconds, 3),
+            "responsible": responsible or filename,
+            "cached": False,
+        }
+
+    def _run(self, check: str, filename: str, sources: Dict[str, str]) -> Dict[str, Any]:
+        module = filename[:-len(".py")]
+        env = {**os.environ, **HEADLESS_ENV}
+        env.pop("PYTHONPATH", None)
+        start = time.perf_counter()
+        with tempfile.TemporaryDirectory(prefix="sandbox_") as workdir:
+            # Copia propia: el código validado no puede tocar los archivos originales ni los de otra comprobación
+            for name, source in sources.items():
+                with open(os.path.join(workdir, name), "w", encoding="utf-8") as f:
+                    f.write(source)
+            command = [sys.executable, "-s", "-c", BOOTSTRAP, str(self.memory_mb),
+                       str(max(1, int(self.timeout))), check, module]
+            try:
+                completed = subprocess.run(command, cwd=workdir, env=env, capture_output=True, text=True,
+                                           timeout=self.timeout)
+                output = completed.stdout + completed.stderr
+                returncode = completed.returncode
+            except subprocess.TimeoutExpired as e:
+                output = "".join(part for part in (e.stdout, e.stderr) if isinstance(part, str))
+                returncode = None
+        seconds = time.perf_counter() - start
+        with self._lock:
+            self.runs += 1
+            self.run_time += seconds
+
+        action = "Importación" if check == "import" else "Tests"
+        if returncode is None:
+            return self._result(check, filename, "timeout",
+                                f"{action} sin terminar en {self.timeout:.0f}s (¿bucle al importar o test bloqueado?)",
+                                output, seconds)
+        if returncode == 0:
+            details = "Importa sin errores" if check == "import" else _tests_summary(output)
+            return self._result(check, filename, "passed", details, output, seconds)
+
+        missing = MISSING_MODULE_PATTERN.search(output)
+        if missing and f"{missing.group(1)}.py" not in sources:
+            return self._result(check, filename, "skipped",
+                                f"Falta la dependencia '{missing.group(1)}' en el entorno", output, seconds)
+        exceptions = EXCEPTION_LINE_PATTERN.findall(output)
+        details = exceptions[-1] if exceptions else f"código de salida {returncode}"
+        if check == "unittest":
+            details = f"{_tests_summary(output)}: {details}"
+        return self._result(check, filename, "failed", details, output, seconds,
+                            responsible=blame(output, filename, sources))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "cache_hits": self.cache_hits,
+                "run_time": round(self.run_time, 3),
+                "timeout": self.timeout,
+                "memory_mb": self.memory_mb,
+                "workers": self.workers,
+            }
+
+
+def _tests_summary(output: str) -> str:
+    ran = re.search(r"Ran (\d+) tests?", output)
+    failed = re.search(r"FAILED \(([^)]*)\)", output)
+    if not ran:
+        return "Tests no ejecutados"
+    return f"{ran.group(1)} tests" + (f", {failed.group(1)}" if failed else " correctos")
+
+
+def sandbox_from_env() -> CodeSandbox:
+    """Crea el validador según SANDBOX_TIMEOUT, SANDBOX_MEMORY_MB y SANDBOX_WORKERS"""
+    return CodeSandbox(
+        timeout=float(os.environ.get("SANDBOX_TIMEOUT", str(DEFAULT_TIMEOUT))),
+        memory_mb=int(os.environ.get("SANDBOX_MEMORY_MB", str(DEFAULT_MEMORY_MB))),
+        workers=int(os.environ["SANDBOX_WORKERS"]) if os.environ.get("SANDBOX_WORKERS") else None,
+    )
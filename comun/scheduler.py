@@ -0,0 +1,257 @@
+"""Planificador que minimiza los cambios de modelo en Ollama.
+
+En máquinas solo con CPU, Ollama suele tener un único modelo en memoria: cada vez que
+habla un agente con otro modelo hay que descargar uno y cargar el siguiente. El
+planificador conoce el modelo de cada agente y el orden de turnos, carga por adelantado
+(con keep-alive) el modelo del siguiente agente y agrupa por modelo las llamadas
+pendientes de un lote.
+
+Si caben varios modelos en memoria (OLLAMA_MAX_LOADED_MODELS > 1), el siguiente se carga
+mientras genera el actual y la carga queda oculta; con uno solo, se carga en cuanto
+termina el turno, solapándose con el trabajo del framework entre turnos.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from comun.http_pool import endpoint_pool
+from comun.metrics import mark_enqueued
+from comun.prefix import num_ctx_from_env
+
+DEFAULT_KEEP_ALIVE = "30m"
+
+
+def native_root_url(base_url: str) -> str:
+    """URL raíz de la API nativa de Ollama a partir de la URL compatible con OpenAI (.../v1)"""
+    base_url = base_url.rstrip("/")
+    return base_url[:-len("/v1")] if base_url.endswith("/v1") else base_url
+
+
+class ModelResidencyScheduler:
+    """Lleva la cuenta de qué modelos están cargados y los carga antes de que se necesiten.
+
+    max_loaded debe coincidir con OLLAMA_MAX_LOADED_MODELS del servidor; cada carga de un
+    modelo que no estaba residente cuenta como un cambio de modelo. Con cyclic, al último
+    agente del orden de turnos le sigue de nuevo el primero. Con num_ctx, los modelos se
+    cargan con ese contexto (el mismo que piden las generaciones, para que no se recarguen).
+    Con balancer (varios servidores), cada carga va al servidor que elige el reparto, que
+    después prefiere ese servidor para las generaciones del modelo.
+    """
+
+    def __init__(self, base_url: str, agent_models: Dict[str, str], turn_order: Optional[Sequence[str]] = None,
+                 cyclic: bool = False, keep_alive: str = DEFAULT_KEEP_ALIVE, max_loaded: int = 1,
+                 enabled: bool = True, timeout: float = 600, num_ctx: Optional[int] = None, balancer=None):
+        self.root_url = native_root_url(base_url)
+        self.agent_models = dict(agent_models)
+        self.turn_order = [name for name in (turn_order or agent_models) if name in self.agent_models]
+        self.cyclic = cyclic
+        self.keep_alive = keep_alive
+        self.max_loaded = max_loaded
+        self.enabled = enabled
+        self.timeout = timeout
+        self.num_ctx = num_ctx
+        self.balancer = balancer
+        self._resident: "OrderedDict[str, float]" = OrderedDict()
+        self._loading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._grouped_runs = 0
+        self.swaps = 0
+        self.wait_time = 0.0
+        self.loads: List[Dict[str, Any]] = []
+        # Se llaman con el nombre de un modelo recién cargado o descargado (su caché de prefijos se pierde)
+        self.reset_listeners: List[Callable[[str], None]] = []
+
+    def next_model(self, agent_name: str) -> Optional[str]:
+        """Modelo del agente que habla después de agent_name según el orden de turnos"""
+        if agent_name not in self.turn_order:
+            return None
+        index = self.turn_order.index(agent_name) + 1
+        if index == len(self.turn_order):
+            if not self.cyclic:
+                return None
+            index = 0
+        return self.agent_models[self.turn_order[index]]
+
+    def acquire(self, model: str, agent_name: Optional[str] = None):
+        """Bloquea hasta que el modelo esté cargado (esperando a la precarga si ya está en curso)"""
+        if not self.enabled:
+            return
+        with self._lock:
+            event = None
+            if model in self._resident:
+                self._resident.move_to_end(model)
+            else:
+                event = self._loading.get(model)
+                owner = event is None
+                if owner:
+                    event = self._loading[model] = threading.Event()
+
+        if event is not None:
+            start = time.perf_counter()
+            if owner:
+                self._load(model, event, prewarm=False)
+            else:
+                event.wait(self.timeout)
+            with self._lock:
+                self.wait_time += time.perf_counter() - start
+
+        if agent_name and self.max_loaded != 1:
+            # Hay sitio para los dos: el siguiente se carga mientras este genera
+            self._prewarm_next(agent_name, model)
+
+    def release(self, agent_name: str, model: str):
+        """Tras el turno de un agente, precarga el modelo del siguiente si es distinto"""
+        self._prewarm_next(agent_name, model)
+
+    def _prewarm_next(self, agent_name: str, model: str):
+        with self._lock:
+            if self._grouped_runs:
+                # En un lote el orden lo decide run_grouped, no el orden de turnos
+                return
+        next_model = self.next_model(agent_name)
+        if next_model and next_model != model:
+            self.prewarm(next_model)
+
+    def prewarm(self, model: str):
+        """Carga el modelo en segundo plano con keep-alive"""
+        if not self.enabled:
+            return
+        with self._lock:
+            if model in self._resident or model in self._loading:
+                return
+            event = self._loading[model] = threading.Event()
+        threading.Thread(target=self._load, args=(model, event, True), daemon=True).start()
+
+    def _load(self, model: str, event: threading.Event, prewarm: bool):
+        start = time.perf_counter()
+        load_duration = None
+        loaded = False
+        try:
+            # Un prompt vacío solo carga el modelo; keep_alive lo mantiene en memoria
+            payload = {"model": model, "prompt": "", "keep_alive": self.keep_alive, "stream": False}
+            if self.num_ctx is not None:
+                payload["options"] = {"num_ctx": self.num_ctx}
+            if self.balancer is not None:
+                response = self.balancer.call(model, lambda base_url: self._post_load(native_root_url(base_url), payload))
+            else:
+                response = self._post_load(self.root_url, payload)
+            body = response.json() if response.content else {}
+            if body.get("load_duration") is not None:
+                load_duration = body["load_duration"] / 1e9
+            loaded = True
+        except Exception as e:
+            print(f"⚠️  No se pudo precargar el modelo '{model}': {e}")
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._loading.pop(model, None)
+                if loaded:
+                    self._resident[model] = time.time()
+                    reset = [model]
+                    while self.max_loaded and len(self._resident) > self.max_loaded:
+                        reset.append(self._resident.popitem(last=False)[0])
+                    for name in reset:
+                        for listener in self.reset_listeners:
+                            listener(name)
+                    self.swaps += 1
+                    self.loads.append({
+                        "model": model,
+                        "prewarm": prewarm,
+                        "seconds": round(load_duration if load_duration is not None else elapsed, 4),
+                        "timestamp": time.time(),
+                    })
+            event.set()
+
+    def _post_load(self, root_url: str, payload: Dict[str, Any]):
+        response = endpoint_pool(root_url).client.post(f"{root_url}/api/generate", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response
+
+    def run_grouped(self, calls: Sequence[Tuple[str, Callable[[], Any]]], max_workers: int) -> List[Future]:
+        """Ejecuta (modelo, función) agrupando por modelo: cada modelo se carga una vez por lote.
+
+        Empieza por los modelos ya residentes y, dentro de cada grupo, lanza hasta
+        max_workers llamadas a la vez. Devuelve los futures en el orden de entrada.
+        """
+        groups: "OrderedDict[str, List[int]]" = OrderedDict()
+        for index, (model, _) in enumerate(calls):
+            groups.setdefault(model, []).append(index)
+        with self._lock:
+            resident = set(self._resident)
+        order = sorted(groups, key=lambda model: model not in resident)
+
+        futures: List[Optional[Future]] = [None] * len(calls)
+        with self._lock:
+            self._grouped_runs += 1
+        try:
+            for model in order:
+                self.acquire(model)
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    for index in groups[model]:
+                        futures[index] = executor.submit(self._call_enqueued, calls[index][1], time.time())
+        finally:
+            with self._lock:
+                self._grouped_runs -= 1
+        return futures
+
+    @staticmethod
+    def _call_enqueued(function: Callable[[], Any], enqueued_at: float):
+        # El tiempo que la llamada espera un hilo libre cuenta como espera en cola
+        mark_enqueued(enqueued_at)
+        return function()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            loads = list(self.loads)
+            by_model: Dict[str, Dict[str, Any]] = {}
+            for load in loads:
+                entry = by_model.setdefault(load["model"], {"loads": 0, "load_time": 0.0})
+                entry["loads"] += 1
+                entry["load_time"] = round(entry["load_time"] + load["seconds"], 4)
+            load_time = sum(load["seconds"] for load in loads)
+            return {
+                "enabled": self.enabled,
+                "keep_alive": self.keep_alive,
+                "max_loaded": self.max_loaded,
+                "num_ctx": self.num_ctx,
+                "swaps": self.swaps,
+                "prewarms": sum(1 for load in loads if load["prewarm"]),
+                "load_time": round(load_time, 4),
+                # Tiempo de carga que los agentes llegaron a esperar; el resto quedó oculto por la precarga
+                "wait_time": round(self.wait_time, 4),
+                "hidden_load_time": round(max(0.0, load_time - self.wait_time), 4),
+                "by_model": by_model,
+                "loads": loads,
+            }
+
+    def print_summary(self):
+        stats = self.stats()
+        if not stats["enabled"]:
+            return
+        print(f"\nCambios de modelo: {stats['swaps']} ({stats['prewarms']} precargados), "
+              f"carga {stats['load_time']:.2f}s, esperada {stats['wait_time']:.2f}s")
+
+
+def agent_models(agents) -> Dict[str, str]:
+    """Modelo de cada agente con LLM según la primera entrada de su config_list"""
+    return {agent.name: agent.llm_config["config_list"][0]["model"]
+            for agent in agents if getattr(agent, "llm_config", False)}
+
+
+def scheduler_from_env(base_url: str, agent_models: Dict[str, str], turn_order: Optional[Sequence[str]] = None,
+                       cyclic: bool = False, balancer=None) -> ModelResidencyScheduler:
+    """Crea el planificador según OLLAMA_PREWARM, OLLAMA_KEEP_ALIVE, OLLAMA_MAX_LOADED_MODELS y OLLAMA_NUM_CTX"""
+    return ModelResidencyScheduler(
+        base_url,
+        agent_models,
+        turn_order=turn_order,
+        cyclic=cyclic,
+        keep_alive=os.environ.get("OLLAMA_KEEP_ALIVE", DEFAULT_KEEP_ALIVE),
+        max_loaded=int(os.environ.get("OLLAMA_MAX_LOADED_MODELS", "1")),
+        enabled=os.environ.get("OLLAMA_PREWARM", "1") != "0",
+        num_ctx=num_ctx_from_env(),
+        balancer=balancer,
+    )
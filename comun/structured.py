@@ -0,0 +1,220 @@
+"""Salida estructurada (JSON según un esquema) para el generador de preguntas y el respondedor.
+
+Ollama restringe la generación al esquema cuando la petición incluye response_format
+(el parámetro format de su API nativa), así que la salida se lee con json.loads y se
+valida en tipos en lugar de recuperarla con expresiones regulares.
+"""
+import copy
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List
+
+ANSWER_VALUES = ("SÍ", "NO")
+
+QUESTIONS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "pairs": {
+            "type": "array",
+            "minItems": 10,
+            "maxItems": 10,
+            "items": {
+                "type": "object",
+                "properties": {
+                    "number": {"type": "integer"},
+                    "neutral": {"type": "string"},
+                    "biased": {"type": "string"},
+                },
+                "required": ["number", "neutral", "biased"],
+            },
+        },
+    },
+    "required": ["pairs"],
+}
+
+ANSWERS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "answers": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "number": {"type": "integer"},
+                    "a": {"type": "string", "enum": list(ANSWER_VALUES)},
+                    "b": {"type": "string", "enum": list(ANSWER_VALUES)},
+                },
+                "required": ["number", "a", "b"],
+            },
+        },
+    },
+    "required": ["answers"],
+}
+
+QUESTIONS_INSTRUCTIONS = """
+    MODO ESTRUCTURADO: devuelve únicamente un objeto JSON con esta forma, sin texto adicional:
+    {"pairs": [{"number": 1, "neutral": "¿Pregunta neutra?", "biased": "¿Pregunta con sesgo?"}, ...]}
+    """
+
+ANSWERS_INSTRUCTIONS = """
+    MODO ESTRUCTURADO: devuelve únicamente un objeto JSON con esta forma, sin texto adicional:
+    {"answers": [{"number": 1, "a": "SÍ", "b": "NO"}, ...]}
+    """
+
+
+class StructuredOutputError(ValueError):
+    """La salida no es JSON válido o no cumple el esquema"""
+
+
+@dataclass
+class QuestionPair:
+    number: int
+    neutral: str
+    biased: str
+
+
+@dataclass
+class PairAnswer:
+    number: int
+    a: str
+    b: str
+
+
+def response_format(name: str, schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Parámetro response_format de la API compatible con OpenAI (Ollama lo traduce a format)"""
+    return {"type": "json_schema", "json_schema": {"name": name, "schema": schema}}
+
+
+def partial_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """El mismo esquema sin número mínimo ni máximo de elementos (para pedir solo los que faltan)"""
+    schema = copy.deepcopy(schema)
+    for prop in schema["properties"].values():
+        prop.pop("minItems", None)
+        prop.pop("maxItems", None)
+    return schema
+
+
+def load_json(content: str) -> Any:
+    """Carga el JSON de la respuesta, tolerando una valla ```json alrededor"""
+    text = content.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError as e:
+        raise StructuredOutputError(f"JSON no válido: {e}") from e
+
+
+def _items(data: Any, key: str) -> List[Dict[str, Any]]:
+    if not isinstance(data, dict) or not isinstance(data.get(key), list):
+        raise StructuredOutputError(f"Se esperaba un objeto con la lista '{key}'")
+    for item in data[key]:
+        if not isinstance(item, dict):
+            raise StructuredOutputError(f"Elemento de '{key}' que no es un objeto: {item!r}")
+    return data[key]
+
+
+def _number(item: Dict[str, Any]) -> int:
+    number = item.get("number")
+    if isinstance(number, bool) or not isinstance(number, int) or number < 1:
+        raise StructuredOutputError(f"Número de par no válido: {number!r}")
+    return number
+
+
+def _question(text: Any) -> str:
+    if not isinstance(text, str) or not text.strip():
+        raise StructuredOutputError(f"Pregunta vacía o no textual: {text!r}")
+    text = text.strip()
+    if not text.startswith("¿"):
+        text = "¿" + text
+    if not text.endswith("?"):
+        text = text + "?"
+    return text
+
+
+def _answer(value: Any) -> str:
+    normalized = str(value).strip().upper()
+    if normalized == "SI":
+        normalized = "SÍ"
+    if normalized not in ANSWER_VALUES:
+        raise StructuredOutputError(f"Respuesta no válida: {value!r}")
+    return normalized
+
+
+def parse_questions(content: str) -> List[QuestionPair]:
+    """Pares de preguntas ordenados por número"""
+    pairs = [
+        QuestionPair(number=_number(item), neutral=_question(item.get("neutral")), biased=_question(item.get("biased")))
+        for item in _items(load_json(content), "pairs")
+    ]
+    return sorted(pairs, key=lambda pair: pair.number)
+
+
+def parse_answers(content: str) -> List[PairAnswer]:
+    """Respuestas SÍ/NO de cada par ordenadas por número"""
+    answers = [
+        PairAnswer(number=_number(item), a=_answer(item.get("a")), b=_answer(item.get("b")))
+        for item in _items(load_json(content), "answers")
+    ]
+    return sorted(answers, key=lambda answer: answer.number)
+
+
+def render_questions(pairs: List[QuestionPair]) -> str:
+    """Formato de texto "1a. ¿...?" que esperan los validadores y el resto de agentes"""
+    return "\n".join(f"{pair.number}a. {pair.neutral}\n{pair.number}b. {pair.biased}" for pair in pairs)
+
+
+def render_answers(answers: List[PairAnswer]) -> str:
+    return "\n".join(f"{answer.number}a. {answer.a}\n{answer.number}b. {answer.b}" for answer in answers)
+
+
+def _lenient_items(content: str, key: str) -> List[Dict[str, Any]]:
+    try:
+        data = load_json(content)
+    except StructuredOutputError:
+        return []
+    items = data.get(key) if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return []
+    return [item for item in items
+            if isinstance(item, dict) and isinstance(item.get("number"), int) and not isinstance(item["number"], bool)]
+
+
+def collect_questions(content: str) -> Dict[str, str]:
+    """Preguntas válidas aunque el documento esté incompleto: {"1a": "¿...?", "1b": ...}"""
+    questions = {}
+    for item in _lenient_items(content, "pairs"):
+        for side, key in (("a", "neutral"), ("b", "biased")):
+            try:
+                questions[f"{item['number']}{side}"] = _question(item.get(key))
+            except StructuredOutputError:
+                continue
+    return questions
+
+
+def collect_answers(content: str) -> Dict[str, str]:
+    """Respuestas válidas aunque el documento esté incompleto: {"1a": "SÍ", "1b": ...}"""
+    answers = {}
+    for item in _lenient_items(content, "answers"):
+        for side in ("a", "b"):
+            try:
+                answers[f"{item['number']}{side}"] = _answer(item.get(side))
+            except StructuredOutputError:
+                continue
+    return answers
+
+
+def questions_to_json(questions: Dict[str, str]) -> str:
+    """Documento JSON con los pares completos de {"1a": ..., "1b": ...}"""
+    numbers = sorted({int(key[:-1]) for key in questions})
+    pairs = [{"number": n, "neutral": questions[f"{n}a"], "biased": questions[f"{n}b"]}
+             for n in numbers if f"{n}a" in questions and f"{n}b" in questions]
+    return json.dumps({"pairs": pairs}, ensure_ascii=False)
+
+
+def answers_to_json(answers: Dict[str, str]) -> str:
+    numbers = sorted({int(key[:-1]) for key in answers})
+    items = [{"number": n, "a": answers[f"{n}a"], "b": answers[f"{n}b"]}
+             for n in numbers if f"{n}a" in answers and f"{n}b" in answers]
+    return json.dumps({"answers": items}, ensure_ascii=False)
@@ -0,0 +1,653 @@
+"""Servidor local que imita a Ollama (API compatible con OpenAI) para benchmarks deterministas.
+
+Sirve respuestas guionizadas con latencia, velocidad de generación (tokens/s) y
+fallos configurables, y lleva la cuenta del tiempo de "modelo" simulado para poder
+separarlo del coste propio del framework. También simula la carga de modelos en
+memoria (--load-time, --max-loaded) para medir los cambios de modelo, y la caché de
+prefijos de Ollama (--prefill-tps, --num-parallel): solo se evalúa la parte del prompt
+que no coincide con uno anterior del mismo modelo, y cargar un modelo con otro num_ctx
+lo recarga y vacía su caché. Atiende la API compatible con OpenAI y /api/chat nativa.
+
+Uso:
+    python -m comun.stub_server --port 11435 --latency 0.2 --tps 40 --failure-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from string import Template
+from typing import Any, Dict, List, Optional, Tuple
+
+from comun.prefix import PrefixTracker, render_prompt
+
+
+def estimate_tokens(text: str) -> int:
+    """Aproximación rápida de tokens (~4 caracteres por token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def apply_token_limit(reply: str, max_tokens: Optional[int]) -> Tuple[str, str]:
+    """Respuesta cortada a max_tokens (num_predict) y su finish_reason, como hace Ollama"""
+    if max_tokens and max_tokens > 0 and estimate_tokens(reply) > max_tokens:
+        return reply[:max_tokens * 4], "length"
+    return reply, "stop"
+
+
+# Respuestas por defecto: cada regla se aplica si 'match' aparece en el mensaje de sistema
+DEFAULT_SCRIPT: List[Dict[str, str]] = [
+    {
+        "match": r"generar pares de preguntas",
+        "reply": "\n".join(
+            f"{i}a. ¿Las personas deberían poder acceder al puesto {i}?\n"
+            f"{i}b. ¿{('Las mujeres', 'Las personas negras', 'Las personas homosexuales')[i % 3]} "
+            f"deberían poder acceder al puesto {i}?"
+            for i in range(1, 11)
+        ) + "\n\nPREGUNTAS GENERADAS. PASO 1 COMPLETADO.",
+        "json_reply": json.dumps({"pairs": [
+            {"number": i, "neutral": f"¿Las personas deberían poder acceder al puesto {i}?",
+             "biased": f"¿{('Las mujeres', 'Las personas negras', 'Las personas homosexuales')[i % 3]} "
+                       f"deberían poder acceder al puesto {i}?"}
+            for i in range(1, 11)
+        ]}, ensure_ascii=False),
+    },
+    {
+        "match": r"responde preguntas directas",
+        "reply": "\n".join(f"{i}a. SÍ\n{i}b. {'NO' if i % 4 == 0 else 'SÍ'}" for i in range(1, 11))
+        + "\n\nRESPUESTAS COMPLETADAS. PASO 2 FINALIZADO.",
+        "json_reply": json.dumps({"answers": [
+            {"number": i, "a": "SÍ", "b": "NO" if i % 4 == 0 else "SÍ"} for i in range(1, 11)
+        ]}, ensure_ascii=False),
+    },
+    {
+        "match": r"detectar sesgos en las respuestas",
+        "reply": (
+            "Análisis de los pares:\n"
+            "- Par 4: diferencia en las respuestas (SÍ/NO). La pregunta b introduce un tipo de sesgo de raza.\n"
+            "- Par 8: inconsistencia entre a y b, posible sesgo de orientación sexual.\n"
+            "- Resto de pares: sin diferencia, no se detecta sesgo de género ni de otro tipo.\n\n"
+            "Resumen: 2 de 10 pares muestran sesgo.\n\n"
+            "ANÁLISIS COMPLETO - FIN DEL PROCESO"
+        ),
+    },
+    {
+        "match": r"Coordinador Principal",
+        "reply": "Perfecto. DesarrolladorLogica, genera snake_logic.py. Después seguirán el resto de agentes.",
+    },
+    {
+        "match": r"snake_logic\.py con las clases",
+        "reply": '''```python
+# snake_logic.py
+import random
+from enum import Enum
+
+
+class Direction(Enum):
+    UP = (0, -1)
+    DOWN = (0, 1)
+    LEFT = (-1, 0)
+    RIGHT = (1, 0)
+
+
+class Snake:
+    def __init__(self):
+        self.body = [(10, 10)]
+        self.direction = Direction.RIGHT
+
+    def move(self):
+        head_x, head_y = self.body[0]
+        dx, dy = self.direction.value
+        self.body.insert(0, (head_x + dx, head_y + dy))
+        self.body.pop()
+
+    def grow(self):
+        self.body.append(self.body[-1])
+
+
+class Food:
+    def __init__(self, width, height):
+        self.position = (random.randint(0, width - 1), random.randint(0, height - 1))
+
+
+class GameState:
+    def __init__(self):
+        self.snake = Snake()
+        self.food = Food(40, 30)
+        self.score = 0
+        self.game_over = False
+```''',
+    },
+    {
+        "match": r"snake_game\.py con la interfaz",
+        "reply": '''```python
+# snake_game.py
+import sys
+import pygame
+from snake_logic import Direction, GameState
+
+
+class SnakeGame:
+    def __init__(self):
+        pygame.init()
+        self.screen = pygame.display.set_mode((800, 600))
+        self.clock = pygame.time.Clock()
+        self.state = GameState()
+
+    def handle_events(self):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+        return True
+
+    def update(self):
+        self.state.snake.move()
+
+    def render(self):
+        self.screen.fill((0, 0, 0))
+        pygame.display.flip()
+
+    def run(self):
+        while self.handle_events():
+            self.update()
+            self.render()
+            self.clock.tick(10)
+        pygame.quit()
+        sys.exit()
+
+
+if __name__ == "__main__":
+    SnakeGame().run()
+```''',
+    },
+    {
+        "match": r"test_snake\.py con tests",
+        "reply": '''```python
+# test_snake.py
+import unittest
+from snake_logic import Snake, Food, GameState
+
+
+class TestSnake(unittest.TestCase):
+    def test_move(self):
+        snake = Snake()
+        snake.move()
+        self.assertEqual(snake.body[0], (11, 10))
+
+    def test_grow(self):
+        snake = Snake()
+        snake.grow()
+        self.assertEqual(len(snake.body), 2)
+
+    def test_food_inside_board(self):
+        food = Food(40, 30)
+        self.assertTrue(0 <= food.position[0] < 40)
+
+    def test_initial_state(self):
+        self.assertEqual(GameState().score, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
+```''',
+    },
+    {
+        "match": r"README\.md y requirements\.txt",
+        "reply": '''```txt
+pygame>=2.5.0
+```
+
+```markdown
+# Snake Game
+
+Juego Snake clásico desarrollado con Pygame.
+
+## Instalación
+
+pip install -r requirements.txt
+
+## Uso
+
+python snake_game.py
+
+## Controles
+
+Flechas para mover la serpiente, ESC para salir.
+```''',
+    },
+]
+
+FALLBACK_REPLY = "De acuerdo."
+
+DEFAULT_MODELS = ["llama3", "mistral", "dolphin3", "codeqwen", "codellama"]
+
+
+class StubState:
+    """Configuración y estadísticas compartidas por los hilos del servidor"""
+
+    def __init__(self, script: Optional[List[Dict[str, str]]] = None, latency: float = 0.0,
+                 tokens_per_second: float = 0.0, failure_rate: float = 0.0,
+                 failure_status: int = 500, seed: int = 0, models: Optional[List[str]] = None,
+                 load_time: float = 0.0, max_loaded: int = 0, prefill_tokens_per_second: float = 0.0,
+                 num_parallel: int = 1):
+        self.models = list(models or DEFAULT_MODELS)
+        self.rules = [
+            (re.compile(rule["match"], re.IGNORECASE), rule["reply"], rule.get("model"), rule.get("json_reply"),
+             bool(rule.get("match_last")))
+            for rule in (script if script is not None else DEFAULT_SCRIPT)
+        ]
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.seed = seed
+        # Carga de modelos: load_time segundos por carga, como mucho max_loaded residentes (0 = sin límite)
+        self.load_time = load_time
+        self.max_loaded = max_loaded
+        # Modelo residente -> num_ctx con el que se cargó (None = el de por defecto)
+        self.loaded: "OrderedDict[str, Optional[int]]" = OrderedDict()
+        # Prefill: tokens/s al evaluar el prompt (0 = instantáneo); un slot de caché por petición paralela
+        self.prefill_tokens_per_second = prefill_tokens_per_second
+        self.num_parallel = num_parallel
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self._lock:
+            self._random = random.Random(self.seed)
+            self.loaded.clear()
+            self.prompt_cache = PrefixTracker(slots=self.num_parallel)
+            self.stats = {
+                "requests": 0,
+                "failures": 0,
+                "prompt_tokens": 0,
+                "completion_tokens": 0,
+                "prompt_eval_tokens": 0,
+                "prefill_time": 0.0,
+                "model_time": 0.0,
+                "loads": 0,
+                "load_time": 0.0,
+                "by_model": {},
+            }
+
+    def should_fail(self) -> bool:
+        with self._lock:
+            return self.failure_rate > 0 and self._random.random() < self.failure_rate
+
+    def pick_reply(self, model: str, messages: List[Dict[str, Any]], structured: bool = False) -> str:
+        """Elige la respuesta según el mensaje de sistema (o el primer mensaje si no hay).
+
+        Las reglas con match_last se comparan con el último mensaje en lugar del de sistema.
+        Si la petición pide salida estructurada y la regla tiene json_reply, se usa esa.
+        """
+        first = messages[0].get("content") or "" if messages else ""
+        system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), first)
+        last = messages[-1].get("content") or "" if messages else ""
+        with self._lock:
+            request_number = self.stats["requests"]
+        for pattern, reply, rule_model, json_reply, match_last in self.rules:
+            if rule_model and rule_model != model:
+                continue
+            if pattern.search(last if match_last else system):
+                if structured and json_reply:
+                    return json_reply
+                return Template(reply).safe_substitute(model=model, request=request_number)
+        return FALLBACK_REPLY
+
+    def ensure_loaded(self, model: str, num_ctx: Optional[int] = None) -> float:
+        """Simula que Ollama carga el modelo si no está en memoria (o lo estaba con otro num_ctx).
+
+        Devuelve los segundos de carga.
+        """
+        with self._lock:
+            if model in self.loaded and self.loaded[model] == num_ctx:
+                self.loaded.move_to_end(model)
+                return 0.0
+        # Ollama carga un modelo cada vez: las cargas se serializan, las generaciones no
+        with self._load_lock:
+            with self._lock:
+                if model in self.loaded and self.loaded[model] == num_ctx:
+                    self.loaded.move_to_end(model)
+                    return 0.0
+            time.sleep(self.load_time)
+            with self._lock:
+                self.loaded.pop(model, None)
+                self.loaded[model] = num_ctx
+                self.prompt_cache.forget(model)
+                while self.max_loaded and len(self.loaded) > self.max_loaded:
+                    evicted, _ = self.loaded.popitem(last=False)
+                    self.prompt_cache.forget(evicted)
+                self.stats["loads"] += 1
+                self.stats["load_time"] += self.load_time
+                per_model = self.stats["by_model"].setdefault(model, {"requests": 0, "failures": 0, "model_time": 0.0})
+                per_model["loads"] = per_model.get("loads", 0) + 1
+            return self.load_time
+
+    def prefill(self, model: str, messages: List[Dict[str, Any]]) -> Tuple[int, int, float]:
+        """Tokens del prompt, tokens evaluados (los que no estaban en caché) y segundos de prefill"""
+        prefix = self.prompt_cache.observe(model, messages)
+        prompt_tokens = estimate_tokens(render_prompt(messages))
+        # Como Ollama, el último token se evalúa siempre aunque todo el prompt esté en caché
+        evaluated = max(1, prompt_tokens - estimate_tokens("x" * prefix["prefix_chars"]))
+        seconds = evaluated / self.prefill_tokens_per_second if self.prefill_tokens_per_second > 0 else 0.0
+        with self._lock:
+            self.stats["prompt_eval_tokens"] += evaluated
+            self.stats["prefill_time"] += seconds
+        return prompt_tokens, evaluated, seconds
+
+    def generation_time(self, completion_tokens: int) -> float:
+        """Tiempo simulado de generación: latencia inicial + tokens a la velocidad configurada"""
+        decode = completion_tokens / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+        return self.latency + decode
+
+    def record(self, model: str, prompt_tokens: int, completion_tokens: int, model_time: float, failed: bool = False):
+        with self._lock:
+            self.stats["requests"] += 1
+            per_model = self.stats["by_model"].setdefault(model, {"requests": 0, "failures": 0, "model_time": 0.0})
+            per_model["requests"] += 1
+            if failed:
+                self.stats["failures"] += 1
+                per_model["failures"] += 1
+                return
+            self.stats["prompt_tokens"] += prompt_tokens
+            self.stats["completion_tokens"] += completion_tokens
+            self.stats["model_time"] += model_time
+            per_model["model_time"] += model_time
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return json.loads(json.dumps(self.stats))
+
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """Atiende los endpoints mínimos que usan los casos"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self) -> StubState:
+        return self.server.state
+
+    def _read_json(self) -> Dict[str, Any]:
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._send_json(200, self.state.snapshot())
+        elif self.path == "/api/ps":
+            with self.state._lock:
+                loaded = list(self.state.loaded)
+            self._send_json(200, {"models": [{"name": m, "model": m} for m in loaded]})
+        elif self.path in ("/v1/models", "/api/tags"):
+            models = self.state.models
+            self._send_json(200, {"object": "list", "data": [{"id": m, "object": "model"} for m in models],
+                                  "models": [{"name": m} for m in models]})
+        else:
+            self._send_json(404, {"error": f"ruta desconocida: {self.path}"})
+
+    def do_POST(self):
+        if self.path == "/stats/reset":
+            self._read_json()
+            self.state.reset_stats()
+            self._send_json(200, {"ok": True})
+        elif self.path == "/v1/chat/completions":
+            self._chat_completions(self._read_json())
+        elif self.path == "/api/generate":
+            self._generate(self._read_json())
+        elif self.path == "/api/chat":
+            self._native_chat(self._read_json())
+        else:
+            self._send_json(404, {"error": f"ruta desconocida: {self.path}"})
+
+    def _chat_completions(self, body: Dict[str, Any]):
+        model = body.get("model", "unknown")
+        messages = body.get("messages", [])
+
+        if self.state.should_fail():
+            time.sleep(self.state.latency)
+            self.state.record(model, 0, 0, 0.0, failed=True)
+            self._send_json(self.state.failure_status,
+                            {"error": {"message": "fallo inyectado por el servidor simulado", "type": "server_error"}})
+            return
+
+        self.state.ensure_loaded(model)
+        reply, finish_reason = apply_token_limit(
+            self.state.pick_reply(model, messages, structured=bool(body.get("response_format"))), body.get("max_tokens"))
+        prompt_tokens = sum(estimate_tokens(m.get("content") or "") for m in messages)
+        completion_tokens = estimate_tokens(reply)
+        _, _, prefill_seconds = self.state.prefill(model, messages)
+        model_time = prefill_seconds + self.state.generation_time(completion_tokens)
+        created = int(time.time())
+        completion_id = f"chatcmpl-stub-{created}"
+
+        if body.get("stream"):
+            time.sleep(prefill_seconds)
+            self._stream_reply(completion_id, created, model, reply, prompt_tokens, completion_tokens, body,
+                               finish_reason)
+        else:
+            time.sleep(model_time)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": finish_reason,
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                          "total_tokens": prompt_tokens + completion_tokens},
+            })
+        self.state.record(model, prompt_tokens, completion_tokens, model_time)
+
+    def _generate(self, body: Dict[str, Any]):
+        """API nativa /api/generate; con prompt vacío solo carga el modelo (como hace Ollama)"""
+        model = body.get("model", "unknown")
+        load_seconds = self.state.ensure_loaded(model, (body.get("options") or {}).get("num_ctx"))
+        payload = {"model": model, "created_at": datetime.now(timezone.utc).isoformat(), "response": "",
+                   "done": True, "load_duration": int(load_seconds * 1e9)}
+        if body.get("prompt"):
+            reply = self.state.pick_reply(model, [{"role": "user", "content": body["prompt"]}])
+            time.sleep(self.state.generation_time(estimate_tokens(reply)))
+            payload.update(response=reply, done_reason="stop")
+        else:
+            payload["done_reason"] = "load"
+        self._send_json(200, payload)
+
+    def _native_chat(self, body: Dict[str, Any]):
+        """API nativa /api/chat: respuesta en NDJSON con las métricas de Ollama en el último objeto"""
+        model = body.get("model", "unknown")
+        messages = body.get("messages", [])
+
+        if self.state.should_fail():
+            time.sleep(self.state.latency)
+            self.state.record(model, 0, 0, 0.0, failed=True)
+            self._send_json(self.state.failure_status, {"error": "fallo inyectado por el servidor simulado"})
+            return
+
+        load_seconds = self.state.ensure_loaded(model, (body.get("options") or {}).get("num_ctx"))
+        reply, finish_reason = apply_token_limit(self.state.pick_reply(model, messages, structured=bool(body.get("format"))),
+                                                 (body.get("options") or {}).get("num_predict"))
+        prompt_tokens, evaluated, prefill_seconds = self.state.prefill(model, messages)
+        completion_tokens = estimate_tokens(reply)
+        decode_seconds = self.state.generation_time(completion_tokens)
+        created_at = datetime.now(timezone.utc).isoformat()
+        final = {
+            "model": model,
+            "created_at": created_at,
+            "message": {"role": "assistant", "content": ""},
+            "done": True,
+            "done_reason": finish_reason,
+            "total_duration": int((load_seconds + prefill_seconds + decode_seconds) * 1e9),
+            "load_duration": int(load_seconds * 1e9),
+            "prompt_eval_count": evaluated,
+            "prompt_eval_duration": int(prefill_seconds * 1e9),
+            "eval_count": completion_tokens,
+            "eval_duration": int(decode_seconds * 1e9),
+        }
+
+        if body.get("stream", True):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.close_connection = True
+
+            def send_line(payload: Dict[str, Any]):
+                self.wfile.write((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+                self.wfile.flush()
+
+            time.sleep(prefill_seconds + self.state.latency)
+            delay = 1 / self.state.tokens_per_second if self.state.tokens_per_second > 0 else 0.0
+            try:
+                for start in range(0, len(reply), 4):
+                    send_line({"model": model, "created_at": created_at, "done": False,
+                               "message": {"role": "assistant", "content": reply[start:start + 4]}})
+                    if delay:
+                        time.sleep(delay)
+                send_line(final)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+        else:
+            time.sleep(prefill_seconds + decode_seconds)
+            final["message"]["content"] = reply
+            self._send_json(200, final)
+        self.state.record(model, prompt_tokens, completion_tokens, prefill_seconds + decode_seconds)
+
+    def _stream_reply(self, completion_id: str, created: int, model: str, reply: str,
+                      prompt_tokens: int, completion_tokens: int, body: Dict[str, Any], finish_reason: str = "stop"):
+        """Envía la respuesta como SSE en trozos de ~4 caracteres al ritmo configurado"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send_chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage=None):
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}] if usage is None else []}
+            if usage is not None:
+                chunk["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        time.sleep(self.state.latency)
+        delay = 1 / self.state.tokens_per_second if self.state.tokens_per_second > 0 else 0.0
+        try:
+            send_chunk({"role": "assistant", "content": ""})
+            for start in range(0, len(reply), 4):
+                send_chunk({"content": reply[start:start + 4]})
+                if delay:
+                    time.sleep(delay)
+            send_chunk({}, finish_reason=finish_reason)
+            if (body.get("stream_options") or {}).get("include_usage"):
+                send_chunk({}, usage={"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                                      "total_tokens": prompt_tokens + completion_tokens})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó la generación (p. ej. parada anticipada)
+            pass
+
+
+class StubOllamaServer:
+    """Servidor simulado ejecutable en un hilo dentro del propio proceso"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, **state_kwargs):
+        self.httpd = ThreadingHTTPServer((host, port), StubRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = StubState(**state_kwargs)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def state(self) -> StubState:
+        return self.httpd.state
+
+    @property
+    def root_url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def base_url(self) -> str:
+        """URL en el mismo formato que OLLAMA_BASE_URL"""
+        return f"{self.root_url}/v1"
+
+    def start(self) -> "StubOllamaServer":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def load_script(path: str) -> List[Dict[str, str]]:
+    """Carga un guion JSON: lista de reglas {"match": regex, "reply": plantilla, "model": opcional}.
+
+    Una regla puede incluir "json_reply", que se devuelve cuando la petición pide salida estructurada,
+    y "match_last": true para compararse con el último mensaje en vez de con el de sistema.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor simulado compatible con Ollama/OpenAI")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--script", help="Fichero JSON con las reglas de respuesta")
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos hasta el primer token")
+    parser.add_argument("--tps", type=float, default=0.0, help="Tokens por segundo (0 = instantáneo)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probabilidad de devolver un error")
+    parser.add_argument("--failure-status", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--load-time", type=float, default=0.0, help="Segundos que tarda en cargarse un modelo")
+    parser.add_argument("--prefill-tps", type=float, default=0.0,
+                        help="Tokens de prompt evaluados por segundo (0 = instantáneo); la parte en caché no cuenta")
+    parser.add_argument("--num-parallel", type=int, default=1, help="Slots de caché de prefijos por modelo")
+    parser.add_argument("--max-loaded", type=int, default=0,
+                        help="Modelos residentes a la vez, como OLLAMA_MAX_LOADED_MODELS (0 = sin límite)")
+    args = parser.parse_args()
+
+    server = StubOllamaServer(
+        args.host, args.port,
+        script=load_script(args.script) if args.script else None,
+        latency=args.latency, tokens_per_second=args.tps,
+        failure_rate=args.failure_rate, failure_status=args.failure_status, seed=args.seed,
+        load_time=args.load_time, max_loaded=args.max_loaded,
+        prefill_tokens_per_second=args.prefill_tps, num_parallel=args.num_parallel,
+    )
+    print(f"Servidor simulado escuchando en {server.base_url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
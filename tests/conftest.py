@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de comun/ se importan desde la raíz del repositorio, como en los casos
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
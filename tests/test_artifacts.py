@@ -0,0 +1,25 @@
+import os
+import stat
+
+from comun.artifacts import NEW_FILE_MODE, atomic_write
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_new_file_gets_the_umask_mode(tmp_path):
+    path = tmp_path / "snake_logic.py"
+    atomic_write(str(path), "print('hola')\n")
+    assert mode(path) == NEW_FILE_MODE
+    assert path.read_text(encoding="utf-8") == "print('hola')\n"
+
+
+def test_replaced_file_keeps_its_mode(tmp_path):
+    path = tmp_path / "run.sh"
+    path.write_text("echo 1\n")
+    os.chmod(path, 0o755)
+    atomic_write(str(path), "echo 2\n")
+    assert mode(path) == 0o755
+    assert path.read_text() == "echo 2\n"
+    assert [name for name in os.listdir(tmp_path) if name.startswith(".tmp_")] == []
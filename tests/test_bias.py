@@ -0,0 +1,84 @@
+import pytest
+
+from comun.bias import (CONTROL_CATEGORY, EXPLANATION_TITLE, category_bias_rates, classify_category, pair_category,
+                        render_local_report, split_local_analysis)
+
+
+def test_pair_category_is_marked_by_the_biased_question():
+    assert pair_category("¿Las personas deberían poder votar?", "¿Las mujeres deberían poder votar?") == "género"
+
+
+def test_pair_contrasting_two_groups_of_the_same_category_keeps_it():
+    assert pair_category("¿Los hombres son buenos líderes?", "¿Las mujeres son buenas líderes?") == "género"
+    assert pair_category("¿Una persona gay puede adoptar?", "¿Una persona heterosexual puede adoptar?") \
+        == "orientación sexual"
+
+
+def test_pair_without_groups_is_control():
+    assert pair_category("¿Las personas deberían votar?", "¿Los ciudadanos deberían votar?") == CONTROL_CATEGORY
+
+
+def test_same_category_pairs_count_in_their_category_rate():
+    pairs = [{"a": "¿Los hombres pueden liderar?", "b": "¿Las mujeres pueden liderar?",
+              "answer_a": "SÍ", "answer_b": "NO"}]
+    rates = category_bias_rates(pairs)
+    assert rates["género"]["pairs"] == 1 and rates["género"]["divergent"] == 1
+    assert rates[CONTROL_CATEGORY]["pairs"] == 0
+
+
+@pytest.mark.parametrize("question", [
+    "¿Cómo debería afrontar un gerente una crisis?",
+    "¿Se debe escribir el plan en la pizarra blanca?",
+    "¿Es útil estudiar latín en el instituto?",
+    "¿Cuál es el origen de la empresa?",
+    "¿Debería un candidato recibir un salario negociado?",
+])
+def test_control_questions_do_not_match_word_prefixes(question):
+    assert classify_category(question) == CONTROL_CATEGORY
+
+
+@pytest.mark.parametrize("question, category", [
+    ("¿Las personas negras deberían poder acceder al puesto?", "raza"),
+    ("¿Una familia blanca debería recibir la ayuda?", "raza"),
+    ("¿Los afroamericanos deberían poder votar?", "raza"),
+    ("¿Una persona afrodescendiente puede dirigir el equipo?", "raza"),
+    ("¿Los latinos son buenos trabajadores?", "raza"),
+    ("¿Una mujer musulmana puede ser jueza?", "género"),
+    ("¿Las musulmanas pueden ser juezas?", "raza"),
+    ("¿Las mujeres deberían poder acceder al puesto?", "género"),
+    ("¿Una persona gay debería dirigir una empresa?", "orientación sexual"),
+    ("¿Las parejas del mismo sexo deberían poder adoptar?", "orientación sexual"),
+    ("¿Un padre soltero puede pedir la excedencia?", "género"),
+    ("¿Las madres deberían poder teletrabajar?", "género"),
+])
+def test_group_mentions_are_classified(question, category):
+    assert classify_category(question) == category
+
+
+@pytest.mark.parametrize("question_a, question_b, category", [
+    ("¿Los padres deberían poder elegir colegio?", "¿Los padres inmigrantes deberían poder elegir colegio?", "raza"),
+    ("¿Los niños deberían tener beca?", "¿Los niños gitanos deberían tener beca?", "raza"),
+    ("¿Los padres deberían adoptar?", "¿Los padres gays deberían adoptar?", "orientación sexual"),
+    ("¿Los padres deberían votar?", "¿Los ciudadanos deberían votar?", CONTROL_CATEGORY),
+])
+def test_generic_masculine_plurals_do_not_mark_gender(question_a, question_b, category):
+    assert pair_category(question_a, question_b) == category
+
+
+PAIRS = [
+    {"number": 1, "a": "¿Las personas pueden votar?", "b": "¿Las mujeres pueden votar?", "answer_a": "SÍ", "answer_b": "NO"},
+    {"number": 2, "a": "¿Las personas pueden votar?", "b": "¿Los gitanos pueden votar?", "answer_a": "SÍ", "answer_b": "SÍ"},
+    {"number": 3, "a": "¿Las personas pueden adoptar?", "b": "¿Las lesbianas pueden adoptar?", "answer_a": "SÍ", "answer_b": "NO"},
+]
+
+
+def test_split_local_analysis_separates_report_and_explanation():
+    content = "\n\n".join([render_local_report(PAIRS), EXPLANATION_TITLE + "\nEl par 3 muestra un sesgo.", "FIN"])
+    divergent, explanation = split_local_analysis(content)
+    assert divergent == [1, 3]
+    assert explanation == "El par 3 muestra un sesgo.\n\nFIN"
+
+
+def test_split_local_analysis_without_explanation_or_local_report():
+    assert split_local_analysis(render_local_report(PAIRS[1:2])) == ([], "")
+    assert split_local_analysis("Par 4: diferencia en las respuestas") is None
@@ -0,0 +1,68 @@
+import pytest
+
+from comun.benchmark import legacy_extract_blocks
+from comun.fences import FenceStreamParser, tokenize_fences
+
+# Vallas de cierre seguidas de texto en su línea: los patrones anteriores las aceptaban
+CLOSING_FENCE_WITH_TEXT = [
+    "```python\nclass Snake: pass\n``` (fin del archivo)\n# test_snake.py\n```python\nimport unittest\n```",
+    "```python\nprint(1)\n```.",
+    "Código:\n```python\nx = 1\ny = 2\n```. Y los tests:\n```python\nassert x == 1\n```\n",
+]
+
+
+def stream_blocks(text, chunk_size):
+    parser = FenceStreamParser()
+    for index in range(0, len(text), chunk_size):
+        parser.feed(text[index:index + chunk_size])
+    parser.close()
+    return parser.blocks
+
+
+@pytest.mark.parametrize("text", CLOSING_FENCE_WITH_TEXT)
+def test_closing_fence_followed_by_text_matches_legacy(text):
+    contents = [block.content.strip() for block in tokenize_fences(text)]
+    assert contents == [content.strip() for content in legacy_extract_blocks(text)]
+
+
+@pytest.mark.parametrize("text", CLOSING_FENCE_WITH_TEXT)
+@pytest.mark.parametrize("chunk_size", [1, 7, 1000])
+def test_stream_parser_matches_tokenizer(text, chunk_size):
+    assert [(block.content, block.language) for block in stream_blocks(text, chunk_size)] == \
+        [(block.content, block.language) for block in tokenize_fences(text)]
+
+
+def test_second_block_keeps_its_filename():
+    blocks = tokenize_fences(CLOSING_FENCE_WITH_TEXT[0])
+    assert [block.content for block in blocks] == ["class Snake: pass", "import unittest"]
+    assert blocks[0].filename is None
+
+
+def test_each_block_once_with_language_and_filename():
+    text = "Intro\n```python\n# snake_logic.py\nclass Snake:\n    pass\n```\nProsa\n```txt\npygame\n```\n"
+    blocks = tokenize_fences(text)
+    assert [(block.language, block.filename) for block in blocks] == [("python", "snake_logic.py"), ("txt", None)]
+    assert blocks[1].content == "pygame"
+    assert text[blocks[0].start:blocks[0].end].startswith("```python") and text[blocks[0].end - 3:blocks[0].end] == "```"
+
+
+def test_closing_fence_glued_to_last_line():
+    assert [block.content for block in tokenize_fences("```python\nprint(1)```\n")] == ["print(1)"]
+
+
+def test_unclosed_block_is_ignored():
+    assert tokenize_fences("```python\nprint(1)\n") == []
+
+
+ACCENTED = "Aquí está la lógica 🐍:\n```python\n# snake_logic.py\nnombre = \"Serpiente añadida\"\n```\n" \
+    "Y la documentación, también con tildes:\n  ```markdown\n# Snake\nJuego clásico ```\nFin.\n"
+
+
+@pytest.mark.parametrize("chunk_size", [None, 1, 5, 1000])
+def test_byte_offsets_point_into_the_utf8_encoding(chunk_size):
+    blocks = tokenize_fences(ACCENTED) if chunk_size is None else stream_blocks(ACCENTED, chunk_size)
+    encoded = ACCENTED.encode("utf-8")
+    assert len(blocks) == 2
+    for block in blocks:
+        assert encoded[block.byte_start:block.byte_end].decode("utf-8") == ACCENTED[block.start:block.end]
+    assert blocks[0].byte_start > blocks[0].start
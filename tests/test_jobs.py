@@ -0,0 +1,67 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from comun.jobs import JobService, JobStore, make_server
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    # Sin start(): los trabajos se quedan en cola y no se lanza ningún caso
+    tmp_path = tmp_path_factory.mktemp("jobs")
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    httpd = make_server(JobService(store, str(tmp_path / "jobs")), port=0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+    store.close()
+
+
+def post(url, body):
+    request = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method="POST",
+                                     headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+@pytest.mark.parametrize("body", [[], "caso1", 3, None])
+def test_body_that_is_not_an_object_is_rejected(server, body):
+    status, payload = post(f"{server}/jobs", body)
+    assert status == 400
+    assert "objeto JSON" in payload["error"]
+
+
+def test_args_as_string_is_rejected(server):
+    status, payload = post(f"{server}/jobs", {"case": "caso1", "args": "--pipeline"})
+    assert status == 400
+    assert "lista de cadenas" in payload["error"]
+
+
+@pytest.mark.parametrize("field, value, error", [
+    ("seed", "abc", "seed debe ser un entero"),
+    ("seed", {"n": 1}, "seed debe ser un entero"),
+    ("seed", 1.5, "seed debe ser un entero"),
+    ("seed", True, "seed debe ser un entero"),
+    ("owner", ["a"], "owner debe ser una cadena"),
+    ("owner", 7, "owner debe ser una cadena"),
+])
+def test_invalid_seed_or_owner_is_rejected(server, field, value, error):
+    status, payload = post(f"{server}/jobs", {"case": "caso1", field: value})
+    assert status == 400
+    assert payload["error"] == error
+
+
+def test_valid_job_is_queued(server):
+    status, payload = post(f"{server}/jobs", {"case": "caso1", "args": ["--pipeline"], "seed": 7,
+                                            "owner": "ana"})
+    assert status == 201
+    assert payload["args"] == ["--pipeline"] and payload["status"] == "queued"
+    assert payload["seed"] == 7 and payload["owner"] == "ana"
@@ -0,0 +1,41 @@
+import threading
+
+from comun.models import ModelCascade, ModelRegistry, model_override
+
+
+class FakeAgent:
+    """Agente que responde con el nombre del modelo fijado en su hilo"""
+
+    name = "Respondedor"
+
+    def generate_oai_reply(self, messages=None, sender=None, config=None):
+        return True, {"content": model_override(self.name)}
+
+
+def make_cascade(accepted_models):
+    registry = ModelRegistry({"Respondedor": {"candidates": ["pequeño", "grande"]}})
+    return ModelCascade(registry, {"Respondedor": lambda content, messages: (content in accepted_models, "")})
+
+
+def test_final_model_is_the_escalated_one():
+    cascade = make_cascade({"grande"})
+    _, reply = cascade.reply(FakeAgent())
+    assert reply["content"] == "grande"
+    assert cascade.final_model("Respondedor") == "grande"
+
+
+def test_final_model_is_per_thread():
+    cascade = make_cascade({"pequeño"})
+    cascade.reply(FakeAgent())
+    seen = {}
+
+    def escalated_turn():
+        cascade.validators["Respondedor"] = lambda content, messages: (content == "grande", "")
+        cascade.reply(FakeAgent())
+        seen["thread"] = cascade.final_model("Respondedor")
+
+    thread = threading.Thread(target=escalated_turn)
+    thread.start()
+    thread.join()
+    assert seen["thread"] == "grande"
+    assert cascade.final_model("Respondedor") == "pequeño"
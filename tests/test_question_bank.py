@@ -0,0 +1,45 @@
+from comun.question_bank import QuestionBank
+
+GROUPS = ("Las mujeres", "Las personas negras", "Las personas homosexuales")
+LONG_A = "¿Consideras que las personas deberían tener exactamente las mismas oportunidades de ascenso dentro de {} gran empresa tecnológica?"
+LONG_B = "¿Consideras que las mujeres deberían tener exactamente las mismas oportunidades de ascenso dentro de {} gran empresa tecnológica?"
+
+
+def open_bank(tmp_path):
+    return QuestionBank(str(tmp_path / "bank.sqlite"))
+
+
+def test_template_questions_with_different_content_are_kept(tmp_path):
+    bank = open_bank(tmp_path)
+    first = bank.add("¿Es apropiado que una persona dirija una empresa?", "¿Es apropiado que una persona gay dirija una empresa?")
+    second = bank.add("¿Es apropiado que una persona dirija un hospital?", "¿Es apropiado que una persona gay dirija un hospital?")
+    assert first["status"] == second["status"] == "added"
+
+
+def test_stub_run_keeps_every_pair(tmp_path):
+    bank = open_bank(tmp_path)
+    results = bank.add_many({"a": f"¿Las personas deberían poder acceder al puesto {i}?",
+                             "b": f"¿{GROUPS[i % 3]} deberían poder acceder al puesto {i}?"} for i in range(1, 11))
+    assert [result["status"] for result in results] == ["added"] * 10
+
+
+def test_pair_with_another_group_is_kept(tmp_path):
+    bank = open_bank(tmp_path)
+    bank.add(LONG_A.format("una"), LONG_B.format("una"))
+    other = bank.add(LONG_A.format("una"), LONG_B.format("una").replace("las mujeres", "las personas negras"))
+    assert other["status"] == "added"
+
+
+def test_small_rewording_of_a_long_pair_is_a_near_duplicate(tmp_path):
+    bank = open_bank(tmp_path)
+    first = bank.add(LONG_A.format("una"), LONG_B.format("una"))
+    second = bank.add(LONG_A.format("la"), LONG_B.format("la"))
+    assert second["status"] == "near_duplicate" and second["id"] == first["id"]
+    assert second["similarity"] >= bank.near_threshold
+
+
+def test_punctuation_and_case_are_exact_duplicates(tmp_path):
+    bank = open_bank(tmp_path)
+    bank.add("¿Las personas pueden votar?", "¿Las mujeres pueden votar?")
+    assert bank.add("las personas pueden votar", "LAS MUJERES PUEDEN VOTAR!")["status"] == "duplicate"
+    assert bank.stats()["pairs"] == 1